@@ -1,6 +1,7 @@
 import logging
 from access.search.solrquery import SolrQuery
 from access.search.solrserver import SolrServer
+from access.search.documentsearch import RESULT_FIELDS
 
 logger = logging.getLogger(__name__)
 
@@ -43,7 +44,7 @@ def get_query_string(keyword, content_type, package, representation_data_only, s
 
     limit = "start=%d&rows=%d" % (start,rows)
     
-    query_part = conjunctions + "&" + limit
+    query_part = conjunctions + "&" + limit + "&fl=" + ",".join(RESULT_FIELDS)
 
     sq = SolrQuery(SolrServer(solr_protocol, solr_host, solr_port))
     query_pattern = sq.get_select_pattern(solr_core)
@@ -0,0 +1,177 @@
+"""
+Full-text search of indexed documents
+
+Result pages contain a fixed, lightweight list of stored fields and highlighting snippets of the matched terms
+(the extracted text of the documents is not returned). The full text of a single document is retrieved on demand.
+"""
+import unittest
+
+from django.core.cache import cache
+
+from access.search.solrgateway import get_solr_gateway, query_cache_key, cursor_sort
+from config.configuration import solr_core, search_cache_ttl, search_cache_max_rows, search_snippets, \
+    search_fragment_size, search_max_analyzed_chars
+from util.custom_exceptions import NotFoundError
+
+# stored fields of search results (no extracted text)
+RESULT_FIELDS = ('id', 'package', 'path', 'label', 'title', 'eadtitle_t', 'version', 'archivedate', 'content_type',
+                 'size', 'stream_size')
+
+# field containing the extracted text
+CONTENT_FIELD = 'content'
+
+HIGHLIGHT_PRE = '<mark>'
+HIGHLIGHT_POST = '</mark>'
+
+
+def search_params(query, start=0, rows=20, sort='', cursor=None):
+    """
+    Solr parameters of a search result page. With a cursor (cursorMark, '*' for the first page) the page is
+    requested by cursor based paging instead of the offset, so that deep pages are as fast as the first one.
+
+    @type       query: string
+    @param      query: Solr query
+    @type       start: int
+    @param      start: Offset of the first result
+    @type       rows: int
+    @param      rows: Number of results (limited to search_cache_max_rows)
+    @type       sort: string
+    @param      sort: Sort order (e.g. 'archivedate desc')
+    @type       cursor: string
+    @param      cursor: Cursor mark (nextCursorMark of the previous page) or None for offset based paging
+    @rtype: dict
+    @return: Query parameters
+    """
+    params = {
+        'q': query.strip() if query and query.strip() else '*:*',
+        'fl': ','.join(RESULT_FIELDS),
+        'start': max(0, start),
+        'rows': max(0, min(rows, search_cache_max_rows)),
+        'hl': 'true',
+        'hl.fl': CONTENT_FIELD,
+        'hl.method': 'unified',
+        'hl.snippets': search_snippets,
+        'hl.fragsize': search_fragment_size,
+        'hl.maxAnalyzedChars': search_max_analyzed_chars,
+        'hl.encoder': 'html',
+        'hl.tag.pre': HIGHLIGHT_PRE,
+        'hl.tag.post': HIGHLIGHT_POST,
+    }
+    sort = " ".join(sort.split()) if sort else ''
+    if cursor:
+        params['start'] = 0
+        params['cursorMark'] = cursor
+        params['sort'] = cursor_sort(sort)
+    elif sort:
+        params['sort'] = sort
+    return params
+
+
+def merge_highlighting(result):
+    """
+    Search result page with the highlighting snippets added to the documents
+
+    @type       result: dict
+    @param      result: Solr JSON response
+    @rtype: dict
+    @return: Result page: {'numFound': ..., 'start': ..., 'docs': [{..., 'snippets': [...]}]}, with cursor based
+             paging also the cursor mark of the next page ('nextCursorMark', equal to the requested cursor mark on the
+             last page)
+    """
+    highlighting = result.get('highlighting', {})
+    docs = result['response']['docs']
+    for doc in docs:
+        doc['snippets'] = highlighting.get(doc.get('id'), {}).get(CONTENT_FIELD, [])
+    page = {'numFound': result['response']['numFound'], 'start': result['response']['start'], 'docs': docs}
+    if 'nextCursorMark' in result:
+        page['nextCursorMark'] = result['nextCursorMark']
+    return page
+
+
+def search_documents(query, start=0, rows=20, sort='', core=None, cursor=None):
+    """
+    Search result page (cached for search_cache_ttl seconds, invalidated by index commits)
+
+    @type       query: string
+    @param      query: Solr query
+    @type       start: int
+    @param      start: Offset of the first result
+    @type       rows: int
+    @param      rows: Number of results
+    @type       sort: string
+    @param      sort: Sort order
+    @type       core: string
+    @param      core: Core name (default: configured core)
+    @type       cursor: string
+    @param      cursor: Cursor mark for cursor based paging (see search_params)
+    @rtype: dict
+    @return: Result page (see merge_highlighting)
+    @raises     requests.exceptions.RequestException: if the request fails
+    """
+    core = core if core else solr_core
+    params = search_params(query, start, rows, sort, cursor)
+    cache_key = query_cache_key("search", core, params)
+    page = cache.get(cache_key)
+    if page is None:
+        page = merge_highlighting(get_solr_gateway().select(params, core))
+        cache.set(cache_key, page, search_cache_ttl)
+    return page
+
+
+def document_content(doc_id, core=None):
+    """
+    Extracted text of a single document
+
+    @type       doc_id: string
+    @param      doc_id: Document identifier (Solr id)
+    @type       core: string
+    @param      core: Core name (default: configured core)
+    @rtype: string
+    @return: Extracted text
+    @raises     NotFoundError: if the document does not exist
+    @raises     requests.exceptions.RequestException: if the request fails
+    """
+    result = get_solr_gateway().select({'q': '{!term f=id}%s' % doc_id, 'fl': 'id,%s' % CONTENT_FIELD, 'rows': 1},
+                                       core)
+    docs = result['response']['docs']
+    if not docs:
+        raise NotFoundError("Document not found: %s" % doc_id)
+    content = docs[0].get(CONTENT_FIELD, '')
+    return '\n'.join(content) if isinstance(content, list) else content
+
+
+class TestDocumentSearch(unittest.TestCase):
+
+    def test_search_params(self):
+        params = search_params(" content:archive ", start=-1, rows=search_cache_max_rows + 1, sort=" size  desc ")
+        self.assertEqual("content:archive", params['q'])
+        self.assertNotIn(CONTENT_FIELD, params['fl'].split(','))
+        self.assertEqual(0, params['start'])
+        self.assertEqual(search_cache_max_rows, params['rows'])
+        self.assertEqual("size desc", params['sort'])
+        self.assertEqual("*:*", search_params("")['q'])
+        self.assertNotIn('sort', search_params("*:*"))
+
+    def test_cursor_params(self):
+        params = search_params("*:*", start=40, sort="archivedate desc", cursor="*")
+        self.assertEqual(0, params['start'])
+        self.assertEqual("*", params['cursorMark'])
+        self.assertEqual("archivedate desc,id asc", params['sort'])
+        self.assertNotIn('cursorMark', search_params("*:*"))
+        # relevance (empty sort order of the search page)
+        self.assertEqual("score desc,id asc", search_params("content:archive", sort="", cursor="*")['sort'])
+
+    def test_merge_highlighting(self):
+        result = {'response': {'numFound': 2, 'start': 0, 'docs': [{'id': 'a'}, {'id': 'b'}]},
+                  'highlighting': {'a': {'content': ["an <mark>archive</mark>"]}, 'b': {}}}
+        page = merge_highlighting(result)
+        self.assertEqual(2, page['numFound'])
+        self.assertEqual(["an <mark>archive</mark>"], page['docs'][0]['snippets'])
+        self.assertEqual([], page['docs'][1]['snippets'])
+        self.assertNotIn('nextCursorMark', page)
+        result['nextCursorMark'] = "AoE"
+        self.assertEqual("AoE", merge_highlighting(result)['nextCursorMark'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,6 @@ import logging
 import re
 import tarfile
 from urllib.parse import urlencode
-from urllib.request import urlopen, Request
 
 import pytz
 from urllib.parse import quote
@@ -13,26 +12,21 @@ from eatb.utils.datetime import current_date
 from eatb.utils.fileutils import list_files_in_dir
 from datetime import datetime
 from access.search.solrdocparams import SolrDocParams
-from config.configuration import verify_certificate, representations_directory, metadata_directory, \
+from access.search.solrgateway import get_solr_gateway
+from config.configuration import representations_directory, metadata_directory, \
     metadata_fields_list, data_directory_pattern, node_namespace_id, repo_id, urn_file_pattern
 from eatb.utils.fileutils import to_safe_filename
-from taskbackend.taskutils import is_content_data_path, find_metadata_file 
+from taskbackend.taskutils import is_content_data_path, find_metadata_file
+from taskbackend.progress import ProgressReporter
 
 logger = logging.getLogger(__name__)
 import os
 import json
 import shutil
-import urllib
 
 import lxml.etree as etree
 import unittest
 
-import requests
-
-
-def default_reporter(percent):
-    print("\rProgress: {percent:3.0f}%".format(percent=percent))
-
 
 class SolrClient(object):
 
@@ -53,6 +47,10 @@ class SolrClient(object):
             base_url += '/'
         self.url = base_url + collection
         self.ffid = FormatIdentification()
+        # pooled connections of the shared solr gateway
+        gateway = get_solr_gateway()
+        self.session = gateway.session
+        self.timeout = gateway.timeout
 
     def select_params_suffix(self, params_suffix, rows=1000, start=0):
         """
@@ -64,9 +62,9 @@ class SolrClient(object):
         @rtype: string, int
         @return: Return url and return code
         """
-        url = self.url + '/select?q=%s&rows=%d&start=%d&wt=json' % (urllib.quote(params_suffix), rows, start)
-        conn = urlopen(url)
-        return url, json.load(conn)
+        url = self.url + '/select?q=%s&rows=%d&start=%d&wt=json' % (quote(params_suffix), rows, start)
+        response = self.session.get(url, timeout=self.timeout)
+        return url, response.json()
 
     def select(self, params):
         """
@@ -79,9 +77,9 @@ class SolrClient(object):
         @return: Return url and return code
         """
         params['wt'] = 'json'
-        url = self.url + '/select?' + urllib.urlencode(params)
-        conn = urlopen(url)
-        return url, json.load(conn)
+        url = self.url + '/select?' + urlencode(params)
+        response = self.session.get(url, timeout=self.timeout)
+        return url, response.json()
 
     def delete(self, query):
         """
@@ -93,13 +91,10 @@ class SolrClient(object):
         @rtype: string, int
         @return: Return url and return code
         """
-        params = {}
-        url = self.url + '/update?' + urllib.urlencode(params)
-        request = Request(url)
-        request.add_header('Content-Type', 'text/xml; charset=utf-8')
-        request.add_data('<delete><query>{0}</query></delete>'.format(query))
-        response = urlopen(request).read()
-        status = etree.XML(response).findtext('lst/int')
+        url = self.url + '/update'
+        response = self.session.post(url, data='<delete><query>{0}</query></delete>'.format(query).encode('utf-8'),
+                                     headers={'Content-Type': 'text/xml; charset=utf-8'}, timeout=self.timeout)
+        status = etree.XML(response.content).findtext('lst/int')
         return url, status
 
     def update(self, docs):
@@ -121,11 +116,9 @@ class SolrClient(object):
                     field = etree.Element('field', name=key)
                     field.text = str(value)
                     xdoc.append(field)
-        request = Request(url)
-        request.add_header('Content-Type', 'text/xml; charset=utf-8')
-        request.data =etree.tostring(add_xml, pretty_print=True)
-        response = urlopen(request).read()
-        status = etree.XML(response).findtext('lst/int')
+        response = self.session.post(url, data=etree.tostring(add_xml, pretty_print=True),
+                                     headers={'Content-Type': 'text/xml; charset=utf-8'}, timeout=self.timeout)
+        status = etree.XML(response.content).findtext('lst/int')
         return url, status
 
     def post_file_document(self, file_path, identifier, entry):
@@ -151,7 +144,7 @@ class SolrClient(object):
 
     
 
-    def post_tar_file(self, tar_file_path, identifier, version, progress_reporter=default_reporter, task_log=None):
+    def post_tar_file(self, tar_file_path, identifier, version, progress_reporter=None, task_log=None):
         """
         Iterate over tar file and post documents it contains to Solr API (extract)
 
@@ -161,10 +154,13 @@ class SolrClient(object):
         @type       identifier: string
         @param      identifier: Identifier of the tar package
 
+        @type       progress_reporter: ProgressReporter
+        @param      progress_reporter: Progress reporter (optional)
+
         @rtype: list(dict(string, int))
         @return: Return list of urls and return codes
         """
-        progress_reporter(0)
+        progress_reporter = progress_reporter if progress_reporter else ProgressReporter()
         tfile = tarfile.open(tar_file_path, 'r')
         extract_dir = '/tmp/temp-' + randomutils.randomword(10)
         results = []
@@ -197,9 +193,10 @@ class SolrClient(object):
 
         # Get number of files in tar
         numfiles = sum(1 for tarinfo in tfile if tarinfo.isreg())
+        numbytes = sum(tarinfo.size for tarinfo in tfile if tarinfo.isreg())
         task_log.debug("Number of files in tarfile: %s " % numfiles)
+        progress_reporter.start(numfiles, numbytes)
 
-        num = 0
         for t in tfile:
             afile = os.path.join(extract_dir, t.name)
             task_log.info(afile)
@@ -242,7 +239,8 @@ class SolrClient(object):
 
                 files = {'file': ('userfile', open(afile, 'rb'))}
                 post_url = '%s/update/extract?%s' % (self.url, urlencode(params))
-                response = requests.post(post_url, files=files, verify=verify_certificate)
+                # no read timeout, text extraction of large files can take long
+                response = self.session.post(post_url, files=files, timeout=(self.timeout[0], None))
                 result = {"url": post_url, "status": response.status_code}
 
                 if response.status_code != 200:
@@ -252,16 +250,15 @@ class SolrClient(object):
                     else:
                         task_log.info("Unable to create document for URL '%s'" % post_url)
                 results.append(result)
-                num += 1
-                percent = num * 100 / numfiles
-                progress_reporter(percent)
+            if t.isreg():
+                progress_reporter.advance(1, t.size)
 
         self.commit()
         logger.info(f"Extract directory: {extract_dir}")
         #shutil.rmtree(extract_dir)
-        progress_reporter(100)
+        progress_reporter.finish()
         
-    def index_directory(self, directory_path, identifier, version, progress_reporter=default_reporter, task_log=None):
+    def index_directory(self, directory_path, identifier, version, progress_reporter=None, task_log=None):
         """
         Recursively iterate over files in a directory and post them to Solr.
 
@@ -271,10 +268,13 @@ class SolrClient(object):
         @type       identifier: string
         @param      identifier: Identifier of the package
 
+        @type       progress_reporter: ProgressReporter
+        @param      progress_reporter: Progress reporter (optional)
+
         @rtype: list(dict(string, int))
         @return: List of URLs and their corresponding return codes
         """
-        progress_reporter(0)
+        progress_reporter = progress_reporter if progress_reporter else ProgressReporter(custom_logger=task_log)
         task_log = task_log if task_log else logger
         results = []
 
@@ -289,25 +289,25 @@ class SolrClient(object):
         # Regex to match the valid file paths
         valid_path_regex = re.compile(data_directory_pattern)
 
-        # Collect all files matching the pattern
+        # Collect all files matching the pattern (with size and ctime, the files are stat'ed once)
         files_to_index = []
         for root, dirs, files in os.walk(directory_path):
             for file in files:
                 full_path = os.path.join(root, file)
-                rel_path = os.path.relpath(full_path, directory_path)
                 if valid_path_regex.search(full_path):
-                    files_to_index.append(full_path)
+                    files_to_index.append((full_path, os.stat(full_path)))
 
         numfiles = len(files_to_index)
         task_log.info(f"Found {numfiles} content files for indexing.")
+        progress_reporter.start(numfiles, sum(file_stat.st_size for _, file_stat in files_to_index))
 
-        for num, file_path in enumerate(files_to_index, 1):
+        for num, (file_path, file_stat) in enumerate(files_to_index, 1):
             params = SolrDocParams(file_path).get_params()
             params['literal.package'] = identifier
             params['literal.path'] = os.path.relpath(file_path, directory_path)
-            params['literal.size'] = os.path.getsize(file_path)
+            params['literal.size'] = file_stat.st_size
             params['literal.indexdate'] = current_date(time_zone_id='UTC')
-            params['literal.archivedate'] = datetime.fromtimestamp(os.path.getctime(file_path)).astimezone(pytz.UTC)
+            params['literal.archivedate'] = datetime.fromtimestamp(file_stat.st_ctime).astimezone(pytz.UTC)
             params['literal.version'] = int(re.search(r'\d+', version).group(0))
 
             # Add descriptions and metadata
@@ -343,7 +343,8 @@ class SolrClient(object):
                 with open(file_path, 'rb') as f:
                     files = {'file': ('userfile', f)}
                     post_url = f"{self.url}/update/extract?{urlencode(params)}"
-                    response = requests.post(post_url, files=files, verify=verify_certificate)
+                    # no read timeout, text extraction of large files can take long
+                    response = self.session.post(post_url, files=files, timeout=(self.timeout[0], None))
                     result = {"url": post_url, "status": response.status_code}
                     results.append(result)
 
@@ -352,10 +353,10 @@ class SolrClient(object):
             except Exception as e:
                 task_log.error(f"Error posting file '{file_path}': {str(e)}")
 
-            percent = (num / numfiles) * 100
-            progress_reporter(percent)
+            progress_reporter.advance(1, params['literal.size'])
 
         self.commit()
+        progress_reporter.finish()
         task_log.info(f"Finished indexing files in directory: {directory_path}")
         return results
 
@@ -369,8 +370,8 @@ class SolrClient(object):
         @return: Return url and return code
         """
         url = self.url + '/update?commit=true'
-        response = urlopen(url)
-        return url, response.code
+        response = self.session.get(url, timeout=self.timeout)
+        return url, response.status_code
 
 
 class TestSolr(unittest.TestCase):
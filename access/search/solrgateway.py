@@ -0,0 +1,318 @@
+"""Solr gateway"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import unittest
+from collections import defaultdict
+
+import pysolr
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config.configuration import solr_service_url, solr_core, verify_certificate, solr_connect_timeout, \
+    solr_read_timeout, solr_retries, solr_pool_size
+
+logger = logging.getLogger(__name__)
+
+
+class SolrGateway(object):
+    """
+    Shared access to the Solr service: one pooled HTTP session (keep-alive connections) per process with timeouts,
+    retries of idempotent requests on connection errors and unavailability (502, 503, 504), and request metrics
+    (number of requests, errors and response time per operation).
+    """
+
+    def __init__(self, base_url=solr_service_url, timeout=(solr_connect_timeout, solr_read_timeout),
+                 retries=solr_retries, pool_size=solr_pool_size, verify=verify_certificate):
+        """
+        Constructor to initialise the gateway
+
+        @type       base_url: string
+        @param      base_url: Solr service URL, e.g. "http://localhost:8983/solr"
+        @type       timeout: tuple
+        @param      timeout: Connect and read timeout (seconds)
+        @type       retries: int
+        @param      retries: Number of retries of failed idempotent requests
+        @type       pool_size: int
+        @param      pool_size: Maximum number of pooled connections
+        @type       verify: bool
+        @param      verify: Verify TLS certificates
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.verify = verify
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(502, 503, 504), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.hooks['response'].append(self._record_response)
+        self._metrics = defaultdict(lambda: {'requests': 0, 'errors': 0, 'seconds': 0.0})
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _operation(url):
+        path = url.split('?', 1)[0].rstrip('/')
+        return path.rsplit('/', 1)[-1] if path else ''
+
+    def _record(self, operation, seconds, error):
+        with self._lock:
+            metric = self._metrics[operation]
+            metric['requests'] += 1
+            metric['seconds'] += seconds
+            if error:
+                metric['errors'] += 1
+
+    def _record_response(self, response, *args, **kwargs):
+        operation = self._operation(response.url)
+        self._record(operation, response.elapsed.total_seconds(), response.status_code >= 400)
+        if response.ok and ('commit=true' in response.url or operation == 'cores'):
+            index_changed()
+
+    def metrics(self):
+        """
+        Request metrics of this process
+
+        @rtype: dict
+        @return: Number of requests, errors and total response time (seconds) per operation (e.g. 'select')
+        """
+        with self._lock:
+            return {operation: dict(metric) for operation, metric in self._metrics.items()}
+
+    def core_url(self, core=None):
+        """
+        Get URL of a core
+
+        @type       core: string
+        @param      core: Core name (default: configured core)
+        @rtype: string
+        @return: Core URL
+        """
+        return '%s/%s' % (self.base_url, core if core else solr_core)
+
+    def request(self, method, path, core=None, **kwargs):
+        """
+        Send a request to a core
+
+        @type       method: string
+        @param      method: HTTP method
+        @type       path: string
+        @param      path: Path relative to the core URL (e.g. 'select', 'update/extract')
+        @type       core: string
+        @param      core: Core name (default: configured core)
+        @rtype: requests.Response
+        @return: Response
+        @raises     requests.exceptions.RequestException: if the request fails (connection error, timeout)
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        url = '%s/%s' % (self.core_url(core), path.lstrip('/'))
+        start = time.monotonic()
+        try:
+            return self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            self._record(self._operation(url), time.monotonic() - start, True)
+            raise
+
+    def get(self, path, params=None, core=None, **kwargs):
+        """Send GET request to a core (see request)"""
+        return self.request('GET', path, core, params=params, **kwargs)
+
+    def post(self, path, params=None, core=None, **kwargs):
+        """Send POST request to a core (see request)"""
+        return self.request('POST', path, core, params=params, **kwargs)
+
+    def select(self, params, core=None):
+        """
+        Search a core
+
+        @type       params: dict
+        @param      params: Query parameters
+        @rtype: dict
+        @return: JSON response
+        @raises     requests.exceptions.RequestException: if the request fails or returns an error status
+        """
+        response = self.get('select', params=dict(params, wt='json'), core=core)
+        response.raise_for_status()
+        return response.json()
+
+    def cursor_pages(self, params, core=None):
+        """
+        Iterate over all result pages of a query using cursor based paging (cursorMark), the cost of a page does not
+        depend on its position in the result list
+
+        @type       params: dict
+        @param      params: Query parameters (rows: page size, sort: sort order, the unique key is added as tiebreaker)
+        @type       core: string
+        @param      core: Core name (default: configured core)
+        @rtype: generator
+        @return: JSON responses of the result pages
+        @raises     requests.exceptions.RequestException: if a request fails or returns an error status
+        """
+        params = dict(params, sort=cursor_sort(params.get('sort', '')))
+        params.pop('start', None)
+        cursor_mark = '*'
+        while True:
+            result = self.select(dict(params, cursorMark=cursor_mark), core)
+            yield result
+            next_cursor_mark = result.get('nextCursorMark')
+            if not next_cursor_mark or next_cursor_mark == cursor_mark:
+                break
+            cursor_mark = next_cursor_mark
+
+    def num_found(self, query, core=None, **params):
+        """Number of documents matching a query"""
+        return int(self.select(dict(params, q=query, rows=0), core)['response']['numFound'])
+
+    def update(self, data, content_type, commit=True, core=None):
+        """
+        Post an update request (add or delete documents)
+
+        @type       data: bytes
+        @param      data: Request body (XML or JSON)
+        @type       content_type: string
+        @param      content_type: Content type of the request body
+        @type       commit: bool
+        @param      commit: Commit changes
+        @rtype: requests.Response
+        @return: Response
+        """
+        params = {'commit': 'true'} if commit else None
+        return self.post('update', params=params, core=core, data=data, headers={'Content-Type': content_type})
+
+    def commit(self, core=None):
+        """Commit changes"""
+        return self.get('update', params={'commit': 'true'}, core=core)
+
+    def ping(self, core=None):
+        """
+        Check availability of a core
+
+        @rtype: bool
+        @return: True if the core is available
+        """
+        try:
+            return self.get('admin/ping', core=core, timeout=(solr_connect_timeout, 10)).status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+    def reload_core(self, core=None):
+        """Reload a core (e.g. after schema changes)"""
+        return self.session.get('%s/admin/cores' % self.base_url, timeout=self.timeout,
+                                params={'action': 'RELOAD', 'core': core if core else solr_core})
+
+    def client(self, core=None, always_commit=False):
+        """
+        pysolr client of a core using the shared session
+
+        @rtype: pysolr.Solr
+        @return: pysolr client
+        """
+        return pysolr.Solr(self.core_url(core), timeout=self.timeout, always_commit=always_commit,
+                           session=self.session)
+
+
+def cursor_sort(sort, unique_key='id'):
+    """
+    Sort order for cursor based paging: it must include the unique key of the core as tiebreaker. Without a sort
+    order, results are sorted by relevance (Solr's default order).
+
+    @type       sort: string
+    @param      sort: Sort order (e.g. 'archivedate desc', empty for relevance)
+    @type       unique_key: string
+    @param      unique_key: Unique key field
+    @rtype: string
+    @return: Sort order including the unique key (e.g. 'archivedate desc,id asc')
+    """
+    clauses = [" ".join(clause.split()) for clause in sort.split(',') if clause.strip()] if sort else []
+    if not clauses:
+        clauses.append('score desc')
+    if not any(clause.split()[0] == unique_key for clause in clauses):
+        clauses.append('%s asc' % unique_key)
+    return ",".join(clauses)
+
+
+_gateway = None
+_gateway_pid = None
+_gateway_lock = threading.Lock()
+
+INDEX_VERSION_KEY = "solr:index_version"
+
+
+def index_version():
+    """
+    Token identifying the state of the index, it changes with every commit or core reload sent through the gateway
+    (used to invalidate cached query results)
+
+    @rtype: int
+    @return: Index version
+    """
+    from django.core.cache import cache
+    return cache.get_or_set(INDEX_VERSION_KEY, time.time_ns, None)
+
+
+def index_changed():
+    """Mark the index as changed (new index version)"""
+    from django.core.cache import cache
+    try:
+        cache.set(INDEX_VERSION_KEY, time.time_ns(), None)
+    except Exception as e:
+        logger.warning("Unable to update the index version: %s" % e)
+
+
+def query_cache_key(prefix, *parts):
+    """
+    Cache key of a query result, it includes the index version so that cached results are invalidated by commits
+
+    @type       prefix: string
+    @param      prefix: Key prefix (e.g. 'solrif')
+    @param      parts: JSON serializable parts identifying the query (core, operation, parameters)
+    @rtype: string
+    @return: Cache key
+    """
+    return "%s:%s" % (prefix, hashlib.sha256(json.dumps(
+        [index_version()] + list(parts), sort_keys=True).encode('utf-8')).hexdigest())
+
+
+def get_solr_gateway():
+    """
+    Solr gateway of the current process (created on first use, and again in forked worker processes so that
+    connections are not shared across processes)
+
+    @rtype: SolrGateway
+    @return: Solr gateway
+    """
+    global _gateway, _gateway_pid
+    with _gateway_lock:
+        if _gateway is None or _gateway_pid != os.getpid():
+            _gateway = SolrGateway()
+            _gateway_pid = os.getpid()
+        return _gateway
+
+
+class TestSolrGateway(unittest.TestCase):
+
+    def test_urls(self):
+        gateway = SolrGateway("http://127.0.0.1:8888/solr/")
+        self.assertEqual("http://127.0.0.1:8888/solr/earkweb", gateway.core_url("earkweb"))
+        self.assertEqual("select", SolrGateway._operation("http://127.0.0.1:8888/solr/earkweb/select?q=*:*"))
+        self.assertEqual("extract", SolrGateway._operation("http://127.0.0.1:8888/solr/earkweb/update/extract"))
+
+    def test_cursor_sort(self):
+        self.assertEqual("score desc,id asc", cursor_sort(""))
+        self.assertEqual("score desc,id asc", cursor_sort(" , "))
+        self.assertEqual("archivedate desc,id asc", cursor_sort(" archivedate  desc "))
+        self.assertEqual("size asc,id desc", cursor_sort("size asc, id desc"))
+
+    def test_metrics(self):
+        gateway = SolrGateway("http://127.0.0.1:8888/solr/")
+        gateway._record("select", 0.5, False)
+        gateway._record("select", 0.25, True)
+        self.assertEqual({'select': {'requests': 2, 'errors': 1, 'seconds': 0.75}}, gateway.metrics())
+
+
+if __name__ == '__main__':
+    unittest.main()
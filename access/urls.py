@@ -10,6 +10,8 @@ urlpatterns = [
     re_path(r'^$', views.index, name='index'),
     re_path(r'^index$', views.index, name='index'),
     re_path(r'^search$', views.search, name='search'),
+    re_path(r'^search/results$', views.search_results, name='search-results'),
+    re_path(r'^search/content$', views.search_result_content, name='search-result-content'),
     re_path(fr'^(?P<identifier>{identifier_pattern})/get-item/(?P<entry>{entry_pattern})/$',
         views.get_information_package_item, name='access_aip_item'),
     re_path(r'^indexing-task-status/(?P<task_id>.+)/$', views.indexing_task_status, name='indexing-task-status'), 
@@ -1,4 +1,6 @@
 import json
+import mimetypes
+import os
 import traceback
 import logging
 
@@ -31,13 +33,17 @@ from config.configuration import flower_service_url
 from config.configuration import flower_user
 from config.configuration import flower_password
 from earkweb.models import InformationPackage, Representation
+from earkweb.statistics import indexed_document_counts
+from api.services import package_entry_path, package_entry_response
+from util.custom_exceptions import AuthenticationError, NotFoundError
 
 from django.utils.translation import gettext_lazy as _
 
 
 
-from util.djangoutils import error_resp, get_user_api_token
-from util import service_available
+from util.djangoutils import error_resp, get_user_api_token, filter_information_packages
+from access.search.solrgateway import get_solr_gateway
+from access.search.documentsearch import search_documents, document_content
 
 from celery.result import AsyncResult
 
@@ -57,10 +63,10 @@ def indexingstatus(request):
     """
     Indexing Status Table view
     """
-    if not service_available(solr_core_ping_url):
+    if not get_solr_gateway().ping():
         return render(request, 'earkweb/error.html', {'header': 'SolR server unavailable', 'message': "Required service is not available at: %s" % solr_core_ping_url})
     # pylint: disable-next=no-member
-    queryset=InformationPackage.objects.extra(where=["storage_dir != ''"]).order_by('-last_change')
+    queryset = InformationPackage.objects.exclude(storage_dir='').order_by('-last_change')
     table = IndexingStatusTable(queryset)
     RequestConfig(request, paginate={'per_page': 10}).configure(table)
     return render(request, 'access/indexing_status.html', {
@@ -74,26 +80,10 @@ def indexingstatus(request):
 @csrf_exempt
 def informationpackages_overview(request):
     area = "access"
-    areacode = "1"
     filterword = request.POST['filterword'] if 'filterword' in request.POST.keys() else ""
-    sql_query = """
-    select ip.id as id, ip.work_dir as path, ip.uid as uid, ip.package_name as package_name, 
-    ip.identifier as identifier,
-    CONCAT('<a href="/earkweb/submission/upload_step1/',ip.id,'/" data-toggle="tooltip" title="Change">
-    <i class="fas fa-edit editcol"></i></a>') as edit,
-    CONCAT('<a href="/earkweb/submission/ips/',ip.id,'/startingest" data-toggle="tooltip" title="Ingest">
-    <i class="fas fa-box editcol"></i></a>') as ingest,
-    CONCAT('<a href="/earkweb/submission/delete/',ip.id,'/" data-toggle="tooltip" title="Delete">
-    <i class="fas fa-trash editcol"></i></a>') as delcol 
-    from informationpackage as ip
-    where 
-    (ip.uid like '%%{0}%%' or ip.package_name like '%%{0}%%' or ip.identifier like '%%{0}%%')
-    and deleted != 1
-    order by ip.last_change desc;
-    """.format(filterword, areacode)
-    # user_id={0} and, request.user.pk
     # pylint: disable-next=no-member
-    queryset = InformationPackage.objects.raw(sql_query)
+    queryset = filter_information_packages(InformationPackage.objects.filter(deleted=False),
+                                           filterword).order_by('-last_change')
     table = IndexingStatusTable(queryset)
     RequestConfig(request, paginate={'per_page': 8}).configure(table)
     context = {
@@ -112,7 +102,8 @@ class IndexingStatusTable(tables.Table):
     identifier = tables.LinkColumn('access:asset', args={A('identifier')}, verbose_name=_('Identifier'))
 
     last_change = tables.DateTimeColumn(format="d.m.Y H:i:s", verbose_name=_('Last change'))
-    num_indexed_docs_storage = tables.Column(verbose_name=_('Indexed'))
+    num_indexed_docs_storage = tables.Column(accessor='identifier', default=0, orderable=False,
+                                             verbose_name=_('Indexed'))
     indexing_action = tables.TemplateColumn(template_name='access/action_buttons.html', verbose_name=_('Action'), orderable=False)
     indexing_status = tables.TemplateColumn(template_name='access/indexing_status_div.html', verbose_name=_('Status'), orderable=False)
 
@@ -122,10 +113,18 @@ class IndexingStatusTable(tables.Table):
         attrs = {'class': 'paleblue table table-striped table-bordered table-condensed'}
         row_attrs = {'data-id': lambda record: record.pk}
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.indexed_counts = None
+
     def render_num_indexed_docs_storage(self, value, record):
         """Render number of indexed docs with record information"""
+        if self.indexed_counts is None:
+            # one lookup for all packages of the current page
+            rows = self.page.object_list if hasattr(self, 'page') else self.rows
+            self.indexed_counts = indexed_document_counts([getattr(row, 'record', row).identifier for row in rows])
         pk = record.pk  # Access the primary key of the current record
-        return mark_safe(f'<b id="val-{pk}">{value}</b>')
+        return mark_safe(f'<b id="val-{pk}">{self.indexed_counts.get(value, 0)}</b>')
     
     def render_indexing_action(self, record):
         """Render button"""
@@ -279,6 +278,75 @@ def search(request):
     return HttpResponse(template.render(context=context, request=request))
 
 
+def search_error_response(err):
+    """
+    Error response of a failed search request: client errors reported by Solr (e.g. query syntax errors, invalid
+    cursor mark) are returned as 400 with the Solr error message, connection errors and server errors as 503
+
+    Parameters:
+    - err: The exception raised by the search request.
+
+    Returns:
+    - JsonResponse: {'error': ...}
+    """
+    response = err.response if isinstance(err, requests.exceptions.HTTPError) else None
+    if response is not None and 400 <= response.status_code < 500:
+        try:
+            message = response.json()['error']['msg']
+        except (ValueError, KeyError, TypeError):
+            message = "Invalid search request"
+        return JsonResponse({"error": message}, status=400)
+    logger.error("Search request failed: %s", err)
+    return JsonResponse({"error": "The search service is not available"}, status=503)
+
+
+@login_required
+def search_results(request):
+    """
+    Search result page (JSON): lightweight document fields and highlighting snippets of the matched terms
+
+    Parameters:
+    - request: The HTTP request object (parameters: q, start, rows, sort, cursor). With the cursor parameter ('*'
+      for the first page, then the nextCursorMark of the previous page) cursor based paging is used.
+
+    Returns:
+    - JsonResponse: {'numFound': ..., 'start': ..., 'docs': [...], 'nextCursorMark': ...}
+    """
+    try:
+        start = int(request.GET.get('start', '0'))
+        rows = int(request.GET.get('rows', '20'))
+    except ValueError:
+        return JsonResponse({"error": "Invalid start or rows parameter"}, status=400)
+    try:
+        page = search_documents(request.GET.get('q', ''), start, rows, request.GET.get('sort', ''),
+                                cursor=request.GET.get('cursor'))
+    except requests.exceptions.RequestException as err:
+        return search_error_response(err)
+    return JsonResponse(page)
+
+
+@login_required
+def search_result_content(request):
+    """
+    Extracted text of a single search result document (retrieved on demand)
+
+    Parameters:
+    - request: The HTTP request object (parameter: id).
+
+    Returns:
+    - JsonResponse: {'id': ..., 'content': ...}
+    """
+    doc_id = request.GET.get('id', '')
+    if not doc_id:
+        return JsonResponse({"error": "Missing parameter: id"}, status=400)
+    try:
+        return JsonResponse({"id": doc_id, "content": document_content(doc_id)})
+    except NotFoundError as err:
+        return JsonResponse({"error": str(err)}, status=404)
+    except requests.exceptions.RequestException as err:
+        return search_error_response(err)
+
+
 @login_required
 @csrf_exempt
 def get_information_package_item(request, identifier, entry):
@@ -287,32 +355,30 @@ def get_information_package_item(request, identifier, entry):
     logging.debug("Data asset: %s " % identifier)
     logging.debug("Entry path: %s " % entry)
 
-    url = f"{django_service_url}/api/ips/{identifier}/file-item/{entry}/"
-    user_api_token = get_user_api_token(request.user)
-    response = requests.get(url, headers={'Authorization': 'Token %s' % user_api_token}, verify=verify_certificate)
-    if response.status_code == 404:
+    try:
+        file_path = package_entry_path(identifier, entry)
+        if not os.path.isfile(file_path):
+            return render(request, 'earkweb/error.html',
+                          {'header': 'Not available',
+                           'message': "Resource not found!"})
+        content_type, _ = mimetypes.guess_type(file_path)
+        if content_type == "application/pdf" and "raw" not in request.GET:
+            # the viewer loads the document from the raw entry url (range requests)
+            search_term = request.GET["search"] if "search" in request.GET else None
+            url = "%s?raw=1" % request.path
+            return render(request, 'access/pdfviewer.html', {'url': url, "search": search_term})
+        return package_entry_response(request, identifier, entry)
+    except (FileNotFoundError, AuthenticationError):
         return render(request, 'earkweb/error.html',
                       {'header': 'Not available',
                        'message': "Resource not found!"})
-    elif response.status_code == 200:
-        content_type = response.headers['content-type']
-        if content_type == "application/pdf":
-            search_term = request.GET["search"] if "search" in request.GET else None
-            import base64
-            base64_encoded = base64.b64encode(response.content)
-            base64_string = base64_encoded.decode("ascii")
-            return render(request, 'access/pdfviewer.html', {'url': url, "search": search_term, 'data': base64_string})
-        if content_type.startswith('text'):
-            content_type = '%s; charset=utf-8' % content_type
-        print(content_type)
-        return HttpResponse(response.content, content_type=content_type)
-    else:
+    except OSError:
+        logging.error(traceback.format_exc())
         return render(request, 'earkweb/error.html',
                       {'header': 'An error occurred',
                        'message': "An error occurred when trying to retrieve the entry: %s" % entry})
 
 
-
 @login_required
 def reindex_storage(request):
     """
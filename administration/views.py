@@ -7,13 +7,13 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 from eatb.utils.fileutils import human_readable_size, total_directory_size
 
-from config.configuration import flower_service_url, flower_host, flower_port, flower_path, solr_core_ping_url, \
+from config.configuration import flower_service_url, flower_host, flower_port, flower_path, \
     solr_core_url, solr_core, solr_core_overview_url, config_path_work, config_path_storage
 
 from taskbackend.tasks import backend_available
 from celery.exceptions import TimeoutError
 from taskbackend.taskutils import get_celery_worker_status, flower_is_running
-from util import service_available
+from access.search.solrgateway import get_solr_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -52,7 +52,8 @@ def dashboard(request):
         'celery_worker_status': get_celery_worker_status(),
         'flower_status': flower_is_running(),
         'flower_api_endpoint': flower_service_url,
-        'solr_available': service_available(solr_core_ping_url),
+        'solr_available': get_solr_gateway().ping(),
+        'solr_metrics': get_solr_gateway().metrics(),
         'solr_core_url': solr_core_url,
         'solr_core': solr_core,
         'solr_core_overview_url': solr_core_overview_url,
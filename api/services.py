@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# coding=UTF-8
+"""
+In-process services shared by the REST API views and the UI views (file resources, directory listings,
+inventories), so that UI views do not need to call the REST API over HTTP.
+"""
+import logging
+import mimetypes
+import os
+import re
+import unittest
+
+from django.contrib.auth.models import User
+from django.http import HttpResponseNotFound, HttpResponseBadRequest, HttpResponseForbidden, \
+    HttpResponseServerError
+from eatb.pairtree_storage import make_storage_data_directory_path, PairtreeStorage
+from eatb.utils.fileutils import fsize, get_mime_type, get_directory_json, to_safe_filename, from_safe_filename
+
+from config.configuration import config_path_work, config_path_storage, config_path_reception, file_size_limit, \
+    config_max_http_download, directory_page_size, api_page_size
+from earkweb.models import InformationPackage
+from util.custom_exceptions import NotFoundError, AuthenticationError
+from util.directorylisting import directory_children, directory_tree, DirectoryEntry
+from util.fileresponse import conditional_file_response, file_etag, text_file_response
+from util.storageinventory import get_file_digest, load_inventory, INVENTORY_FILE_NAME
+
+logger = logging.getLogger(__name__)
+
+uid_regex = re.compile(r'^[a-z0-9\-]{36,36}$')
+
+
+def is_process_id(item):
+    """True if the item is a process ID (working area), otherwise it is a package identifier (storage area)"""
+    return bool(uid_regex.match(item))
+
+
+def contained_path(base_dir, sub_path):
+    """
+    Get path of a file within a base directory
+    @type       base_dir: string
+    @param      base_dir: Base directory
+    @type       sub_path: string
+    @param      sub_path: Path relative to the base directory
+    @rtype:     string
+    @return:    Normalized file path
+    @raises     AuthenticationError: if the path points outside of the base directory (e.g. '../<base>X/file' in
+                                     a sibling directory whose name starts with the name of the base directory)
+    """
+    base_dir = os.path.normpath(base_dir)
+    file_path = os.path.normpath(os.path.join(base_dir, sub_path))
+    if os.path.commonpath([file_path, base_dir]) != base_dir:
+        raise AuthenticationError("Invalid file path")
+    return file_path
+
+
+def working_file_path(uid, ip_sub_file_path):
+    """
+    Get path of a file in the working directory of a process
+    @raises     AuthenticationError: if the path points outside of the working directory
+    """
+    return contained_path(contained_path(config_path_work, uid), ip_sub_file_path)
+
+
+def storage_file_path(identifier, ip_sub_file_path):
+    """
+    Get path of a file in the storage directory of a package (path relative to the OCFL object root)
+    @raises     AuthenticationError: if the path points outside of the storage directory of the package
+    """
+    storage_dir = make_storage_data_directory_path(from_safe_filename(identifier), config_path_storage)
+    return contained_path(storage_dir, ip_sub_file_path)
+
+
+def package_entry_path(identifier, entry):
+    """
+    Get path of an entry of an archived package (object path of the pairtree storage)
+    @raises     FileNotFoundError: if the package does not exist
+    """
+    dpts = PairtreeStorage(config_path_storage)
+    base_path = dpts.get_object_path(from_safe_filename(identifier))
+    return contained_path(base_path, entry)
+
+
+def is_text_file(file_path, mime):
+    return mime.startswith("text/") or mime.endswith("xml") or "0=ocfl_object_1.0" in file_path or \
+        "inventory.json.sha512" in file_path
+
+
+def read_file(file_path, request=None, etag=None):
+    """
+    Reads a file from the given file path and returns an HTTP response with its content.
+
+    Packages and binary files are streamed and support conditional (If-None-Match, If-Modified-Since) and
+    byte range requests. Text files are streamed as UTF-8 (encoding detected from a sample prefix) if their
+    size does not exceed the viewer limit.
+
+    Args:
+        file_path (str): The path to the file to be read.
+        request (HttpRequest): The request (used to evaluate conditional and range request headers).
+        etag (str): ETag of the file (default: derived from file size and modification time).
+
+    Returns:
+        HttpResponse: An HTTP response containing the file content.
+    """
+    try:
+        if not os.path.exists(file_path):
+            return HttpResponseNotFound("File not found %s" % file_path)
+        elif not os.path.isfile(file_path):
+            return HttpResponseBadRequest("Not a file")
+        else:
+            file_size = fsize(file_path)
+            mime = get_mime_type(file_path)
+            if file_size > config_max_http_download:
+                return HttpResponseForbidden(
+                    "Size of requested file exceeds limit (file size %d > %d)" % (file_size, config_max_http_download))
+            if file_path.lower().endswith(('.tar', '.tar.gz', 'zip')):
+                return conditional_file_response(request, file_path, mime, etag, as_attachment=True)
+            if not is_text_file(file_path, mime):
+                return conditional_file_response(request, file_path, mime, etag)
+            if file_size <= file_size_limit:
+                mime = "text/xml;charset=utf-8" if mime.endswith("xml") else "text/plain;charset=utf-8"
+                return text_file_response(request, file_path, mime, etag)
+            else:
+                return HttpResponseForbidden("Size of requested file exceeds limit (file size %d > %d)" %
+                                             (file_size, file_size_limit))
+    except OSError as e:
+        return HttpResponseServerError(f"An error occurred: {e}")
+
+
+def working_file_response(request, uid, ip_sub_file_path):
+    """Response with the content of a file in the working area"""
+    try:
+        file_path = working_file_path(uid, ip_sub_file_path)
+    except AuthenticationError as e:
+        return HttpResponseForbidden(str(e))
+    return read_file(file_path, request)
+
+
+def reception_file_response(request, ip_sub_file_path):
+    """Response with the content of a file in the reception area"""
+    try:
+        file_path = contained_path(config_path_reception, ip_sub_file_path)
+    except AuthenticationError as e:
+        return HttpResponseForbidden(str(e))
+    return read_file(file_path, request)
+
+
+def storage_file_response(request, identifier, ip_sub_file_path):
+    """Response with the content of a file in the storage area (ETag derived from the inventory digest)"""
+    try:
+        file_path = storage_file_path(identifier, ip_sub_file_path)
+    except AuthenticationError as e:
+        return HttpResponseForbidden(str(e))
+    etag = file_etag(file_path, get_file_digest(file_path)) if os.path.isfile(file_path) else None
+    return read_file(file_path, request, etag)
+
+
+def package_entry_response(request, identifier, entry):
+    """
+    Response streaming an entry of an archived package
+    @raises     NotFoundError: if the entry does not exist
+    @raises     FileNotFoundError: if the package does not exist
+    """
+    file_path = package_entry_path(identifier, entry)
+    if not os.path.isfile(file_path):
+        raise NotFoundError(f"Entry {entry} does not exist in archival package '{identifier}'")
+    mime_type, _ = mimetypes.guess_type(file_path)
+    mime_type = mime_type or "application/octet-stream"
+    if mime_type.startswith('text'):
+        mime_type = '%s; charset=utf-8' % mime_type
+        return text_file_response(request, file_path, mime_type, file_etag(file_path, get_file_digest(file_path)))
+    return conditional_file_response(request, file_path, mime_type, file_etag(file_path, get_file_digest(file_path)))
+
+
+def _check_owner(user, ip):
+    try:
+        u = User.objects.get(username=user)
+        if u != ip.user:
+            raise AuthenticationError("Unauthorized. Access to this directory is not permitted.")
+    except User.DoesNotExist:
+        raise RuntimeError("Internal error: user does not exist")
+
+
+def _area_access_path(area, item, user):
+    """
+    Get access path of an area and the item path relative to it, checking that the user owns the package
+    @rtype:     tuple
+    @return:    Access path, item path
+    """
+    if area not in ["work", "storage", "reception"]:
+        raise NotFoundError("Area not defined.")
+    access_path = None
+    version = None
+    if area == "reception":
+        access_path = config_path_reception
+    if area == "work":
+        access_path = config_path_work
+    elif area == "storage":
+        dpts = PairtreeStorage(config_path_storage)
+        version = dpts.curr_version(item)
+        access_path = os.path.join(make_storage_data_directory_path(item, config_path_storage), version)
+    if area in ["work", "storage"]:
+        try:
+            if area == "work":
+                # pylint: disable-next=no-member
+                ip = InformationPackage.objects.get(uid=item)
+            else:
+                version_clean = re.sub(r"\D", "", version)
+                version_nr = int(version_clean)
+                # pylint: disable-next=no-member
+                ip = InformationPackage.objects.get(identifier=item, version=version_nr)
+            _check_owner(user, ip)
+        # pylint: disable-next=no-member
+        except InformationPackage.DoesNotExist:
+            raise NotFoundError("process does not exist")
+        item_path = to_safe_filename(item)
+    else:
+        item_path = item
+    if area == "storage":
+        item_path = ""
+    item_path = "." if not item_path else item_path
+    if not os.path.exists(os.path.join(access_path, item_path)):
+        raise NotFoundError("Access path does not exist: %s" % os.path.join(access_path, to_safe_filename(item)))
+    return access_path, item_path
+
+
+def area_directory_json(area, item, user):
+    """
+    Directory listing of a working directory, an archived package (current version) or the reception area
+    @type       area: string
+    @param      area: Area ('work', 'storage' or 'reception')
+    @type       item: string
+    @param      item: Process ID (work), package identifier (storage) or None (reception)
+    @type       user: User
+    @param      user: Requesting user (must be the owner of the package in the working and storage areas)
+    @rtype:     dict
+    @return:    Directory listing (jstree JSON)
+    @raises     NotFoundError: if the area, package or directory does not exist
+    @raises     AuthenticationError: if the user is not the owner of the package
+    """
+    access_path, item_path = _area_access_path(area, item, user)
+    if area == "work":
+        return get_directory_json(access_path, item_path)
+    elif area == "storage":
+        lister = inventory_lister(item)
+        if lister:
+            return {"data": directory_tree(os.path.dirname(access_path), "", "../", lister), "check_callback": "true"}
+        return get_directory_json(access_path, "../")
+    return get_directory_json(access_path, ".")
+
+
+def area_tree_root(area, item, user):
+    """
+    Root directory of the directory tree of an area and prefix of the node paths (paths used to access file
+    resources are the same as in the complete directory listing)
+    @rtype:     tuple
+    @return:    Root directory, path prefix
+    """
+    access_path, item_path = _area_access_path(area, item, user)
+    if area == "work":
+        return os.path.join(access_path, item_path), "%s/" % item_path
+    elif area == "storage":
+        return os.path.dirname(access_path), "../"
+    return access_path, ""
+
+
+def area_directory_children(area, item, user, node_path="", offset=0, limit=directory_page_size):
+    """
+    Page of child nodes of a directory in the directory tree of an area (see area_directory_json)
+    @type       node_path: string
+    @param      node_path: Directory path relative to the tree root
+    @type       offset: int
+    @param      offset: Index of the first entry
+    @type       limit: int
+    @param      limit: Maximum number of entries (limited to api_page_size)
+    @rtype:     dict
+    @return:    Child nodes and paging information
+    @raises     NotFoundError: if the area, package or directory does not exist
+    @raises     AuthenticationError: if the user is not the owner of the package
+    """
+    offset, limit = max(0, offset), max(1, min(limit, api_page_size))
+    root, path_prefix = area_tree_root(area, item, user)
+    lister = inventory_lister(item) if area == "storage" else None
+    return _tree_children(root, node_path, path_prefix, offset, limit, lister)
+
+
+def _tree_children(root, node_path, path_prefix, offset, limit, lister=None):
+    try:
+        return directory_children(root, node_path, path_prefix, offset, limit, lister)
+    except ValueError as e:
+        raise AuthenticationError(str(e))
+    except (FileNotFoundError, NotADirectoryError):
+        raise NotFoundError("Directory does not exist: %s" % node_path)
+
+
+def area_directory_tree(area, item, user, limit=directory_page_size):
+    """
+    Directory tree of an area with the first page of entries of the root directory (sub-directories are loaded
+    on demand)
+    @rtype:     dict
+    @return:    Root node ('text', 'path') and paging information of the root directory
+    """
+    root, path_prefix = area_tree_root(area, item, user)
+    lister = inventory_lister(item) if area == "storage" else None
+    tree = _tree_children(root, "", path_prefix, 0, limit, lister)
+    tree['text'] = item if item else area
+    tree['path'] = path_prefix.rstrip('/')
+    return tree
+
+
+def storage_inventory(identifier):
+    """
+    Parsed (cached) OCFL inventory of an archived package
+    @raises     NotFoundError: if the inventory does not exist
+    """
+    inventory_path = os.path.join(make_storage_data_directory_path(from_safe_filename(identifier),
+                                                                   config_path_storage), INVENTORY_FILE_NAME)
+    inventory = load_inventory(inventory_path)
+    if inventory is None:
+        raise NotFoundError("Inventory of package '%s' not available" % identifier)
+    return inventory
+
+
+def inventory_lister(identifier):
+    """
+    Directory lister (see util.directorylisting.directory_children) of an archived package based on its
+    inventory, the storage directories are not accessed
+    @rtype:     function
+    @return:    Lister function or None if the inventory is not available
+    """
+    try:
+        inventory = storage_inventory(identifier)
+    except NotFoundError:
+        return None
+    return lambda directory: [DirectoryEntry(*entry) for entry in inventory.content_listing(directory)]
+
+
+class TestContainedPath(unittest.TestCase):
+
+    def test_contained_path(self):
+        self.assertEqual("/var/data/work/abc/metadata/state.json",
+                         contained_path("/var/data/work/abc", "metadata/./state.json"))
+        self.assertEqual("/var/data/work/abc/x", contained_path("/var/data/work/abc/", "metadata/../x"))
+
+    def test_traversal(self):
+        for sub_path in ["../abcX/file.txt", "../abc2", "..", "/etc/passwd", "metadata/../../abc/../x"]:
+            with self.assertRaises(AuthenticationError):
+                contained_path("/var/data/work/abc", sub_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -88,6 +88,12 @@ urlpatterns = [
         views.do_storage_file_resource),
 
     re_path(fr'^storage/ips/(?P<identifier>{identifier_pattern})/dir-json$', views.do_storage_dir_json),
+    re_path(fr'^storage/ips/(?P<identifier>{identifier_pattern})/versions/$', views.storage_versions),
+    re_path(fr'^storage/ips/(?P<identifier>{identifier_pattern})/versions/(?P<version>v?[0-9]{{1,10}})/files/$',
+        views.storage_version_files),
+    re_path(fr'^storage/ips/(?P<identifier>{identifier_pattern})/diff/(?P<from_version>v?[0-9]{{1,10}})/'
+        r'(?P<to_version>v?[0-9]{1,10})/$', views.storage_version_diff),
+    re_path(fr'^storage/ips/(?P<identifier>{identifier_pattern})/find/$', views.storage_find_path),
     re_path(fr'^storage/(?P<identifier>{identifier_pattern})/{representations_directory}/$',
         views.get_ip_representations_info, name='storage_identifier_representations'),
     re_path(fr'^ips/(?P<identifier>{identifier_pattern})/index/$', views.index_informationpackage),
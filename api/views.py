@@ -5,24 +5,22 @@ import re
 import shutil
 import tarfile
 import traceback
-import mimetypes
 from json import JSONDecodeError
 
 import magic
-import charset_normalizer
 from dateutil import parser
-from datetime import date, timedelta, datetime
+from datetime import date, timedelta, datetime, timezone
 from django.contrib.auth.models import User
 from django.http import JsonResponse, HttpResponse, HttpResponseNotFound, HttpResponseBadRequest, \
     HttpResponseForbidden, FileResponse, HttpResponseNotAllowed, Http404, HttpResponseServerError
+from django.db.models import Q
 from django.views.decorators.csrf import csrf_exempt
 
 from eatb.checksum import ChecksumFile, ChecksumAlgorithm
-from eatb.pairtree_storage import make_storage_data_directory_path, PairtreeStorage
+from eatb.pairtree_storage import PairtreeStorage
 from eatb.packaging import ChunkedTarEntryReader
 from eatb.utils.datetime import date_format, DT_ISO_FORMAT
-from eatb.utils.fileutils import fsize, get_mime_type, read_file_content, list_files_in_dir, get_directory_json, \
-    to_safe_filename, from_safe_filename
+from eatb.utils.fileutils import read_file_content, list_files_in_dir
 from eatb.utils.randomutils import randomword
 from pairtree import ObjectNotFoundException
 from rest_framework.authentication import SessionAuthentication, BasicAuthentication, TokenAuthentication
@@ -44,15 +42,18 @@ from taskbackend.ip_state import IpState
 from taskbackend.tasks import aip_indexing, \
     delete_representation_data_from_workdir, \
     sip_package
-from config.configuration import config_path_work, config_path_storage, config_path_reception, file_size_limit, \
-    representations_directory, config_max_http_download, node_namespace_id, default_org
+from config.configuration import config_path_work, config_path_storage, config_path_reception, \
+    representations_directory, node_namespace_id, default_org, directory_page_size, api_page_size
 from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework import parsers
 from rest_framework import renderers
 from uuid import uuid4
 from rest_framework import generics
-from util.djangoutils import check_required_params, get_unused_identifier
+from util.djangoutils import check_required_params, get_unused_identifier, claim_unused_identifiers
+from util.custom_exceptions import NotFoundError, AuthenticationError
+from api.services import read_file, working_file_response, storage_file_response, package_entry_response, \
+    area_directory_json, area_directory_children, storage_inventory
 logger = logging.getLogger(__name__)
 
 @csrf_exempt
@@ -388,8 +389,7 @@ def do_working_dir_file_resource(request, uid, ip_sub_file_path):
     Retrieve file resource
     """
     if request.method == 'GET':
-        file_path = os.path.join(config_path_work, uid, ip_sub_file_path)
-        return read_file(file_path)
+        return working_file_response(request, uid, ip_sub_file_path)
     elif request.method == 'DELETE':
         try:
             # pylint: disable-next=no-member
@@ -447,7 +447,7 @@ def reception_file_resource(request, ip_sub_file_path):
     if not file_path.startswith(config_path_reception):
         return HttpResponseForbidden({"message": "Invalid file path"})
     if request.method == 'GET':
-        return read_file(file_path)
+        return read_file(file_path, request)
     elif request.method == 'DELETE':
         os.remove(file_path)
         if not os.path.exists(file_path):
@@ -462,7 +462,7 @@ def reception_file_resource(request, ip_sub_file_path):
 @api_view(['GET'])
 @authentication_classes((TokenAuthentication, BasicAuthentication, SessionAuthentication))
 @permission_classes((IsAuthenticated,))
-def do_storage_file_resource(_, identifier, ip_sub_file_path):
+def do_storage_file_resource(request, identifier, ip_sub_file_path):
     """
     get: Retrieve file resource (file system)
 
@@ -484,80 +484,14 @@ def do_storage_file_resource(_, identifier, ip_sub_file_path):
         urn%2Buuid%2B42658bbd-a76f-46f5-85da-f0ad2bed94dc.tar
 
     """
-    dpts = PairtreeStorage(config_path_storage)
-    package_id = from_safe_filename(identifier)
-    version = dpts.curr_version(package_id)
-    #access_path = os.path.join(make_storage_data_directory_path(package_id, config_path_storage), version)
-    access_path = os.path.join(make_storage_data_directory_path(package_id, config_path_storage))
-    file_path = os.path.join(access_path, ip_sub_file_path)
-    return read_file(file_path)
-
-
-def read_file(file_path):
-    """
-    Reads a file from the given file path and returns an HTTP response with its content.
-
-    Args:
-        file_path (str): The path to the file to be read.
-
-    Returns:
-        HttpResponse: An HTTP response containing the file content.
-    """
-    try:
-        if not os.path.exists(file_path):
-            return HttpResponseNotFound("File not found %s" % file_path)
-        elif not os.path.isfile(file_path):
-            return HttpResponseBadRequest("Not a file")
-        else:
-            file_size = fsize(file_path)
-            mime = get_mime_type(file_path)
-            if file_size > config_max_http_download:
-                return HttpResponseForbidden(
-                    "Size of requested file exceeds limit (file size %d > %d)" % (file_size, config_max_http_download))
-            if file_path.lower().endswith(('.tar', '.tar.gz', 'zip')):
-                stream = open(file_path, 'rb')
-                response = FileResponse(stream, content_type=mime, as_attachment=True)
-                response['Content-Disposition'] = "attachment; filename=%s" % os.path.basename(file_path)
-                return response
-            if file_size <= file_size_limit:
-                if mime.startswith("text/") or mime.endswith("xml") or "0=ocfl_object_1.0" in file_path or "inventory.json.sha512" in file_path:
-                    if mime.endswith("xml"):
-                        mime = "text/xml;charset=utf-8"
-                    else:
-                        mime = "text/plain;charset=utf-8"
-                    stream = open(file_path, 'rb')
-                    bytes = stream.read()
-                    
-                    # Detect encoding and handle fallback
-                    detected = charset_normalizer.detect(bytes)
-                    encoding = detected.get('encoding', 'utf-8')  # Fallback to UTF-8 if detection fails
-                    
-                    if not encoding:
-                        encoding = 'utf-8'  # Ensure a valid encoding is used
-                    
-                    try:
-                        file_content = bytes.decode(encoding).encode('utf-8')
-                    except UnicodeDecodeError as e:
-                        return HttpResponseBadRequest(f"Failed to decode file: {e}")
-
-                    response = HttpResponse(file_content, content_type=mime)
-                else:
-                    file_content = read_file_content(file_path)
-                    response = HttpResponse(file_content, content_type=mime)
-                return response
-            else:
-                return HttpResponseForbidden("Size of requested file exceeds limit (file size %d > %d)" %
-                                             (file_size, file_size_limit))
-    except OSError as e:
-        return HttpResponseServerError(f"An error occurred: {e}")
-
+    return storage_file_response(request, identifier, ip_sub_file_path)
 
 
 @csrf_exempt
 @api_view(['GET'])
 @authentication_classes((TokenAuthentication, BasicAuthentication, SessionAuthentication))
 @permission_classes((IsAuthenticated,))
-def package_entry_from_backend(_, identifier, entry):
+def package_entry_from_backend(request, identifier, entry):
     """
     get: Read file from package
 
@@ -567,24 +501,10 @@ def package_entry_from_backend(_, identifier, entry):
     entry: representations/e4eec7d0-7caa-419f-bd68-cc0e1c9f38f8/data/somepdf.pdf, identifier: doi:10.5281/zenodo.11366514
     """
     try:
-        dpts = PairtreeStorage(config_path_storage)
-        safe_file_name = from_safe_filename(identifier)
-        base_path = dpts.get_object_path(safe_file_name)
-        file_path = os.path.join(base_path, entry)
+        return package_entry_response(request, identifier, entry)
 
-        # Check if the file exists
-        if not os.path.exists(file_path):
-            return JsonResponse(
-                {"message": f"Entry {entry} does not exist in archival package '{identifier}'"}, status=404
-            )
-
-        # Detect MIME type
-        mime_type, _ = mimetypes.guess_type(file_path)
-        mime_type = mime_type or "application/octet-stream"
-
-        # Read and return the file content
-        with open(file_path, 'rb') as f:
-            return HttpResponse(f.read(), content_type=mime_type)
+    except NotFoundError as e:
+        return JsonResponse({"message": str(e)}, status=404)
 
     except FileNotFoundError:
         message = f"The archival package does not exist: {identifier}"
@@ -598,6 +518,100 @@ def package_entry_from_backend(_, identifier, entry):
         return JsonResponse({"message": error_message}, status=500)
 
 
+@csrf_exempt
+@api_view(['GET'])
+@authentication_classes((TokenAuthentication, BasicAuthentication, SessionAuthentication))
+@permission_classes((IsAuthenticated,))
+def storage_versions(_, identifier):
+    """
+    get: List versions of an archived package (inventory)
+
+    List versions (name, creation date, message, number of files) of an archived package, for example:
+
+        curl -X GET 'http://127.0.0.1:8000/earkweb/api/storage/ips/urn:uuid:42658bbd-a76f-46f5-85da-f0ad2bed94dc/versions/'
+    """
+    try:
+        inventory = storage_inventory(identifier)
+    except NotFoundError as e:
+        return JsonResponse({"message": str(e)}, status=404)
+    versions = [{
+        "version": name,
+        "created": inventory.data["versions"][name].get("created"),
+        "message": inventory.data["versions"][name].get("message"),
+        "files": len(inventory.state(name)),
+    } for name in inventory.versions]
+    return JsonResponse({"identifier": identifier, "head": inventory.head, "versions": versions}, status=200)
+
+
+@csrf_exempt
+@api_view(['GET'])
+@authentication_classes((TokenAuthentication, BasicAuthentication, SessionAuthentication))
+@permission_classes((IsAuthenticated,))
+def storage_version_files(request, identifier, version):
+    """
+    get: List files of a version of an archived package (inventory)
+
+    List logical paths, digests and content paths of the files of a version, optionally restricted to paths
+    starting with 'prefix', for example:
+
+        curl -X GET 'http://127.0.0.1:8000/earkweb/api/storage/ips/urn:uuid:42658bbd-a76f-46f5-85da-f0ad2bed94dc/versions/2/files/?prefix=metadata/'
+    """
+    try:
+        inventory = storage_inventory(identifier)
+        files = inventory.list_version(version, request.GET.get("prefix", ""))
+        return JsonResponse({"identifier": identifier, "version": inventory.version_name(version), "files": files},
+                            status=200)
+    except NotFoundError as e:
+        return JsonResponse({"message": str(e)}, status=404)
+    except KeyError as e:
+        return JsonResponse({"message": str(e).strip("'\"")}, status=404)
+
+
+@csrf_exempt
+@api_view(['GET'])
+@authentication_classes((TokenAuthentication, BasicAuthentication, SessionAuthentication))
+@permission_classes((IsAuthenticated,))
+def storage_version_diff(_, identifier, from_version, to_version):
+    """
+    get: Differences between two versions of an archived package (inventory)
+
+    List files added, removed and modified between two versions, for example:
+
+        curl -X GET 'http://127.0.0.1:8000/earkweb/api/storage/ips/urn:uuid:42658bbd-a76f-46f5-85da-f0ad2bed94dc/diff/1/2/'
+    """
+    try:
+        diff = storage_inventory(identifier).diff(from_version, to_version)
+        return JsonResponse(dict(diff, identifier=identifier), status=200)
+    except NotFoundError as e:
+        return JsonResponse({"message": str(e)}, status=404)
+    except KeyError as e:
+        return JsonResponse({"message": str(e).strip("'\"")}, status=404)
+
+
+@csrf_exempt
+@api_view(['GET'])
+@authentication_classes((TokenAuthentication, BasicAuthentication, SessionAuthentication))
+@permission_classes((IsAuthenticated,))
+def storage_find_path(request, identifier):
+    """
+    get: Find files in the versions of an archived package (inventory)
+
+    Find a logical path or glob pattern ('path' parameter) in all versions or in one version ('version'
+    parameter), for example:
+
+        curl -X GET 'http://127.0.0.1:8000/earkweb/api/storage/ips/urn:uuid:42658bbd-a76f-46f5-85da-f0ad2bed94dc/find/?path=*.pdf'
+    """
+    if "path" not in request.GET:
+        return JsonResponse({"message": "Parameter 'path' is required"}, status=400)
+    try:
+        found = storage_inventory(identifier).find(request.GET["path"], request.GET.get("version"))
+        return JsonResponse({"identifier": identifier, "files": found}, status=200)
+    except NotFoundError as e:
+        return JsonResponse({"message": str(e)}, status=404)
+    except KeyError as e:
+        return JsonResponse({"message": str(e).strip("'\"")}, status=404)
+
+
 @csrf_exempt
 @api_view(['GET'])
 @authentication_classes((TokenAuthentication, BasicAuthentication, SessionAuthentication))
@@ -679,57 +693,29 @@ def directory_json(request, area, item):
 
         curl -X GET 'http://127.0.0.1:8000/earkweb/api/da992e2e-1eb0-4839-8cdd-688559cbbc39/dir-json'
 
+    To list the entries of a single directory (paged, sub-directories are expanded on demand) use the 'node'
+    parameter (directory path relative to the tree root, empty for the root) and optionally 'offset' and 'limit'
+    (at most api_page_size entries):
+
+        curl -X GET 'http://127.0.0.1:8000/earkweb/api/da992e2e-1eb0-4839-8cdd-688559cbbc39/dir-json?node=metadata&offset=0&limit=500'
+
     """
-    version = 0  # N/A
-    if area not in ["work", "storage", "reception"]:
-        return JsonResponse({"message": "Area not defined."}, status=404)
-    access_path = None
-    if area == "reception":
-        access_path = config_path_reception
-    if area == "work":
-        access_path = config_path_work
-    elif area == "storage":
-        dpts = PairtreeStorage(config_path_storage)
-        version = dpts.curr_version(item)
-        access_path = os.path.join(make_storage_data_directory_path(item, config_path_storage), version)
-    if area in ["work", "storage"]:
-        try:
-            if area == "work":
-                # pylint: disable-next=no-member
-                ip = InformationPackage.objects.get(uid=item)
-            else:
-                version_clean = re.sub("\D", "", version)
-                version_nr = int(version_clean)
-                # pylint: disable-next=no-member
-                ip = InformationPackage.objects.get(identifier=item, version=version_nr)
+    try:
+        if "node" in request.GET:
             try:
-                u = User.objects.get(username=request.user)
-                if u != ip.user:
-                    return JsonResponse({"message": "Unauthorized. Access to this directory is not permitted."}, status=403)
-            # pylint: disable-next=no-member
-            except User.DoesNotExist:
-                return JsonResponse({"message": "Internal error: user does not exist"}, status=500)
-        # pylint: disable-next=no-member
-        except InformationPackage.DoesNotExist:
-            return JsonResponse({"message": "process does not exist"}, status=404)
-        item_path = to_safe_filename(item)
-    else:
-        item_path = item
-    if area == "storage":
-        item_path = ""
-    item_path = "." if not item_path else item_path
-    if not os.path.exists(os.path.join(access_path, item_path)):
-        return JsonResponse({
-            "message": "Access path does not exist: %s" %
-                       os.path.join(access_path, to_safe_filename(item))
-        }, status=404)
-    if area == "work":
-        return JsonResponse(get_directory_json(access_path, item_path), status=200)
-    elif area == "storage":
-        return JsonResponse(get_directory_json(access_path, "../"), status=200)
-    elif area == "reception":
-        return JsonResponse(get_directory_json(access_path, "."), status=200)
-
+                offset = max(0, int(request.GET.get("offset", 0)))
+                limit = max(1, min(int(request.GET.get("limit", directory_page_size)), api_page_size))
+            except ValueError:
+                return JsonResponse({"message": "Parameters 'offset' and 'limit' must be integers"}, status=400)
+            children = area_directory_children(area, item, request.user, request.GET["node"], offset, limit)
+            return JsonResponse(children, status=200)
+        return JsonResponse(area_directory_json(area, item, request.user), status=200)
+    except NotFoundError as e:
+        return JsonResponse({"message": str(e)}, status=404)
+    except AuthenticationError as e:
+        return JsonResponse({"message": str(e)}, status=403)
+    except RuntimeError as e:
+        return JsonResponse({"message": str(e)}, status=500)
 
 
 @csrf_exempt
@@ -885,6 +871,11 @@ def int_id_list(request):
 
     get: Get an unused identifier (database)
 
+    Identifiers are claimed atomically. To claim several identifiers at once use the 'count' parameter, the
+    response is then a list of identifiers, for example:
+
+        curl -X GET "http://localhost:8000/earkweb/api/identifiers/?count=10"
+
     Example response:
 
 
@@ -903,13 +894,17 @@ def int_id_list(request):
 
     """
     if request.method == 'GET':
-        # pylint: disable-next=no-member
-        snippet = InternalIdentifier.objects.filter(used=False)[:1]
-        if len(snippet) == 0:
+        try:
+            count = max(1, min(int(request.GET.get("count", 1)), api_page_size))
+        except ValueError:
+            return JsonResponse({"error": "Parameter 'count' must be an integer"}, status=400)
+        claimed = claim_unused_identifiers(count)
+        if len(claimed) == 0:
             return JsonResponse({"error": "No unused identifier available"}, status=404)
-        snippet[0].used = True
-        snippet[0].save()
-        serializer = InternalIdentifierSerializer(snippet[0], many=False)
+        if "count" not in request.GET:
+            serializer = InternalIdentifierSerializer(claimed[0], many=False)
+        else:
+            serializer = InternalIdentifierSerializer(claimed, many=True)
         return JsonResponse(serializer.data, safe=False)
     elif request.method == 'POST':
         try:
@@ -965,47 +960,121 @@ def int_id_list(request):
 def get_ip_states(request):
     """
     get:
-        Status of all submissions (working area)
+        Status of submissions (database)
+
+        By default, the status of submissions created during the last seven days is returned. Use the 'since'
+        parameter (ISO date/time) to get the status of all submissions whose state changed since the given point
+        in time. Results are ordered by state change and record ID and paginated ('limit' parameter), if more results
+        are available, the 'X-Next-Cursor' response header contains the value of the 'cursor' parameter for the next
+        page.
 
         Example
 
-            http://localhost:8000/earkweb/api/ips/status/
+            http://localhost:8000/earkweb/api/ips/status/?since=2024-11-26T00:00:00Z&limit=500
     """
-    results = {}
     if request.method == 'GET':
         try:
-            enddate = date.today()
-            startdate = enddate - timedelta(days=7)
+            limit = max(1, min(int(request.GET.get("limit", api_page_size)), api_page_size))
+            after = decode_state_cursor(request.GET["cursor"]) if "cursor" in request.GET else None
+            since = parser.isoparse(request.GET["since"]) if "since" in request.GET else None
+        except ValueError:
+            return JsonResponse({"message": "Invalid 'since', 'cursor' or 'limit' parameter"}, status=400)
+        try:
             # pylint: disable-next=no-member
-            ips = InformationPackage.objects.filter(created__range=[startdate, enddate])
-            logger.debug(ips.query)
-            for ip in ips:
-                result = {}
-                working_dir = os.path.join(config_path_work, ip.uid)
-                if os.path.exists(working_dir):
-                    ip_state_file_path = os.path.join(working_dir, "metadata/other/state.json")
-                    if os.path.exists(ip_state_file_path):
-                        try:
-                            info_file_content = read_file_content(ip_state_file_path)
-                            result = json.loads(info_file_content)
-                        except JSONDecodeError as err:
-                            result = {"error": {
-                                "title": "Error parsing state file",
-                                "detail": "%s (line: %d, colum: %d)" % (err.msg, err.lineno, err.colno)}
-                            }
-                    else:
-                        result = {"warning": {
-                            "title": "State file not vailable",
-                            "detail": "State file not found at: %s" % ip_state_file_path}
-                        }
-                results[ip.uid] = result
-            return JsonResponse(results, status=200)
+            ips = InformationPackage.objects.only('id', 'uid', 'state_info', 'state_last_change') \
+                .order_by('state_last_change', 'id')
+            if since:
+                ips = ips.filter(state_last_change__gte=since)
+            else:
+                enddate = date.today()
+                startdate = enddate - timedelta(days=7)
+                ips = ips.filter(created__range=[startdate, enddate])
+            if after:
+                ips = ips.filter(after_state_change(*after))
+            page = list(ips[:limit + 1])
+            results = {ip.uid: package_state(ip) for ip in page[:limit]}
+            response = JsonResponse(results, status=200)
+            if len(page) > limit:
+                response['X-Next-Cursor'] = encode_state_cursor(page[limit - 1])
+            return response
         except Exception as err:
             logger.debug("Error: %s", err)
             error = {"message": "An error occurred"}
             return JsonResponse(error, status=500)
 
 
+def encode_state_cursor(ip):
+    """
+    Cursor of the state list (key of the last record of a page: state change in microseconds since the epoch and
+    record ID, separated by '.'; the state change is empty if the record has no state)
+    @type       ip: InformationPackage
+    @param      ip: Last record of the page
+    @rtype: string
+    @return: Cursor
+    """
+    if ip.state_last_change is None:
+        return ".%d" % ip.id
+    delta = ip.state_last_change - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return "%d.%d" % (delta // timedelta(microseconds=1), ip.id)
+
+
+def decode_state_cursor(cursor):
+    """
+    Decode a cursor of the state list (see encode_state_cursor)
+    @type       cursor: string
+    @param      cursor: Cursor
+    @rtype: tuple
+    @return: State change (None if the record has no state) and record ID
+    @raises     ValueError: if the cursor is invalid
+    """
+    micros, separator, pk = cursor.partition('.')
+    if not separator:
+        raise ValueError("Invalid cursor: %s" % cursor)
+    last_change = datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=int(micros)) if micros else None
+    return last_change, int(pk)
+
+
+def after_state_change(last_change, pk):
+    """Condition for records following the key (state_last_change, id) in state list order (no state first)"""
+    if last_change is None:
+        return Q(state_last_change__isnull=True, id__gt=pk) | Q(state_last_change__isnull=False)
+    return Q(state_last_change__gt=last_change) | Q(state_last_change=last_change, id__gt=pk)
+
+
+def package_state(ip):
+    """
+    Package state of an information package (database, working area state file if the state is not yet
+    stored in the database)
+    """
+    if ip.state_info:
+        try:
+            return json.loads(ip.state_info)
+        except JSONDecodeError as err:
+            return {"error": {
+                "title": "Error parsing state",
+                "detail": "%s (line: %d, colum: %d)" % (err.msg, err.lineno, err.colno)}
+            }
+    result = {}
+    working_dir = os.path.join(config_path_work, ip.uid)
+    if os.path.exists(working_dir):
+        ip_state_file_path = os.path.join(working_dir, "metadata/other/state.json")
+        if os.path.exists(ip_state_file_path):
+            try:
+                info_file_content = read_file_content(ip_state_file_path)
+                result = json.loads(info_file_content)
+            except JSONDecodeError as err:
+                result = {"error": {
+                    "title": "Error parsing state file",
+                    "detail": "%s (line: %d, colum: %d)" % (err.msg, err.lineno, err.colno)}
+                }
+        else:
+            result = {"warning": {
+                "title": "State file not available",
+                "detail": "State file not found at: %s" % ip_state_file_path}
+            }
+    return result
+
+
 @csrf_exempt
 @api_view(['GET'])
 @authentication_classes((TokenAuthentication, BasicAuthentication, SessionAuthentication))
@@ -1013,7 +1082,7 @@ def get_ip_states(request):
 def get_ip_state(request, uid):
     """
     get:
-        Status of selected submission (database, working area)
+        Status of selected submission (database)
 
         Example
 
@@ -1023,25 +1092,7 @@ def get_ip_state(request, uid):
         try:
             # pylint: disable-next=no-member
             ip = InformationPackage.objects.get(uid=uid)
-            result = {}
-            working_dir = os.path.join(config_path_work, ip.uid)
-            if os.path.exists(working_dir):
-                ip_state_file_path = os.path.join(working_dir, "metadata/other/state.json")
-                if os.path.exists(ip_state_file_path):
-                    try:
-                        info_file_content = read_file_content(ip_state_file_path)
-                        result = json.loads(info_file_content)
-                    except JSONDecodeError as err:
-                        result = {"error": {
-                            "title": "Error parsing state file",
-                            "detail": "%s (line: %d, colum: %d)" % (err.msg, err.lineno, err.colno)}
-                        }
-                else:
-                    result = {"warning": {
-                        "title": "State file not available",
-                        "detail": "State file not found at: %s" % ip_state_file_path}
-                    }
-            return JsonResponse(result, status=200)
+            return JsonResponse(package_state(ip), status=200)
         # pylint: disable-next=no-member
         except InformationPackage.DoesNotExist:
             error = {"message": "An error occurred"}
@@ -116,6 +116,11 @@ solr_service_url = build_url(solr_protocol, solr_host, solr_port, "solr")
 solr_core_url = '%s/%s' % (solr_service_url, solr_core)
 solr_core_ping_url = '%s/admin/ping' % solr_core_url
 solr_core_overview_url = '%s/#/%s/core-overview' % (solr_service_url, solr_core)
+# solr connections: timeouts (seconds), retries of failed requests, connection pool size per process
+solr_connect_timeout = config.getfloat('server', 'solr_connect_timeout', fallback=5)
+solr_read_timeout = config.getfloat('server', 'solr_read_timeout', fallback=60)
+solr_retries = config.getint('server', 'solr_retries', fallback=3)
+solr_pool_size = config.getint('server', 'solr_pool_size', fallback=10)
 
 # flower
 flower_protocol = config.get('server', 'flower_protocol')
@@ -131,9 +136,22 @@ config_path_reception = config.get('paths', 'config_path_reception')
 config_path_work = config.get('paths', 'config_path_work')
 config_path_storage = config.get('paths', 'config_path_storage')
 config_path_access = config.get('paths', 'config_path_access')
+# shared cache of file format migration results (same file system as the working area allows reflinks)
+config_path_migration_cache = config.get('paths', 'config_path_migration_cache',
+                                         fallback=os.path.join(os.path.dirname(config_path_work.rstrip('/')),
+                                                               'migration-cache'))
 
 # web server configuration
 static_root = config.get('web', 'static_root')
+# file delivery mode: 'django' (stream from the application), 'nginx' (X-Accel-Redirect) or 'sendfile'
+# (X-Sendfile, e.g. uwsgi offloading); in the offloading modes the views only authorize and resolve the file path
+file_delivery_mode = config.get('web', 'file_delivery_mode', fallback='django').strip().lower()
+# internal locations (nginx) mapped to the data areas
+file_delivery_internal_locations = {
+    config_path_storage: config.get('web', 'internal_location_storage', fallback='/internal/storage/'),
+    config_path_work: config.get('web', 'internal_location_work', fallback='/internal/work/'),
+    config_path_reception: config.get('web', 'internal_location_reception', fallback='/internal/reception/'),
+}
 
 # EAD metadata file pattern
 metadata_file_pattern_ead =  config.get('metadata', 'metadata_file_pattern_ead')
@@ -145,6 +163,47 @@ max_submissions_web_client = 50
 file_size_limit = config.getint('limits', 'config_max_filesize_viewer')
 config_max_http_download = config.getint('limits', 'config_max_http_download')
 
+# file format migration: number of files per migration task, per tool concurrency and memory limits (MB)
+migration_batch_size = config.getint('migration', 'batch_size', fallback=50)
+migration_cache_enabled = config.getboolean('migration', 'cache_enabled', fallback=True)
+migration_cache_max_mb = config.getint('migration', 'cache_max_mb', fallback=10240)
+migration_tool_limits = {
+    'pdftopdfa': {
+        'concurrency': config.getint('migration', 'pdftopdfa_concurrency', fallback=os.cpu_count() or 1),
+        'memory_mb': config.getint('migration', 'pdftopdfa_memory_mb', fallback=1024),
+    },
+    'totiff': {
+        'concurrency': config.getint('migration', 'totiff_concurrency', fallback=max(1, (os.cpu_count() or 1) // 2)),
+        'memory_mb': config.getint('migration', 'totiff_memory_mb', fallback=512),
+    },
+}
+
+# minimum interval (seconds) between task progress updates written to the result backend
+progress_update_interval = config.getfloat('limits', 'progress_update_interval', fallback=2.0)
+
+# directory tree: number of entries per tree node request and number of cached directory listings
+directory_page_size = config.getint('limits', 'directory_page_size', fallback=500)
+directory_listing_cache_size = config.getint('limits', 'directory_listing_cache_size', fallback=4096)
+
+# maximum number of records per page of paginated API responses
+api_page_size = config.getint('limits', 'api_page_size', fallback=500)
+
+# lifetime (seconds) of cached statistics (home page charts)
+statistics_cache_ttl = config.getint('limits', 'statistics_cache_ttl', fallback=60)
+# word cloud: minimum change of the term distribution (0-1) for the image to be regenerated
+wordcloud_change_threshold = config.getfloat('limits', 'wordcloud_change_threshold', fallback=0.05)
+# search proxy: lifetime (seconds) of cached query results and maximum number of rows of cached result pages
+search_cache_ttl = config.getint('limits', 'search_cache_ttl', fallback=300)
+search_cache_max_rows = config.getint('limits', 'search_cache_max_rows', fallback=100)
+# search results: number and size (characters) of highlighting snippets per hit, characters analysed per document
+search_snippets = config.getint('limits', 'search_snippets', fallback=3)
+search_fragment_size = config.getint('limits', 'search_fragment_size', fallback=160)
+search_max_analyzed_chars = config.getint('limits', 'search_max_analyzed_chars', fallback=1000000)
+# OAI-PMH: lifetime (seconds) of harvest sessions (cached total number of records of a list request)
+oai_harvest_session_ttl = config.getint('limits', 'oai_harvest_session_ttl', fallback=3600)
+# OAI-PMH: number of records per page of list requests (ListIdentifiers, ListRecords)
+oai_page_size = config.getint('limits', 'oai_page_size', fallback=100)
+
 # access
 dip_download_base_url = config.get('access', 'dip_download_base_url')
 dip_download_path = config.get('access', 'dip_download_path')
@@ -183,6 +242,9 @@ commands = {
          '-sPDFACompatibilityPolicy=1', string.Template('$output_file'), string.Template('$input_file')],
     'totiff':
         ['convert', string.Template('$input_file'), string.Template('$output_file')],
+    'totiff_batch':
+        ['mogrify', '-limit', 'memory', string.Template('$memory_limit'), '-format', 'tiff', '-path',
+         string.Template('$output_dir')],
     'blank':
         [string.Template('$command')]
 }
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# coding=UTF-8
+"""
+Pre-generate unused identifiers, e.g.:
+
+    python manage.py generate_identifiers 10000 --org-nsid repo
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from config.configuration import default_org
+from util.djangoutils import generate_identifiers
+
+
+class Command(BaseCommand):
+    help = "Create unused identifiers in bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int, help="Number of identifiers")
+        parser.add_argument('--org-nsid', default=default_org, help="Organization namespace identifier")
+        parser.add_argument('--user', default=None, help="Owner of the identifiers (user name)")
+        parser.add_argument('--blockchain', action='store_true', help="Identifiers are blockchain identifiers")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Number of rows per insert statement")
+
+    def handle(self, *args, **options):
+        if options['count'] < 1:
+            raise CommandError("Number of identifiers must be positive")
+        if not options['org_nsid']:
+            raise CommandError("Organization namespace identifier ('--org-nsid') must be defined")
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError("User does not exist: %s" % options['user'])
+        created = generate_identifiers(options['count'], options['org_nsid'], user, options['blockchain'],
+                                       options['batch_size'])
+        self.stdout.write(self.style.SUCCESS("%d identifiers created" % created))
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# coding=UTF-8
+"""
+Render and store missing Dublin Core records (OAI-PMH) of stored packages, e.g.:
+
+    python manage.py render_dc_records
+    python manage.py render_dc_records --all --batch-size 200
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from oai_pmh.harvest import harvestable_packages
+from oai_pmh.records import render_missing_dc_records
+
+
+class Command(BaseCommand):
+    help = "Render and store the Dublin Core records of packages which have no stored record"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Render the records of all packages")
+        parser.add_argument('--identifier', default=None, help="Only render the records of this package")
+        parser.add_argument('--batch-size', type=int, default=500, help="Number of packages per record lookup")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("Batch size must be positive")
+        packages = harvestable_packages().order_by('identifier', 'version', 'id')
+        if options['identifier']:
+            packages = packages.filter(identifier=options['identifier'])
+        stored = failed = 0
+        batch = []
+        for ip in packages.iterator(chunk_size=options['batch_size']):
+            batch.append(ip)
+            if len(batch) == options['batch_size']:
+                batch_stored, batch_failed = render_missing_dc_records(batch, options['all'])
+                stored, failed = stored + batch_stored, failed + batch_failed
+                batch = []
+        if batch:
+            batch_stored, batch_failed = render_missing_dc_records(batch, options['all'])
+            stored, failed = stored + batch_stored, failed + batch_failed
+        self.stdout.write(self.style.SUCCESS("%d Dublin Core records stored" % stored))
+        if failed:
+            self.stdout.write(self.style.WARNING("%d records not rendered (index not available)" % failed))
@@ -1,16 +1,9 @@
 #!/usr/bin/env python
 # coding=UTF-8
 import logging
-from urllib.request import urlopen
-from access.search.solrquery import SolrQuery
-from access.search.solrserver import SolrServer
-from config.configuration import solr_host, solr_protocol
-from config.configuration import solr_port
-from config.configuration import solr_core
 from django.contrib.auth.models import User
 from django.db import models
 from taggit.managers import TaggableManager
-import json
 
 
 class RepoUser(models.Model):
@@ -26,6 +19,16 @@ class RepoUser(models.Model):
 class InformationPackage(models.Model):
     class Meta:
         db_table = 'informationpackage'
+        indexes = [
+            models.Index(fields=['state_last_change', 'id'], name='ip_state_last_change_idx'),
+            # package lookups (resourcesync, storage views), overview tables and dashboard statistics; storage_dir
+            # is too long to be indexed, queries filtering on it are narrowed down by these indexes
+            models.Index(fields=['identifier', 'version'], name='ip_identifier_version_idx'),
+            models.Index(fields=['package_name'], name='ip_package_name_idx'),
+            models.Index(fields=['deleted', 'last_change'], name='ip_deleted_last_change_idx'),
+            models.Index(fields=['last_change', 'id'], name='ip_last_change_idx'),
+            models.Index(fields=['created'], name='ip_created_idx'),
+        ]
     id = models.AutoField(primary_key=True)
     uid = models.CharField(max_length=200, unique=True)
     package_name = models.CharField(max_length=200)
@@ -40,6 +43,9 @@ class InformationPackage(models.Model):
     last_change = models.DateTimeField(auto_now_add=True, blank=True)
     created = models.DateTimeField(auto_now_add=True, blank=True)
     deleted = models.BooleanField(default=False)
+    # package state (mirror of metadata/other/state.json in the working directory)
+    state_info = models.TextField(blank=True, null=True)
+    state_last_change = models.DateTimeField(blank=True, null=True)
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
 
@@ -47,17 +53,9 @@ class InformationPackage(models.Model):
         if not self.identifier:
             return 0
         else:
-            try:
-                #
-                query_part = "package:%22" + str(self.identifier) + "%22"
-                sq = SolrQuery(SolrServer(solr_protocol, solr_host, solr_port))
-                query_url_pattern = sq.get_select_pattern(solr_core)
-                query_ulr = query_url_pattern.format(query_part)
-                logging.debug("Solr query: %s" % query_ulr)
-                data = json.load(urlopen(query_ulr))
-                return int(data['response']['numFound'])
-            except ValueError:
-                return 0
+            # cached, tables use the batch lookup for all packages of a page
+            from earkweb.statistics import indexed_document_counts
+            return indexed_document_counts([self.identifier]).get(self.identifier, 0)
 
     def __str__(self):
         return self.work_dir
@@ -79,9 +77,33 @@ class Representation(models.Model):
     ip = models.ForeignKey(InformationPackage, on_delete=models.CASCADE, null=True)
 
 
+class DublinCoreRecord(models.Model):
+    """Pre-serialized Dublin Core metadata (oai_dc) of a package version, rendered when the package is indexed"""
+    class Meta:
+        db_table = 'dublincorerecord'
+        constraints = [
+            models.UniqueConstraint(fields=['identifier', 'version'], name='dcrecord_identifier_version_uniq'),
+        ]
+    id = models.AutoField(primary_key=True)
+    identifier = models.CharField(max_length=200)
+    version = models.IntegerField()
+    xml = models.TextField()
+    rendered = models.DateTimeField(auto_now=True, blank=True)
+
+    def __str__(self):
+        return "%s (v%d)" % (self.identifier, self.version)
+
+
 class InternalIdentifier(models.Model):
     class Meta:
         db_table = 'internalidentifier'
+        indexes = [
+            # allocation of unused identifiers (by namespace or by user)
+            models.Index(fields=['used', 'org_nsid', 'id'], name='intid_unused_org_idx'),
+            models.Index(fields=['used', 'is_blockchain_id', 'user', 'id'], name='intid_unused_user_idx'),
+            # duplicate check
+            models.Index(fields=['org_nsid', 'identifier'], name='intid_org_identifier_idx'),
+        ]
     id = models.AutoField(primary_key=True)
     org_nsid = models.CharField(max_length=200)
     identifier = models.CharField(max_length=200)
@@ -158,6 +158,15 @@ CELERY_TASK_MAX_RETRIES = 5          # Maximum number of retries for tasks
 BROKER_URL = "amqp://%s:%s@%s:%d/" % (rabbitmq_user, rabbitmq_password, rabbitmq_host, rabbitmq_port)
 CELERY_RESULT_BACKEND = "redis://:%s@%s:%d/0" % (redis_password, redis_host, redis_port)
 
+# cache shared by the web and worker processes (statistics)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': "redis://:%s@%s:%d/1" % (redis_password, redis_host, redis_port),
+        'KEY_PREFIX': 'earkweb',
+    }
+}
+
 BROKER_CONNECTION_TIMEOUT = 30
 BROKER_POOL_LIMIT = 100
 CELERY_REDIS_MAX_CONNECTIONS = 20
@@ -177,9 +186,10 @@ CELERYD_POOL_RESTARTS = True
 from celery.schedules import crontab
 
 CELERYBEAT_SCHEDULE = {
-    "generate_wordcloud_every_two_minutes": {
+    # word cloud terms are updated on indexing, the periodic run only reconciles the term store with the index
+    "update_wordcloud": {
         'task': 'generate_wordcloud_task',
-        'schedule': crontab(minute='*/1'),
+        'schedule': crontab(minute='*/15'),
     },
 }
 
@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+# coding=UTF-8
+"""
+Repository statistics shown on the home page. Results are computed with aggregate queries (database) and facets
+(Solr) and cached for a short time (statistics_cache_ttl), so that page loads and chart refreshes do not hit the
+database or the search index every time.
+
+The word cloud is rendered from a term frequency store which holds the term frequencies of each indexed package.
+The store is updated when a package is indexed and the image is only regenerated if the term distribution has
+changed materially (wordcloud_change_threshold).
+"""
+import fcntl
+import json
+import logging
+import os
+import unittest
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pysolr
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+from wordcloud import WordCloud
+
+from access.search.solrgateway import get_solr_gateway
+from config.configuration import statistics_cache_ttl, wordcloud_change_threshold
+from earkweb.models import InformationPackage
+from util.metadatacleaner import clean_metadata
+
+logger = logging.getLogger(__name__)
+
+# content files of representations (path as stored or as safe file name); slashes are escaped, an unescaped slash
+# starts a regular expression in the standard query parser
+CONTENT_FILE_FILTER_QUERY = r'path:*representations\/*\/data\/* OR path:*representations=*=data=*'
+
+# number of terms kept per package and shown in the word cloud
+TERMS_PER_PACKAGE = 500
+WORDCLOUD_MAX_WORDS = 200
+
+MONTH_NAMES = ["January", "February", "March", "April", "May", "June", "July",
+               "August", "September", "October", "November", "December"]
+
+
+def month_starts(num_months, now=None):
+    """
+    Start of the last months (including the current month), oldest first
+    @type       num_months: int
+    @param      num_months: Number of months
+    @type       now: datetime
+    @param      now: Reference date (default: current date)
+    @rtype:     list
+    @return:    List of datetime objects (first day of the month, UTC)
+    """
+    now = now or datetime.now(timezone.utc)
+    year, month = now.year, now.month
+    starts = []
+    for _ in range(num_months):
+        starts.append(datetime(year, month, 1, tzinfo=timezone.utc))
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+    return list(reversed(starts))
+
+
+def month_label(date):
+    """Label of a month (e.g. 'January 25')"""
+    return "%s %s" % (MONTH_NAMES[date.month - 1], str(date.year % 100).zfill(2))
+
+
+def monthly_package_counts(num_months=7):
+    """
+    Number of submitted (not yet ingested) and ingested packages created per month, computed with one grouped
+    query (cached)
+    @type       num_months: int
+    @param      num_months: Number of months (including the current month)
+    @rtype:     dict
+    @return:    Month labels ('labels') and counts per month ('submitted', 'ingested')
+    """
+    cache_key = "statistics:monthly_package_counts:%d" % num_months
+    result = cache.get(cache_key)
+    if result is not None:
+        return result
+    starts = month_starts(num_months)
+    # months are truncated in UTC (the connection time zone), this avoids a dependency on the time zone tables
+    # of the database server
+    # pylint: disable-next=no-member
+    rows = InformationPackage.objects.filter(created__gte=starts[0]) \
+        .annotate(month=TruncMonth('created', tzinfo=timezone.utc)) \
+        .values('month') \
+        .annotate(submitted=Count('id', filter=Q(storage_dir='')), ingested=Count('id', filter=~Q(storage_dir=''))) \
+        .order_by('month')
+    counts = {(row['month'].year, row['month'].month): row for row in rows if row['month']}
+    result = {
+        'labels': [month_label(start) for start in starts],
+        'submitted': [counts[(s.year, s.month)]['submitted'] if (s.year, s.month) in counts else 0 for s in starts],
+        'ingested': [counts[(s.year, s.month)]['ingested'] if (s.year, s.month) in counts else 0 for s in starts],
+    }
+    cache.set(cache_key, result, statistics_cache_ttl)
+    return result
+
+
+def file_type_statistics():
+    """
+    Number of content files and total file size per MIME type of the indexed representation content files,
+    computed by Solr (JSON Facet API) over all documents with one request (cached). Content types are normalized
+    to the MIME type without parameters (e.g. 'text/plain; charset=UTF-8' is counted as 'text/plain').
+    @rtype:     dict
+    @return:    Chart data ('labels', 'data') of the file counts ('counts') and file sizes ('sizes')
+    """
+    cache_key = "statistics:file_type_statistics"
+    result = cache.get(cache_key)
+    if result is not None:
+        return result
+    facet = {'content_types': {'type': 'terms', 'field': 'content_type', 'limit': -1, 'missing': False,
+                               'facet': {'size': 'sum(size)'}}}
+    try:
+        response = get_solr_gateway().client().search('content_type:*', **{
+            'fq': CONTENT_FILE_FILTER_QUERY,
+            'rows': 0,
+            'json.facet': json.dumps(facet),
+        })
+        buckets = response.raw_response.get('facets', {}).get('content_types', {}).get('buckets', [])
+    except (pysolr.SolrError, ValueError) as e:
+        logger.error("Unable to retrieve file type statistics: %s" % e)
+        return {'counts': {'labels': [], 'data': []}, 'sizes': {'labels': [], 'data': []}}
+    result = file_type_chart_data(buckets)
+    cache.set(cache_key, result, statistics_cache_ttl)
+    return result
+
+
+def file_type_chart_data(buckets):
+    """
+    Aggregate content type facet buckets by MIME type (without parameters)
+    @type       buckets: list
+    @param      buckets: Facet buckets ('val': content type, 'count': number of files, 'size': sum of file sizes)
+    @rtype:     dict
+    @return:    Chart data ('labels', 'data') of the file counts ('counts') and file sizes ('sizes')
+    """
+    counts = defaultdict(int)
+    sizes = defaultdict(int)
+    for bucket in buckets:
+        mime_type = bucket['val'].split(';', 1)[0].strip()
+        if mime_type:
+            counts[mime_type] += bucket['count']
+            if bucket.get('size'):
+                sizes[mime_type] += int(bucket['size'])
+    return {
+        'counts': {'labels': list(counts.keys()), 'data': list(counts.values())},
+        'sizes': {'labels': list(sizes.keys()), 'data': list(sizes.values())},
+    }
+
+
+def _document_count_key(identifier):
+    return "statistics:indexed_documents:%s" % identifier
+
+
+def indexed_document_counts(identifiers):
+    """
+    Number of indexed documents of packages, fetched with one facet query on the package field for all packages
+    which are not cached (cached for statistics_cache_ttl seconds)
+    @type       identifiers: list
+    @param      identifiers: Package identifiers
+    @rtype:     dict
+    @return:    Number of indexed documents per package identifier (0 if the index is not available)
+    """
+    identifiers = [identifier for identifier in set(identifiers) if identifier]
+    cached = cache.get_many([_document_count_key(identifier) for identifier in identifiers])
+    counts = {identifier: cached[_document_count_key(identifier)] for identifier in identifiers
+              if _document_count_key(identifier) in cached}
+    missing = [identifier for identifier in identifiers if identifier not in counts]
+    if not missing:
+        return counts
+    query = 'package:(%s)' % ' OR '.join('"%s"' % identifier.replace('\\', '\\\\').replace('"', '\\"')
+                                        for identifier in missing)
+    try:
+        results = get_solr_gateway().client().search(query, **{
+            'rows': 0,
+            'facet': 'true',
+            'facet.field': 'package',
+            'facet.limit': -1,
+            'facet.mincount': 1,
+        })
+    except pysolr.SolrError as e:
+        logger.warning("Number of indexed documents not available: %s" % e)
+        counts.update({identifier: 0 for identifier in missing})
+        return counts
+    values = results.facets.get('facet_fields', {}).get('package', [])
+    found = dict(zip(values[0::2], values[1::2]))
+    fetched = {identifier: int(found.get(identifier, 0)) for identifier in missing}
+    cache.set_many({_document_count_key(identifier): count for identifier, count in fetched.items()},
+                   statistics_cache_ttl)
+    counts.update(fetched)
+    return counts
+
+
+def invalidate_indexed_document_count(identifier):
+    """Remove the cached number of indexed documents of a package (e.g. after it was indexed)"""
+    cache.delete(_document_count_key(identifier))
+
+
+def wordcloud_image_path():
+    """Path of the word cloud image"""
+    return os.path.join(settings.MEDIA_ROOT, 'wordcloud', 'wordcloud.png')
+
+
+def _term_store_path():
+    return os.path.join(settings.MEDIA_ROOT, 'wordcloud', 'terms.json')
+
+
+@contextmanager
+def _term_store():
+    """Term frequency store (read and written under an exclusive lock, shared by all worker processes)"""
+    store_path = _term_store_path()
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    with open(store_path + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            store = {'packages': {}, 'rendered': {}}
+            if os.path.exists(store_path):
+                try:
+                    with open(store_path, 'r', encoding='utf-8') as f:
+                        store.update(json.load(f))
+                except ValueError:
+                    logger.warning("Term frequency store is corrupt and will be rebuilt: %s" % store_path)
+            yield store
+            with open(store_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(store, f)
+            os.replace(store_path + '.tmp', store_path)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def package_term_frequencies(identifier, rows=100):
+    """
+    Term frequencies of the indexed content files of a package (technical metadata removed, stop words excluded)
+    @type       identifier: string
+    @param      identifier: Package identifier
+    @type       rows: int
+    @param      rows: Number of documents fetched per request
+    @rtype:     dict
+    @return:    Most frequent terms (at most TERMS_PER_PACKAGE) and their frequencies
+    """
+    word_cloud = WordCloud()
+    frequencies = Counter()
+    for result in get_solr_gateway().cursor_pages({
+        'q': 'package:"%s"' % identifier.replace('"', '\\"'),
+        'fq': CONTENT_FILE_FILTER_QUERY,
+        'fl': 'content',
+        'rows': rows,
+        'sort': 'id asc',
+    }):
+        for doc in result['response']['docs']:
+            content = doc.get('content', '')
+            content = '\n'.join(content) if isinstance(content, list) else content
+            text = clean_metadata(content)
+            if text:
+                frequencies.update(word_cloud.process_text(text))
+    return dict(frequencies.most_common(TERMS_PER_PACKAGE))
+
+
+def indexed_packages():
+    """Identifiers of the packages with indexed content files (facet on the package field)"""
+    results = get_solr_gateway().client().search('*:*', **{
+        'fq': CONTENT_FILE_FILTER_QUERY,
+        'rows': 0,
+        'facet': 'true',
+        'facet.field': 'package',
+        'facet.limit': -1,
+        'facet.mincount': 1,
+    })
+    values = results.facets.get('facet_fields', {}).get('package', [])
+    return set(values[0::2])
+
+
+def aggregate_term_frequencies(store, max_words=WORDCLOUD_MAX_WORDS):
+    """Most frequent terms over all packages of the term frequency store"""
+    total = Counter()
+    for frequencies in store['packages'].values():
+        total.update(frequencies)
+    return dict(total.most_common(max_words))
+
+
+def distribution_change(previous, current):
+    """
+    Change between two term frequency distributions (half of the L1 distance of the relative frequencies)
+    @rtype:     float
+    @return:    Value between 0 (same distribution) and 1 (no common terms)
+    """
+    previous_total = sum(previous.values())
+    current_total = sum(current.values())
+    if not previous_total or not current_total:
+        return 0.0 if previous_total == current_total else 1.0
+    return sum(abs(previous.get(term, 0) / previous_total - current.get(term, 0) / current_total)
+               for term in set(previous) | set(current)) / 2
+
+
+def _render_if_changed(store, force=False):
+    frequencies = aggregate_term_frequencies(store)
+    image_path = wordcloud_image_path()
+    if not force and os.path.exists(image_path) and \
+            distribution_change(store.get('rendered', {}), frequencies) < wordcloud_change_threshold:
+        return False
+    if not frequencies:
+        if os.path.exists(image_path):
+            os.remove(image_path)
+        store['rendered'] = {}
+        return True
+    word_cloud = WordCloud(width=800, height=400, background_color='white', max_words=WORDCLOUD_MAX_WORDS)
+    word_cloud.generate_from_frequencies(frequencies)
+    word_cloud.to_file(image_path + '.tmp.png')
+    os.replace(image_path + '.tmp.png', image_path)
+    store['rendered'] = frequencies
+    logger.info("Word cloud image saved at %s" % image_path)
+    return True
+
+
+def update_package_terms(identifier):
+    """
+    Update the term frequencies of a (re-)indexed package and regenerate the word cloud if the term distribution
+    has changed materially
+    @rtype:     bool
+    @return:    True if the image was regenerated
+    """
+    frequencies = package_term_frequencies(identifier)
+    with _term_store() as store:
+        store['packages'][identifier] = frequencies
+        return _render_if_changed(store)
+
+
+def reconcile_term_store(force=False):
+    """
+    Synchronize the term frequency store with the index (packages indexed or removed without updating the store)
+    and regenerate the word cloud if required
+    @type       force: bool
+    @param      force: Regenerate the image even if the term distribution did not change
+    @rtype:     bool
+    @return:    True if the image was regenerated
+    """
+    indexed = indexed_packages()
+    with _term_store() as store:
+        known = set(store['packages'])
+    added = {identifier: package_term_frequencies(identifier) for identifier in indexed - known}
+    with _term_store() as store:
+        for identifier in set(store['packages']) - indexed:
+            del store['packages'][identifier]
+        store['packages'].update(added)
+        return _render_if_changed(store, force)
+
+
+class TestStatistics(unittest.TestCase):
+
+    def test_file_type_chart_data(self):
+        buckets = [
+            {'val': "text/plain; charset=UTF-8", 'count': 2, 'size': 300.0},
+            {'val': "application/pdf", 'count': 1, 'size': 1000.0},
+            {'val': "text/plain; charset=ISO-8859-1", 'count': 1, 'size': 50.0},
+            {'val': "image/png", 'count': 3},
+            {'val': "", 'count': 5, 'size': 10.0},
+        ]
+        self.assertEqual({
+            'counts': {'labels': ["text/plain", "application/pdf", "image/png"], 'data': [3, 1, 3]},
+            'sizes': {'labels': ["text/plain", "application/pdf"], 'data': [350, 1000]},
+        }, file_type_chart_data(buckets))
+        self.assertEqual({'counts': {'labels': [], 'data': []}, 'sizes': {'labels': [], 'data': []}},
+                         file_type_chart_data([]))
+
+if __name__ == '__main__':
+    unittest.main()
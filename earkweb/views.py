@@ -1,16 +1,10 @@
 import json
 import re
 import os
-import io
-from collections import defaultdict
 import traceback
 import logging
-from datetime import datetime, timedelta
-from urllib.parse import unquote, urlencode, urlparse
-import pysolr
+from urllib.parse import quote, urlparse
 import requests
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
 from django.shortcuts import redirect, render
 from django.utils import translation
 from django.views.generic.base import View
@@ -18,26 +12,30 @@ from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
-from django.http import HttpResponse
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.template import loader
 from django.http import JsonResponse
 from django.utils.translation import gettext as trans
 from celery.result import AsyncResult
 from chartjs.views.lines import BaseLineChartView
-from util import service_available
-from util.djangoutils import get_user_api_token
+from access.search.solrgateway import get_solr_gateway, query_cache_key, cursor_sort
+from access.search.documentsearch import RESULT_FIELDS
+from util.custom_exceptions import NotFoundError, AuthenticationError
+from util.directorylisting import directory_children
+from util.fileresponse import conditional_file_response
 from earkweb.models import InformationPackage
+from earkweb.statistics import monthly_package_counts, file_type_statistics, wordcloud_image_path
+from api.services import area_directory_tree, storage_inventory, is_process_id, working_file_response, \
+    storage_file_response, reception_file_response
 from eatb.pairtree_storage import make_storage_data_directory_path
 from eatb.utils.datetime import get_date_from_iso_str, DT_ISO_FORMAT
-from eatb.utils.fileutils import path_to_dict, from_safe_filename
-from config.configuration import config_path_work, config_path_storage, verify_certificate
+from eatb.utils.fileutils import from_safe_filename
+from config.configuration import config_path_work, config_path_storage
 from config.configuration import sw_version, django_backend_service_api_url
 from config.configuration import sw_version_date
-from config.configuration import solr_host
-from config.configuration import solr_port
-from config.configuration import solr_core
+from config.configuration import solr_core, search_cache_ttl, search_cache_max_rows
 from config.configuration import solr_core_ping_url
-from config.configuration import solr_core_url
 
 
 logger = logging.getLogger(__name__)
@@ -103,257 +101,35 @@ class ActivateLanguageView(View):
 from django.views.generic import TemplateView
 from chartjs.views.lines import BaseLineChartView
 
-def get_last_7_months_labels():
-    months = ["January", "February", "March", "April", "May", "June", "July", 
-              "August", "September", "October", "November", "December"]
-    current_date = datetime.now()
-    result = []
-    
-    for i in range(6, -1, -1):
-        past_date = current_date - timedelta(days=i*30)
-        month_year = months[past_date.month - 1] + " " + str(past_date.year % 100).zfill(2)
-        result.append(month_year)
-    
-    return result
-
-def get_last_7_months():
-    months = ["January", "February", "March", "April", "May", "June", "July", 
-              "August", "September", "October", "November", "December"]
-    current_date = datetime.now()
-    result = []
-    date_ranges = []
-
-    for i in range(6, -1, -1):
-        past_date = current_date - timedelta(days=i*30)
-        month_year = months[past_date.month - 1] + " " + str(past_date.year % 100).zfill(2)
-        start_date = past_date.replace(day=1)
-        end_date = (start_date + timedelta(days=31)).replace(day=1) - timedelta(seconds=1)
-        result.append(month_year)
-        date_ranges.append((start_date, end_date))
-    
-    return result, date_ranges
-
-def get_entries_count_for_last_7_months(only_ingested=False):
-    month_labels, date_ranges = get_last_7_months()
-    counts = []
-    for start_date, end_date in date_ranges:
-        if only_ingested:
-            # pylint: disable-next=no-member
-            count = InformationPackage.objects.filter(
-                created__range=(start_date, end_date)
-            ).exclude(
-                storage_dir__exact=''
-            ).count()
-        else:
-            # pylint: disable-next=no-member
-            count = InformationPackage.objects.filter(
-                created__range=(start_date, end_date),
-                storage_dir=''
-            ).count()
-        counts.append(count)
-    
-    return counts
-
-
 class LineChartJSONView(BaseLineChartView):
+    def get_context_data(self, **kwargs):
+        # one (cached) aggregate query for labels and both datasets
+        self.counts = monthly_package_counts(7)
+        return super().get_context_data(**kwargs)
+
     def get_labels(self):
         """Return 7 labels for the x-axis."""
-        return get_last_7_months_labels()
+        return self.counts['labels']
 
     def get_providers(self):
         """Return names of datasets."""
         return ["Submitted", "Ingested"]
 
     def get_data(self):
-        """Return 3 datasets to plot."""
-
-        return [get_entries_count_for_last_7_months(only_ingested=False), get_entries_count_for_last_7_months(only_ingested=True)]
-
-
-# Connect to your Solr server
-solr = pysolr.Solr(solr_core_url, always_commit=True)
-
-
-def get_mime_type_counts():
-    # Query Solr to retrieve documents with content_type and path fields
-    results = solr.search('content_type:* AND path:*', rows=1000)
-
-    # Dictionary to count MIME types
-    mime_type_counts = defaultdict(int)
-
-    # Regular expression to extract the MIME type
-    mime_type_regex = re.compile(r'^([^;]+)')
-    
-    # Regular expression to match the required path pattern
-    path_regex = re.compile(r'representations/[^/]+/data/')
-
-    # Process the results
-    for result in results:
-        # Get the 'path' field
-        path = result.get('path')
-        if path:
-            # Check if the path matches the required structure
-            if path_regex.search(path):
-                # Get the first MIME type (if available) from 'content_type'
-                content_type = result.get('content_type', [None])[0]
-                if content_type:
-                    # Extract the main MIME type
-                    match = mime_type_regex.match(content_type)
-                    if match:
-                        mime_type = match.group(1)
-                        mime_type_counts[mime_type] += 1
-
-    # Prepare the labels and data lists for charting
-    labels = list(mime_type_counts.keys())
-    data = list(mime_type_counts.values())
-
-    return {'labels': labels, 'data': data}
-
-
-
-
+        """Return 2 datasets to plot."""
+        return [self.counts['submitted'], self.counts['ingested']]
 
 
 line_chart = TemplateView.as_view(template_name='earkweb/line_chart.html')
 line_chart_json = LineChartJSONView.as_view()
 
 
-def get_file_size_per_mime_type():
-    # Query Solr to retrieve documents with content_type, path, and size fields
-    results = solr.search('content_type:* AND path:*', rows=1000)
-
-    # Initialize a dictionary to aggregate file sizes per MIME type
-    mime_type_sizes = defaultdict(int)
-
-    # Regular expression to extract the MIME type
-    mime_type_regex = re.compile(r'^([^;]+)')
-    
-    # Regular expression to match the required path pattern
-    path_regex = re.compile(r'representations/[^/]+/data/')
-
-    # Process the results
-    for result in results:
-        path = result.get('path', None)
-        if path:
-            # Decode the path
-            decoded_path = unquote(path.replace('=', '/'))
-            if path_regex.search(decoded_path):
-                content_type = result.get('content_type', [None])[0]
-                size = result.get('size', 0)
-                if content_type and size:
-                    match = mime_type_regex.match(content_type)
-                    if match:
-                        mime_type = match.group(1)
-                        mime_type_sizes[mime_type] += int(size)
-
-    # Prepare the labels and data lists
-    labels = list(mime_type_sizes.keys())
-    data = list(mime_type_sizes.values())
-
-    return {'labels': labels, 'data': data}
-
-
-def clean_metadata(text):
-    """
-    Cleans the technical metadata from the input text and retains only the actual content.
-
-    Parameters:
-    text (str): The input string containing both metadata and content.
-
-    Returns:
-    str: Cleaned content text without technical metadata.
-    """
-
-    # Define a list of patterns to remove (date-time, access permissions, pdf metadata, etc.)
-    patterns_to_remove = [
-        r'\b[\w\-]+:.*',            # Metadata key-value pairs (e.g., pdf:PDFVersion, Last-Save-Date, etc.)
-        r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z',  # ISO date pattern (e.g., 2024-06-04T11:40:41Z)
-        r'X-Parsed-By.*',           # Metadata parsing info
-        r'meta:.*',                 # Meta-related fields
-        r'producer.*',              # Producer info
-        r'Pre',              # Producer info
-        r'stream_.*',               # Stream info (size, source, etc.)
-        r'n_.*',                    # Stream info (size, source, etc.)
-        r'start_.*',                    # Stream info (size, source, etc.)
-        r'end_.*',                    # Stream info (size, source, etc.)
-        r'endnote_.*',                    # Stream info (size, source, etc.)
-        r'annotation',                    # Stream info (size, source, etc.)
-        r'body_.*',                    # Stream info (size, source, etc.)
-        r'access_permission:.*',    # Access permission fields
-        r'pdf:docinfo:.*',          # PDF docinfo metadata
-        r'Content-Type.*',          # Content-Type fields
-        r'xmp:.*',                  # XMP metadata
-        r'xmpTPg:.*',               # XMP page info
-        r'Creation-Date.*',         # Creation date fields
-        r'\bcreated\b.*',           # Created fields
-        r'\bmodified\b.*',          # Modified fields
-    ]
-    
-    # Combine patterns into one regex
-    combined_pattern = '|'.join(patterns_to_remove)
-    
-    # Remove all matching patterns from the text
-    cleaned_text = re.sub(combined_pattern, '', text, flags=re.IGNORECASE)
-    
-    # Remove extra whitespaces, tabs, and newlines
-    cleaned_text = re.sub(r'\s+', ' ', cleaned_text).strip()
-    
-    return cleaned_text
-
-
 class WordCloudView(View):
     def get(self, request, *args, **kwargs):
-        # Initialize Solr client
-        solr = pysolr.Solr(solr_core_url, timeout=10)
-
-        
-        # Define the filter query to match paths containing "representations", a UUID, and "data"
-        filter_query = 'path:*/representations/*/data/*'
-        
-        # Fetch all documents with the "content" field
-        results = solr.search('*:*', **{
-            'fq': filter_query,     # Filter query to match the desired paths
-             'fl': 'content,path',   # Retrieve both "content" and "path" fields
-            'rows': 1000      # Fetch as many documents as you expect; modify as needed
-        })
-
-        # Aggregate all content fields into a single string
-        logger.info(len(results))
-        try:
-            # Try to aggregate the content from all Solr documents
-            all_content = ' '.join(
-                [clean_metadata(' '.join(doc['content'])) if isinstance(doc.get('content', ''), list) else clean_metadata(doc.get('content', '')) 
-                for doc in results]
-            )
-            
-        except KeyError as e:
-            # Handle the case where 'content' is missing in a document
-            logger.error(f"KeyError: The 'content' field is missing in some documents: {e}")
-            all_content = ''
-        except TypeError as e:
-            # Handle cases where 'results' is not iterable or contains invalid types
-            logger.error(f"TypeError: Invalid type encountered in Solr results: {e}")
-            all_content = ''
-        except Exception as e:
-            # Generic exception handler for any other unforeseen issues
-            logger.error(f"An unexpected error occurred: {e}")
-            all_content = ''
-        
-        if not all_content.strip():
+        # the image is generated by the backend when the term frequencies change (see generate_wordcloud_task)
+        if not os.path.isfile(wordcloud_image_path()):
             return HttpResponse("No content found", status=404)
-
-        # Generate word cloud
-        wordcloud = WordCloud(width=800, height=400, background_color='white').generate(all_content)
-
-        # Save to a bytes buffer
-        buffer = io.BytesIO()
-        plt.figure(figsize=(10, 5))
-        plt.imshow(wordcloud, interpolation='bilinear')
-        plt.axis('off')
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-            # Return the image as an HTTP response
-        return HttpResponse(buffer, content_type='image/png')
+        return conditional_file_response(request, wordcloud_image_path(), 'image/png')
 
 
 @login_required
@@ -367,21 +143,18 @@ def home(request):
     Returns:
     - HttpResponse: Home page.
     """
-    if not service_available(solr_core_ping_url):
+    if not get_solr_gateway().ping():
         return render(request, 'earkweb/error.html', {'header': 'SolR server unavailable', 'message': "Required service is not available at: %s" % solr_core_ping_url})
     template = loader.get_template('earkweb/home.html')
 
-    mime_type_stats = get_mime_type_counts()
-
-    file_size_data = get_file_size_per_mime_type()
-
+    file_type_stats = file_type_statistics()
 
     context = {
         'sw_version': sw_version,
         'sw_version_date': sw_version_date,
-        'labels': mime_type_stats['labels'], # ["a", "b", "c"],
-        'data': mime_type_stats['data'], # [20, 60, 20],
-        'file_size_data': file_size_data  # Pass the entire dictionary
+        'labels': file_type_stats['counts']['labels'],
+        'data': file_type_stats['counts']['data'],
+        'file_size_data': file_type_stats['sizes']
     }
     return HttpResponse(template.render(context=context, request=request))
 
@@ -497,8 +270,8 @@ def working_area2(request, section, uid):
     Render the working area page for information package management, submission, or access.
 
     This function determines the type of operation (management, submission, or access)
-    based on the request path, sets the appropriate title and section, and fetches the
-    directory JSON data from an API endpoint. It then renders the 'workingarea2.html'
+    based on the request path, sets the appropriate title and section, and reads the
+    directory JSON data using the API's service layer. It then renders the 'workingarea2.html'
     template with the fetched data and additional context.
 
     Args:
@@ -514,15 +287,16 @@ def working_area2(request, section, uid):
     r = request.META['PATH_INFO']
     title = trans("Information package management") if "management" in r else trans("Submission") if "submission" in r else trans("Access")
     section = "management" if "management" in r else "submission" if "submission" in r else "access"
-    schema, domain = get_domain_scheme(request.headers.get("Referer"))
-    url = "%s://%s/earkweb/api/ips/%s/dir-json" % (schema, domain, uid)
-    user_api_token = get_user_api_token(request.user)
-    response = requests.get(url, headers={'Authorization': 'Token %s' % user_api_token}, verify=verify_certificate)
+    try:
+        dirasjson = json.dumps(area_directory_tree("work", uid, request.user))
+    except (NotFoundError, AuthenticationError) as e:
+        dirasjson = json.dumps({"message": str(e)})
     context = {
         "title": title,
         "section": section,
         "uid": uid,
-        "dirasjson": response.content.decode('utf-8'),
+        "dirasjson": dirasjson,
+        "dir_json_url": "/earkweb/api/ips/%s/dir-json" % uid,
         "django_backend_service_api_url": django_backend_service_api_url
     }
     return HttpResponse(template.render(context=context, request=request))
@@ -561,32 +335,25 @@ def storage_area(request, section, identifier):
     else:
         title = "Access"
         section = section if section else "access"
-    #store_path = "%s" % make_storage_data_directory_path(identifier, config_path_storage)
-    #logger.info(store_path)
-    #schema, domain = get_domain_scheme(request.headers.get("Referer"))
-    schema, domain = get_domain_scheme_from_request(request)
-    url = f"{schema}://{domain}/earkweb/api/storage/ips/{identifier}/dir-json"
-    user_api_token = get_user_api_token(request.user)
-    response = requests.get(
-        url, 
-        headers={'Authorization': f'Token {user_api_token}'}, 
-        verify=verify_certificate,
-        timeout=10
-    )
-    if response.status_code != 200:
+    try:
+        dirasjson = json.dumps(area_directory_tree("storage", identifier, request.user))
+    except NotFoundError as e:
         return render(request, 'earkweb/error.html', {
-            'header': 'Archived object does not exist (%d)' % response.status_code,
-            'details': response.text
+            'header': 'Archived object does not exist (404)',
+            'details': str(e)
+        })
+    except AuthenticationError as e:
+        return render(request, 'earkweb/error.html', {
+            'header': 'Archived object does not exist (403)',
+            'details': str(e)
+        })
+    try:
+        inventory = storage_inventory(identifier).data
+    except NotFoundError as e:
+        return render(request, 'earkweb/error.html', {
+            'header': 'Invalid inventory',
+            'details': str(e)
         })
-
-    inventory_url = f"{schema}://{domain}/earkweb/api/ips/{identifier}/file-resource/inventory.json"
-    inventory_response = requests.get(
-        inventory_url, 
-        headers={'Authorization': f'Token {user_api_token}'}, 
-        verify=verify_certificate,
-        timeout=10
-    )
-    inventory = json.loads(inventory_response.text)
     try:
         version_timeline_data = [
             {
@@ -641,7 +408,8 @@ def storage_area(request, section, identifier):
         "title": title,
         "section": section,
         "uid": identifier,
-        "dirasjson": response.content.decode('utf-8'),
+        "dirasjson": dirasjson,
+        "dir_json_url": "/earkweb/api/storage/ips/%s/dir-json" % quote(identifier, safe=''),
         "show_timeline": True,
         "identifier": identifier,
         "version_timeline_data": version_timeline_data,
@@ -668,18 +436,38 @@ def read_file(request, ip_sub_file_path, area=None):
     """
     parts = ip_sub_file_path.split("/")
     uid = parts[0]
-    path = ip_sub_file_path.lstrip(parts[0]).lstrip("/")
+    path = ip_sub_file_path[len(uid):].lstrip("/")
     area = area if area else "ips"
-    schema, domain = get_domain_scheme(request.headers.get("Referer"))
+    if area == "reception":
+        return reception_file_response(request, path)
     uid = from_safe_filename(uid)
-    url = "%s://%s/earkweb/api/%s/%s/file-resource/%s/" % (schema, domain, area, uid, path)
-    user_api_token = get_user_api_token(request.user)
-    api_response = requests.get(url, headers={'Authorization': 'Token %s' % user_api_token}, verify=verify_certificate)
-    content_type = api_response.headers['content-type']
-    response = HttpResponse(api_response.content, content_type=content_type)
-    if "Content-Disposition" in api_response.headers:
-        response['Content-Disposition'] = api_response.headers['Content-Disposition']
-    return response
+    if is_process_id(uid):
+        return working_file_response(request, uid, path)
+    return storage_file_response(request, uid, path)
+
+
+def _directory_tree_response(request, root, path_prefix):
+    """
+    Directory tree JSON response: the root node with the first page of entries or, if the 'node' parameter is
+    given, a page of entries of the directory 'node' (path relative to the root)
+    """
+    try:
+        offset = int(request.POST.get('offset', 0))
+        node_path = request.POST.get('node', "")
+        page = directory_children(root, node_path, path_prefix, offset)
+    except ValueError as e:
+        return JsonResponse({"message": str(e)}, status=400)
+    except OSError:
+        return JsonResponse({"message": "Directory does not exist"}, status=404)
+    if 'node' in request.POST:
+        return JsonResponse(page)
+    root_node = {
+        'text': os.path.basename(root),
+        'state': {'opened': True},
+        'children': page['children'],
+        'data': {'path': path_prefix.rstrip('/'), 'node': "", 'next_offset': page['next_offset']}
+    }
+    return JsonResponse({"data": root_node, "check_callback": "true"})
 
 
 @login_required
@@ -690,27 +478,24 @@ def get_directory_json(request):
 
     This view requires the user to be logged in and exempts the request from CSRF verification.
     It expects a POST request with a 'uid' parameter, which is used to locate a specific directory.
+    Only one directory level is listed per request (paged), sub-directories are loaded on demand by passing
+    their path as 'node' parameter (and 'offset' for subsequent pages).
 
     Args:
         request (HttpRequest): The HTTP request object, expected to contain a 'uid' parameter in POST data.
 
     Returns:
-        JsonResponse: A JSON response containing the directory structure rooted at the specified user's directory.
-                      The response also includes a check_callback flag set to "true".
+        JsonResponse: A JSON response containing the root node of the specified working directory with the
+                      first page of its entries (or a page of entries of the requested node). The response also
+                      includes a check_callback flag set to "true".
 
     Raises:
         KeyError: If 'uid' is not provided in the POST data.
-        FileNotFoundError: If the directory specified by 'uid' does not exist.
 
     """
     uid = request.POST['uid']
     work_dir = os.path.join(config_path_work, uid)
-    dirlist = os.listdir(work_dir)
-    if len(dirlist) > 0:
-        package_name = dirlist[0]
-    else:
-        package_name = dirlist
-    return JsonResponse({ "data": path_to_dict(work_dir, strip_path_part=config_path_work+'/'), "check_callback": "true"})
+    return _directory_tree_response(request, work_dir, "%s/" % uid)
 
 
 @login_required
@@ -720,8 +505,8 @@ def get_storage_directory_json(request):
     Handles a POST request to retrieve the storage directory contents as JSON.
 
     This view is protected by login and CSRF exempt. It processes an identifier from the 
-    request to determine the corresponding storage directory, lists its contents, and 
-    returns a JSON response with the directory structure.
+    request to determine the corresponding storage directory and returns a JSON response with
+    the first page of its entries (sub-directories are loaded on demand, see get_directory_json).
 
     Args:
         request (HttpRequest): The HTTP request object containing a POST parameter 'identifier'.
@@ -734,12 +519,8 @@ def get_storage_directory_json(request):
     """
     identifier = request.POST['identifier']
     storage_dir = make_storage_data_directory_path(identifier, config_path_storage)
-    dirlist = os.listdir(storage_dir)
-    if len(dirlist) > 0:
-        package_name = dirlist[0]
-    else:
-        package_name = dirlist
-    return JsonResponse({"data": path_to_dict(storage_dir, strip_path_part=config_path_storage+'/'), "check_callback": "true"})
+    return _directory_tree_response(request, storage_dir,
+                                    "%s/" % os.path.relpath(storage_dir, config_path_storage))
 
 
 @login_required
@@ -797,7 +578,10 @@ def poll_state(request):
 @csrf_exempt
 def solrif(request, core, operation):
     """
-    Howto page view
+    Search proxy (JSONP). Documents contain the fields of the fl parameter (default: lightweight result fields without
+    the extracted text). Pages are requested by offset (start) or by cursor (cursorMark, '*' for the first page and
+    then the nextCursorMark of the previous page). Result pages of up to search_cache_max_rows rows are cached (search_cache_ttl, invalidated
+    by index commits), larger result pages are streamed.
 
     Parameters:
     - request: The HTTP request object.
@@ -819,28 +603,41 @@ def solrif(request, core, operation):
     logger.debug("Rows: %s",  rows)
     field_list = request.GET.get('fl', '')
     logger.debug("Field list: %s",  field_list)
-    q = urlencode({
-        'q': request.GET.get('q', ''),
-        "fl": field_list,
-        "sort": sort,
+    try:
+        start, rows = int(start), int(rows)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid start or rows parameter", content_type='text/plain')
+    params = {
+        'q': request.GET.get('q', '').strip(),
+        # lightweight field list unless requested otherwise, the extracted text is only returned on request
+        "fl": ",".join(sorted(f for f in re.split(r'[\s,]+', field_list) if f)) or ",".join(RESULT_FIELDS),
+        "sort": " ".join(sort.split()),
         "start": start,
         "rows": rows,
         "wt": "json",
         "json.wrf": "callback"
-    })
-    query_url = f"http://{solr_host}:{solr_port}/solr/{solr_core}/{operation}?{q}"
-    logger.debug(query_url)
-    data = ""
+    }
+    cursor_mark = request.GET.get('cursorMark', '')
+    if cursor_mark:
+        # cursor based paging (deep pages): the sort order must include the unique key
+        params.update({"cursorMark": cursor_mark, "start": 0, "sort": cursor_sort(params["sort"])})
+    elif not params["sort"]:
+        # relevance (Solr's default order)
+        del params["sort"]
+    content_type = 'application/javascript; charset=utf-8'
     try:
-        response = requests.get(
-            query_url,
-            verify=verify_certificate,
-            timeout=10
-        )
-        return HttpResponse(
-            response.text,
-            content_type='application/javascript; charset=utf-8'
-        )
+        if rows > search_cache_max_rows:
+            # large result pages are streamed through, not buffered and cached
+            response = get_solr_gateway().get(operation, params=params, core=solr_core, stream=True)
+            return StreamingHttpResponse(_stream_response(response), content_type=content_type)
+        cache_key = query_cache_key("solrif", solr_core, operation, params)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return HttpResponse(cached, content_type=content_type)
+        response = get_solr_gateway().get(operation, params=params, core=solr_core)
+        if response.status_code == 200:
+            cache.set(cache_key, response.text, search_cache_ttl)
+        return HttpResponse(response.text, content_type=content_type)
     except requests.exceptions.Timeout:
         logger.error("Request timed out.")
         return HttpResponse(
@@ -861,7 +658,14 @@ def solrif(request, core, operation):
             "An error occurred while processing the request.",
             content_type='text/plain'
         )
-    return data
+
+
+def _stream_response(response, chunk_size=65536):
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            yield chunk
+    finally:
+        response.close()
 
 
 @login_required
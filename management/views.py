@@ -9,6 +9,8 @@ from django.contrib.auth.decorators import login_required
 from shutil import rmtree
 
 from earkweb.models import InformationPackage, Representation
+from django.db.models import Case, CharField, F, Q, Value, When
+from django.db.models.functions import Cast, Concat
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 
@@ -24,7 +26,7 @@ from uuid import uuid4
 
 import logging
 from submission.views import upload_step1
-from util.djangoutils import get_user_api_token
+from util.djangoutils import get_user_api_token, filter_information_packages
 
 logger = logging.getLogger(__name__)
 
@@ -158,19 +160,24 @@ class InformationPackageTable(tables.Table):
 @csrf_exempt
 def informationpackages_overview(request):
     area = "management"
-    areacode = "2"
     filterword = request.POST['filterword'] if 'filterword' in request.POST.keys() else ""
-    sql_query = """
-    select ip.id as id, ip.work_dir as path, ip.uid as uid, ip.package_name as package_name,
-    CONCAT('<a href="/earkweb/management/modify/',ip.id,'/" data-toggle="tooltip" title="Metadaten ändern oder neue Version übertragen"><i class="fas fa-edit editcol"></i></a>') as edit,
-    CONCAT('<a href="/earkweb/management/working_area/management/',ip.uid,'/" data-toggle="tooltip" title="View working directory">',ip.uid,'</a><a href="/earkweb/management/delete/',ip.id,'/" data-toggle="tooltip" title="Remove working copy">', IF(uid IS NULL OR uid = '', '', '<i class="glyphicon glyphicon-trash editcol"></i>'), '</a>') as packagecol,
-    ip.identifier as identifier
-    from informationpackage as ip
-    where storage_dir != '' and not deleted > 0 and (ip.uid like '%%{0}%%' or ip.package_name like '%%{0}%%' or ip.identifier like '%%{0}%%')
-    order by ip.last_change desc;
-    """.format(filterword, areacode)
-    # user_id={0} and, request.user.pk
-    queryset = InformationPackage.objects.raw(sql_query)
+    # pylint: disable-next=no-member
+    queryset = filter_information_packages(InformationPackage.objects.exclude(storage_dir='').filter(deleted=False),
+                                           filterword).annotate(
+        path=F('work_dir'),
+        edit=Concat(Value('<a href="/earkweb/management/modify/'), Cast('id', output_field=CharField()),
+                    Value('/" data-toggle="tooltip" title="Metadaten ändern oder neue Version übertragen">'
+                          '<i class="fas fa-edit editcol"></i></a>'),
+                    output_field=CharField()),
+        packagecol=Concat(Value('<a href="/earkweb/management/working_area/management/'), 'uid',
+                          Value('/" data-toggle="tooltip" title="View working directory">'), 'uid',
+                          Value('</a><a href="/earkweb/management/delete/'), Cast('id', output_field=CharField()),
+                          Value('/" data-toggle="tooltip" title="Remove working copy">'),
+                          Case(When(Q(uid__isnull=True) | Q(uid=''), then=Value('')),
+                               default=Value('<i class="glyphicon glyphicon-trash editcol"></i>'),
+                               output_field=CharField()),
+                          Value('</a>'), output_field=CharField()),
+    ).order_by('-last_change')
     table = InformationPackageTable(queryset)
     RequestConfig(request, paginate={'per_page': 8}).configure(table)
     context = {
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# coding=UTF-8
+"""
+OAI-PMH list requests (ListIdentifiers, ListRecords)
+
+Selective harvesting (from, until, set), key based paging (see resumption) and incremental serialization: the
+records of a page are fetched in batches (one database query each for the packages, their sets and their
+pre-serialized Dublin Core records, see records) and each batch is serialized and written to the streamed response
+before the next one is fetched.
+"""
+import unittest
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+from xml.sax.saxutils import escape
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from config.configuration import oai_harvest_session_ttl, oai_page_size
+from earkweb.models import InformationPackage
+from eatb.utils.datetime import date_format, current_timestamp, DT_ISO_FORMAT
+from oai_pmh.records import dc_records
+from oai_pmh.resumption import BadResumptionTokenError, new_harvest_session, encode_resumption_token, \
+    decode_resumption_token
+
+OAI_NAMESPACE = 'http://www.openarchives.org/OAI/2.0/'
+
+# number of records fetched at once
+FETCH_BATCH_SIZE = 100
+
+HARVEST_COUNT_KEY = "oai:harvest:%s:count"
+
+# arguments of list requests which apply to all pages of the list
+LIST_ARGUMENTS = ('metadataPrefix', 'from', 'until', 'set')
+
+
+class OAIError(Exception):
+    """OAI-PMH error condition (error code and message of the error response)"""
+
+    def __init__(self, code, message):
+        super(OAIError, self).__init__(message)
+        self.code = code
+        self.message = message
+
+
+def parse_datestamp(value, until=False):
+    """
+    Parse a datestamp argument (day granularity, e.g. '2024-06-04')
+
+    @type       value: string
+    @param      value: Datestamp
+    @type       until: bool
+    @param      until: Upper bound: the result is the beginning of the following day (exclusive bound)
+    @rtype: datetime
+    @return: Datetime (UTC)
+    @raises     OAIError: if the datestamp is invalid (badArgument)
+    """
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise OAIError('badArgument', 'Invalid datestamp (granularity: YYYY-MM-DD): %s' % value)
+    return day + timedelta(days=1) if until else day
+
+
+def harvestable_packages():
+    """
+    Information packages which can be harvested (stored packages with identifier) in harvest order (last_change, id)
+
+    @rtype: QuerySet
+    @return: Information packages
+    """
+    # pylint: disable-next=no-member
+    return InformationPackage.objects.exclude(identifier='').exclude(storage_dir='').order_by('last_change', 'id')
+
+
+def selective_harvest(packages, arguments):
+    """
+    Restrict packages to the selective harvesting arguments
+
+    @type       packages: QuerySet
+    @param      packages: Information packages
+    @type       arguments: dict
+    @param      arguments: Request arguments (from, until: datestamps, set: set spec)
+    @rtype: QuerySet
+    @return: Information packages
+    """
+    if 'from' in arguments:
+        packages = packages.filter(last_change__gte=parse_datestamp(arguments['from']))
+    if 'until' in arguments:
+        packages = packages.filter(last_change__lt=parse_datestamp(arguments['until'], until=True))
+    if 'set' in arguments:
+        packages = packages.filter(tags__slug=arguments['set'])
+    return packages
+
+
+def after_key(last_change, pk):
+    """Condition for packages following the key (last_change, id) in harvest order"""
+    return Q(last_change__gt=last_change) | Q(last_change=last_change, id__gt=pk)
+
+
+class HarvestList(object):
+    """
+    Page of a list request: the first page is defined by the request arguments, the following pages by the
+    resumption token (harvest session, key of the last delivered record, cursor and request arguments)
+    """
+
+    def __init__(self, request, page_size=oai_page_size, batch_size=FETCH_BATCH_SIZE):
+        """
+        Constructor to initialise the page
+
+        @type       request: HttpRequest
+        @param      request: List request
+        @type       page_size: int
+        @param      page_size: Number of records per page
+        @type       batch_size: int
+        @param      batch_size: Number of records fetched at once
+        @raises     OAIError: if the request arguments are invalid or no records match
+        """
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.next_token = None
+        resumption_token = request.GET.get('resumptionToken')
+        total_records = None
+        if resumption_token:
+            try:
+                token = decode_resumption_token(resumption_token)
+            except BadResumptionTokenError as e:
+                raise OAIError('badResumptionToken', str(e))
+            self.session, self.cursor, self.arguments = token['session'], token['cursor'], token['arguments']
+            self.after = (token['last_change'], token['pk'])
+            total_records = cache.get(HARVEST_COUNT_KEY % self.session)
+        else:
+            self.arguments = {key: request.GET[key] for key in LIST_ARGUMENTS if request.GET.get(key)}
+            self.session, self.cursor, self.after = new_harvest_session(), 0, None
+        self.validate_arguments()
+        self.packages = selective_harvest(harvestable_packages(), self.arguments)
+        if total_records is None:
+            # first page or expired harvest session
+            total_records = self.packages.count()
+            cache.set(HARVEST_COUNT_KEY % self.session, total_records, oai_harvest_session_ttl)
+        self.total_records = total_records
+        if total_records == 0:
+            raise OAIError('noRecordsMatch', 'The combination of the values of the from, until and set arguments '
+                                             'results in an empty list.')
+
+    def validate_arguments(self):
+        """
+        Validate the list request arguments
+
+        @raises     OAIError: if an argument is missing or invalid
+        """
+        metadata_prefix = self.arguments.get('metadataPrefix')
+        if not metadata_prefix:
+            raise OAIError('badArgument', 'The request is missing the metadataPrefix argument.')
+        if metadata_prefix != 'oai_dc':
+            raise OAIError('cannotDisseminateFormat', 'The metadata format identified by the value given for the '
+                                                      'metadataPrefix argument is not supported by the repository.')
+        if 'from' in self.arguments and 'until' in self.arguments and \
+                parse_datestamp(self.arguments['from']) > parse_datestamp(self.arguments['until']):
+            raise OAIError('badArgument', 'The from argument must be less than or equal to the until argument.')
+
+    def batches(self):
+        """
+        Records of the page in batches, the resumption token of the next page is set when the page is complete
+
+        @rtype: generator
+        @return: Lists of information packages (with prefetched tags)
+        """
+        delivered = 0
+        after = self.after
+        while delivered < self.page_size:
+            packages = self.packages if after is None else self.packages.filter(after_key(*after))
+            limit = min(self.batch_size, self.page_size - delivered)
+            # basic metadata is used if the Dublin Core record of a package is not stored
+            batch = list(packages.only('id', 'identifier', 'version', 'last_change', 'basic_metadata')
+                         .prefetch_related('tags')[:limit])
+            if not batch:
+                return
+            yield batch
+            delivered += len(batch)
+            after = (batch[-1].last_change, batch[-1].pk)
+            if len(batch) < limit:
+                return
+        if self.packages.filter(after_key(*after)).exists():
+            self.next_token = encode_resumption_token(self.session, after[0], after[1], self.cursor + delivered,
+                                                      self.arguments)
+
+
+def header_element(ip):
+    """
+    Record header (identifier, datestamp and set specs) of a package
+
+    @type       ip: InformationPackage
+    @param      ip: Information package
+    @rtype: Element
+    @return: header element
+    """
+    header = ET.Element('header')
+    ET.SubElement(header, 'identifier').text = ip.identifier
+    ET.SubElement(header, 'datestamp').text = date_format(ip.last_change)
+    for tag in ip.tags.all():
+        ET.SubElement(header, 'setSpec').text = tag.slug
+    return header
+
+
+def record_xml(ip, dc_record):
+    """
+    Record of a package
+
+    @type       ip: InformationPackage
+    @param      ip: Information package
+    @type       dc_record: string
+    @param      dc_record: Pre-serialized oai_dc:dc element
+    @rtype: string
+    @return: record element (XML fragment)
+    """
+    return "<record>%s<metadata>%s</metadata></record>" % (ET.tostring(header_element(ip), encoding='unicode'),
+                                                          dc_record)
+
+
+def stream_list(harvest, verb, base_url):
+    """
+    Serialize a list response incrementally
+
+    @type       harvest: HarvestList
+    @param      harvest: Page of the list request
+    @type       verb: string
+    @param      verb: 'ListIdentifiers' or 'ListRecords'
+    @type       base_url: string
+    @param      base_url: Base URL of the OAI-PMH interface
+    @rtype: generator
+    @return: UTF-8 encoded chunks of the XML response (one chunk per batch of records)
+    """
+    request_elem = ET.Element('request', verb=verb)
+    request_elem.text = base_url
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n<OAI-PMH xmlns="%s"><responseDate>%s</responseDate>%s<%s>' % (
+        OAI_NAMESPACE, current_timestamp(fmt=DT_ISO_FORMAT), ET.tostring(request_elem, encoding='unicode'),
+        verb)).encode('utf-8')
+    for batch in harvest.batches():
+        if verb == 'ListRecords':
+            records = dc_records(batch)
+            yield "".join(record_xml(ip, records[ip.pk]) for ip in batch).encode('utf-8')
+        else:
+            yield "".join(ET.tostring(header_element(ip), encoding='unicode') for ip in batch).encode('utf-8')
+    # the resumption token of the last page is empty
+    yield ('<resumptionToken cursor="%d" completeListSize="%d">%s</resumptionToken></%s></OAI-PMH>' % (
+        harvest.cursor, harvest.total_records, escape(harvest.next_token or ''), verb)).encode('utf-8')
+
+
+class TestHarvest(unittest.TestCase):
+
+    def test_parse_datestamp(self):
+        self.assertEqual(datetime(2024, 6, 4, tzinfo=timezone.utc), parse_datestamp("2024-06-04"))
+        self.assertEqual(datetime(2024, 6, 5, tzinfo=timezone.utc), parse_datestamp("2024-06-04", until=True))
+        with self.assertRaises(OAIError):
+            parse_datestamp("2024-06-04T10:00:00Z")
+
+
+if __name__ == '__main__':
+    unittest.main()
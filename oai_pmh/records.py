@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# coding=UTF-8
+"""
+Dublin Core records (oai_dc) of information packages
+
+A package level record is rendered once per package version when the package is indexed (see aip_indexing) and
+stored pre-serialized (DublinCoreRecord, keyed by identifier and version), OAI-PMH list requests only look records
+up. Records of previous versions are removed when the record of a new version is stored. Records are only stored if
+the index metadata of the package could be retrieved. A record which is missing (e.g. packages indexed before
+records were stored) is served from the basic metadata of the package in list requests, without index lookup and
+without being stored; missing records are rendered by the management command render_dc_records.
+"""
+import json
+import logging
+import unittest
+import xml.etree.ElementTree as ET
+
+import requests
+
+from access.search.solrgateway import get_solr_gateway
+from earkweb.models import InformationPackage, DublinCoreRecord
+from eatb.utils.dictutils import dict_keys_camel_to_underscore
+
+logger = logging.getLogger(__name__)
+
+OAI_DC_NAMESPACE = 'http://www.openarchives.org/OAI/2.0/oai_dc/'
+DC_NAMESPACE = 'http://purl.org/dc/elements/1.1/'
+
+ET.register_namespace('oai_dc', OAI_DC_NAMESPACE)
+ET.register_namespace('dc', DC_NAMESPACE)
+
+# Solr fields used if the package has no basic metadata
+METADATA_FIELDS = ('filedescription', 'title', 'publisher', 'archivedate', 'description')
+
+
+def first_value(value):
+    """First value of a multi-valued Solr field"""
+    if isinstance(value, list):
+        return str(value[0]) if value else ''
+    return str(value) if value is not None else ''
+
+
+def basic_metadata(ip):
+    """
+    Basic metadata of a package (submission metadata form)
+
+    @type       ip: InformationPackage
+    @param      ip: Information package
+    @rtype: dict
+    @return: Metadata properties (empty if not available)
+    """
+    if not ip.basic_metadata or ip.basic_metadata == 'null':
+        return {}
+    try:
+        metadata = json.loads(ip.basic_metadata)
+    except ValueError:
+        logger.warning("Invalid basic metadata of package: %s" % ip.identifier)
+        return {}
+    return dict_keys_camel_to_underscore(metadata) if isinstance(metadata, dict) else {}
+
+
+def package_index_summary(identifier):
+    """
+    Metadata of the indexed package: one document and the content types of all documents (one Solr request)
+
+    @type       identifier: string
+    @param      identifier: Package identifier
+    @rtype: tuple
+    @return: Solr document (empty if not indexed) and list of content types
+    @raises     requests.exceptions.RequestException: if the request fails
+    """
+    facet = {'content_types': {'type': 'terms', 'field': 'content_type', 'limit': -1}}
+    result = get_solr_gateway().select({
+        'q': 'package:"%s"' % identifier.replace('"', '\\"'),
+        'fl': ','.join(METADATA_FIELDS),
+        'rows': 1,
+        'json.facet': json.dumps(facet),
+    })
+    docs = result['response']['docs']
+    buckets = result.get('facets', {}).get('content_types', {}).get('buckets', [])
+    content_types = sorted({bucket['val'].split(';')[0].strip() for bucket in buckets if bucket['val']})
+    return (docs[0] if docs else {}), content_types
+
+
+def dc_values(ip, metadata, doc, content_types):
+    """
+    Dublin Core elements of a package: basic metadata of the package, index metadata as fallback
+
+    @type       ip: InformationPackage
+    @param      ip: Information package
+    @type       metadata: dict
+    @param      metadata: Basic metadata
+    @type       doc: dict
+    @param      doc: Solr document of the package
+    @type       content_types: list
+    @param      content_types: Content types of the package files
+    @rtype: list
+    @return: (element, value) pairs in Dublin Core element order
+    """
+    values = [
+        ('title', metadata.get('title') or first_value(doc.get('filedescription', doc.get('title'))) or 'No title'),
+        ('creator', first_value(doc.get('publisher'))),
+    ]
+    values += [('subject', tag.name) for tag in ip.tags.all()]
+    values += [
+        ('description', metadata.get('description') or first_value(doc.get('description'))),
+        ('publisher', metadata.get('publisher') or first_value(doc.get('publisher')) or 'Unknown Publisher'),
+        ('contributor', metadata.get('contact_point', '')),
+        ('date', metadata.get('original_creation_date') or first_value(doc.get('archivedate'))),
+    ]
+    values += [('format', content_type) for content_type in content_types]
+    values += [
+        ('identifier', ip.identifier),
+        ('language', metadata.get('language', '')),
+    ]
+    return [(element, value) for element, value in values if value]
+
+
+def dc_xml(values):
+    """
+    Serialize Dublin Core elements
+
+    @type       values: list
+    @param      values: (element, value) pairs
+    @rtype: string
+    @return: oai_dc:dc element (XML fragment)
+    """
+    oai_dc = ET.Element(ET.QName(OAI_DC_NAMESPACE, 'dc'))
+    for element, value in values:
+        ET.SubElement(oai_dc, ET.QName(DC_NAMESPACE, element)).text = str(value)
+    return ET.tostring(oai_dc, encoding='unicode')
+
+
+def render_dc_record(ip, index=True):
+    """
+    Render the Dublin Core record of a package version
+
+    @type       ip: InformationPackage
+    @param      ip: Information package
+    @type       index: bool
+    @param      index: Use the index metadata of the package (otherwise the record contains the basic metadata only)
+    @rtype: string
+    @return: oai_dc:dc element (XML fragment)
+    @raises     requests.exceptions.RequestException: if the index metadata is not available
+    """
+    doc, content_types = package_index_summary(ip.identifier) if index else ({}, [])
+    return dc_xml(dc_values(ip, basic_metadata(ip), doc, content_types))
+
+
+def save_dc_record(ip):
+    """
+    Render and store the Dublin Core record of a package version, records of previous versions are removed
+
+    @type       ip: InformationPackage
+    @param      ip: Information package
+    @rtype: string
+    @return: oai_dc:dc element (XML fragment)
+    @raises     requests.exceptions.RequestException: if the index metadata is not available (nothing is stored)
+    """
+    xml = render_dc_record(ip)
+    # pylint: disable-next=no-member
+    DublinCoreRecord.objects.update_or_create(identifier=ip.identifier, version=ip.version, defaults={'xml': xml})
+    # pylint: disable-next=no-member
+    DublinCoreRecord.objects.filter(identifier=ip.identifier, version__lt=ip.version).delete()
+    return xml
+
+
+def latest_package(identifier):
+    """
+    Current version of a stored package
+
+    @type       identifier: string
+    @param      identifier: Package identifier
+    @rtype: InformationPackage
+    @return: Information package (None if the package does not exist)
+    """
+    # pylint: disable-next=no-member
+    return InformationPackage.objects.filter(identifier=identifier).exclude(storage_dir='') \
+        .order_by('-version', '-last_change').first()
+
+
+def store_dc_record(identifier):
+    """
+    Render and store the Dublin Core record of the current version of a package (after indexing)
+
+    @type       identifier: string
+    @param      identifier: Package identifier
+    @rtype: bool
+    @return: True if the record was stored, False if the package does not exist
+    @raises     requests.exceptions.RequestException: if the index metadata is not available (nothing is stored)
+    """
+    ip = latest_package(identifier)
+    if ip is None:
+        return False
+    save_dc_record(ip)
+    return True
+
+
+def stored_dc_records(packages):
+    """
+    Stored Dublin Core records of package versions (one lookup for all packages)
+
+    @type       packages: list
+    @param      packages: Information packages (identifier, version)
+    @rtype: dict
+    @return: oai_dc:dc element (XML fragment) per (identifier, version)
+    """
+    # pylint: disable-next=no-member
+    stored = DublinCoreRecord.objects.filter(identifier__in={ip.identifier for ip in packages}) \
+        .values_list('identifier', 'version', 'xml')
+    return {(identifier, version): xml for identifier, version, xml in stored}
+
+
+def dc_records(packages):
+    """
+    Dublin Core records of packages (one lookup for all packages). Missing records are rendered from the basic
+    metadata of the packages, without index lookup and without being stored.
+
+    @type       packages: list
+    @param      packages: Information packages (identifier, version)
+    @rtype: dict
+    @return: oai_dc:dc element (XML fragment) per package (primary key)
+    """
+    records = stored_dc_records(packages)
+    result = {}
+    for ip in packages:
+        xml = records.get((ip.identifier, ip.version))
+        if xml is None:
+            logger.debug("Dublin Core record of package %s (version %s) not stored" % (ip.identifier, ip.version))
+            xml = render_dc_record(ip, index=False)
+        result[ip.pk] = xml
+    return result
+
+
+def dc_record(ip):
+    """
+    Dublin Core record of a single package (GetRecord): a missing record is rendered and stored, if the index is
+    not available, it is rendered from the basic metadata without being stored
+
+    @type       ip: InformationPackage
+    @param      ip: Information package
+    @rtype: string
+    @return: oai_dc:dc element (XML fragment)
+    """
+    xml = stored_dc_records([ip]).get((ip.identifier, ip.version))
+    if xml is not None:
+        return xml
+    try:
+        return save_dc_record(ip)
+    except requests.exceptions.RequestException as e:
+        logger.warning("Index metadata of package %s not available: %s" % (ip.identifier, e))
+        return render_dc_record(ip, index=False)
+
+
+def render_missing_dc_records(packages, rerender=False):
+    """
+    Render and store the Dublin Core records of package versions which have no stored record
+
+    @type       packages: list
+    @param      packages: Information packages
+    @type       rerender: bool
+    @param      rerender: Render and store the records of all packages
+    @rtype: tuple
+    @return: Number of stored records, number of records which could not be rendered (index not available)
+    """
+    records = {} if rerender else stored_dc_records(packages)
+    stored = failed = 0
+    for ip in packages:
+        if (ip.identifier, ip.version) in records:
+            continue
+        try:
+            save_dc_record(ip)
+            stored += 1
+        except requests.exceptions.RequestException as e:
+            logger.warning("Dublin Core record of package %s not stored: %s" % (ip.identifier, e))
+            failed += 1
+    return stored, failed
+
+
+class TestDublinCoreRecords(unittest.TestCase):
+
+    def test_first_value(self):
+        self.assertEqual("a", first_value(["a", "b"]))
+        self.assertEqual("1", first_value(1))
+        self.assertEqual("", first_value([]))
+        self.assertEqual("", first_value(None))
+
+    def test_dc_xml(self):
+        xml = dc_xml([('title', "Report & Notes"), ('format', "application/pdf"), ('format', "text/plain")])
+        self.assertTrue(xml.startswith('<oai_dc:dc '))
+        self.assertIn('<dc:title>Report &amp; Notes</dc:title>', xml)
+        self.assertEqual(2, xml.count('<dc:format>'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# coding=UTF-8
+"""
+OAI-PMH resumption tokens
+
+List requests are paged by key (last_change, id) instead of offset: the token contains the key of the last record of
+the previous page, so that each page is an index range scan starting after this record, independently of the
+position in the list. The token also carries the harvest session (used to cache the total number of records for
+the duration of a harvest) and the cursor (number of records delivered so far).
+"""
+import base64
+import json
+import unittest
+import uuid
+from datetime import datetime, timezone
+
+
+class BadResumptionTokenError(ValueError):
+    """Resumption token is invalid"""
+
+
+def new_harvest_session():
+    """
+    Identifier of a new harvest session
+
+    @rtype: string
+    @return: Session identifier
+    """
+    return uuid.uuid4().hex
+
+
+def encode_resumption_token(session, last_change, pk, cursor, arguments=None):
+    """
+    Create a resumption token
+
+    @type       session: string
+    @param      session: Harvest session identifier
+    @type       last_change: datetime
+    @param      last_change: Last change of the last record of the page
+    @type       pk: int
+    @param      pk: Primary key of the last record of the page
+    @type       cursor: int
+    @param      cursor: Number of records delivered including the page
+    @type       arguments: dict
+    @param      arguments: Arguments of the list request which apply to the following pages (e.g. from, until)
+    @rtype: string
+    @return: Resumption token (URL safe)
+    """
+    token = {'s': session, 't': last_change.isoformat(), 'i': pk, 'c': cursor}
+    if arguments:
+        token['a'] = arguments
+    return base64.urlsafe_b64encode(json.dumps(token, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode_resumption_token(token):
+    """
+    Decode a resumption token
+
+    @type       token: string
+    @param      token: Resumption token
+    @rtype: dict
+    @return: Token values: session, last_change (datetime), pk, cursor, arguments
+    @raises     BadResumptionTokenError: if the token is invalid
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+        last_change = datetime.fromisoformat(values['t'])
+        if last_change.tzinfo is None:
+            last_change = last_change.replace(tzinfo=timezone.utc)
+        return {'session': str(values['s']), 'last_change': last_change, 'pk': int(values['i']),
+                'cursor': int(values['c']), 'arguments': dict(values.get('a', {}))}
+    except (ValueError, KeyError, TypeError, AttributeError, UnicodeError) as e:
+        raise BadResumptionTokenError("Invalid resumption token: %s" % token) from e
+
+
+class TestResumptionToken(unittest.TestCase):
+
+    def test_round_trip(self):
+        last_change = datetime(2024, 6, 4, 11, 40, 41, 123456, tzinfo=timezone.utc)
+        token = encode_resumption_token("abc", last_change, 42, 20, {'from': '2024-01-01'})
+        self.assertEqual({'session': "abc", 'last_change': last_change, 'pk': 42, 'cursor': 20,
+                          'arguments': {'from': '2024-01-01'}}, decode_resumption_token(token))
+
+    def test_bad_token(self):
+        for token in ["", "xyz", "eyJzIjoiYWJjIn0=", "ä"]:
+            with self.assertRaises(BadResumptionTokenError):
+                decode_resumption_token(token)
+
+
+if __name__ == '__main__':
+    unittest.main()
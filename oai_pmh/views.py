@@ -2,23 +2,20 @@
 # coding=UTF-8
 """OAI-PMH module"""
 from venv import logger
-from django.http import HttpResponse, HttpResponseNotFound, JsonResponse
+from django.http import HttpResponse, HttpResponseNotFound, JsonResponse, StreamingHttpResponse
 from earkweb.models import InformationPackage
 from config.configuration import django_service_url
-from config.configuration import solr_core_url
+from oai_pmh.harvest import HarvestList, OAIError, OAI_NAMESPACE, stream_list, record_xml
+from oai_pmh.records import latest_package, dc_record
 from eatb.utils.datetime import date_format, current_timestamp
 import xml.etree.ElementTree as ET
 
 from eatb.utils.datetime import DT_ISO_FORMAT, current_timestamp
 
-import pysolr
 from django.utils.safestring import mark_safe
 import xml.etree.ElementTree as ET
 import logging
 
-# Initialisiere das pysolr-Objekt (passe die Solr-URL an)
-solr = pysolr.Solr(solr_core_url, always_commit=True)
-
 logger = logging.getLogger(__name__)
 
 ET.register_namespace('oai_dc', 'http://www.openarchives.org/OAI/2.0/oai_dc/')
@@ -42,6 +39,10 @@ def oai_pmh(request):
         return list_metadata_formats(request)
     elif verb == 'ListIdentifiers':
         return list_identifiers(request)
+    elif verb == 'ListRecords':
+        return list_records(request)
+    elif verb == 'ListSets':
+        return list_sets()
     elif verb == 'GetRecord':
         return get_record(request)
     else:
@@ -113,47 +114,71 @@ def list_identifiers(request):
     Returns:
     HttpResponse: The ListIdentifiers response containing headers for records with a resumption token for pagination.
     """
-    root = ET.Element('OAI-PMH', xmlns='http://www.openarchives.org/OAI/2.0/')
-    response_date = ET.SubElement(root, 'responseDate')
-    response_date.text = current_timestamp(fmt=DT_ISO_FORMAT)
+    return list_response(request, 'ListIdentifiers')
+
 
-    list_identifiers = ET.SubElement(root, 'ListIdentifiers')
+def list_records(request):
+    """
+    Handle the OAI-PMH ListRecords request (selective harvesting with from, until and set arguments, pagination
+    using resumption tokens).
 
-    # Retrieve the resumption token from the request, if present
-    resumption_token = request.GET.get('resumptionToken')
-    page_size = 10  # Define how many records to return per page
-    start_index = int(resumption_token) if resumption_token else 0
+    Parameters:
+    request (HttpRequest): The incoming HTTP request.
+
+    Returns:
+    HttpResponse: The ListRecords response (streamed) containing the records with a resumption token for pagination.
+    """
+    return list_response(request, 'ListRecords')
+
+
+def list_response(request, verb):
+    """
+    Streamed response of a list request.
+
+    Parameters:
+    request (HttpRequest): The incoming HTTP request.
+    verb (str): 'ListIdentifiers' or 'ListRecords'
+
+    Returns:
+    HttpResponse: The streamed list response or the error response if the request is invalid.
+    """
+    try:
+        harvest = HarvestList(request)
+    except OAIError as e:
+        return error_response(e.code, e.message, verb)
+    return StreamingHttpResponse(stream_list(harvest, verb, request.build_absolute_uri(request.path)),
+                                 content_type='text/xml')
 
-    # Query InformationPackage objects for identifiers
+
+def list_sets():
+    """
+    Handle the OAI-PMH ListSets request. Sets are the tags of the information packages.
+
+    Returns:
+    HttpResponse: The ListSets response.
+    """
     # pylint: disable-next=no-member
-    packages = InformationPackage.objects.exclude(identifier='').exclude(storage_dir='')[start_index:start_index + page_size]
-
-    for ip in packages:
-        header = ET.SubElement(list_identifiers, 'header')
-        identifier = ET.SubElement(header, 'identifier')
-        identifier.text = ip.identifier
-        datestamp = ET.SubElement(header, 'datestamp')
-        datestamp.text = date_format(ip.last_change)
-
-    # If there are more records to fetch, create a resumption token
-    next_index = start_index + page_size
-    total_records = InformationPackage.objects.exclude(identifier='').exclude(storage_dir='').count()
-    if next_index < total_records:
-        resumption_token_elem = ET.SubElement(list_identifiers, 'resumptionToken')
-        resumption_token_elem.text = str(next_index)
-        resumption_token_elem.set('cursor', str(start_index))
-        resumption_token_elem.set('completeListSize', str(total_records))
-    else:
-        # If there are no more records, resumptionToken should be empty
-        resumption_token_elem = ET.SubElement(list_identifiers, 'resumptionToken')
-        resumption_token_elem.text = ''
+    tags = InformationPackage.tags.order_by('slug')
+    if not tags:
+        return error_response('noSetHierarchy', 'The repository does not support sets.', 'ListSets')
+
+    root = ET.Element('OAI-PMH', xmlns='http://www.openarchives.org/OAI/2.0/')
+    response_date = ET.SubElement(root, 'responseDate')
+    response_date.text = current_timestamp(fmt=DT_ISO_FORMAT)
+
+    list_sets_elem = ET.SubElement(root, 'ListSets')
+    for tag in tags:
+        set_elem = ET.SubElement(list_sets_elem, 'set')
+        ET.SubElement(set_elem, 'setSpec').text = tag.slug
+        ET.SubElement(set_elem, 'setName').text = tag.name
 
     return xml_response(root)
 
 
 def get_record(request):
     """
-    Handle the OAI-PMH GetRecord request using Solr.
+    Handle the OAI-PMH GetRecord request (lookup of the pre-serialized Dublin Core record of the current package
+    version).
 
     Parameters:
     request (HttpRequest): The incoming HTTP request.
@@ -170,83 +195,21 @@ def get_record(request):
     if metadata_prefix != 'oai_dc':
         return error_response('cannotDisseminateFormat', 'The metadata format identified by the value given for the metadataPrefix argument is not supported by the item or by the repository.')
 
-    # Solr query to find the document based on identifier
-    solr_query = f'package:"{identifier}"'
-    results = solr.search(solr_query)
-
-    # Check if any documents were found
-    if not results.docs:
+    ip = latest_package(identifier)
+    if ip is None:
         return error_response('idDoesNotExist', 'The value of the identifier argument is unknown or illegal in this repository.')
 
-    # Use the first document as the main record
-    doc = results.docs[0]
-
-    # Registriere die benötigten Namespaces
-    ET.register_namespace('oai_dc', 'http://www.openarchives.org/OAI/2.0/oai_dc/')
-    ET.register_namespace('dc', 'http://purl.org/dc/elements/1.1/')
-
-    # OAI-PMH XML-Struktur
-    root = ET.Element('OAI-PMH', xmlns='http://www.openarchives.org/OAI/2.0/')
-    response_date = ET.SubElement(root, 'responseDate')
-    response_date.text = current_timestamp(fmt=DT_ISO_FORMAT)
-
-    # Request-Element hinzufügen
-    request_elem = ET.SubElement(root, 'request', verb='GetRecord', identifier=identifier, metadataPrefix=metadata_prefix)
-    request_elem.text = request.build_absolute_uri()
-
-    get_record = ET.SubElement(root, 'GetRecord')
-    record_elem = ET.SubElement(get_record, 'record')
-    header = ET.SubElement(record_elem, 'header')
-    identifier_elem = ET.SubElement(header, 'identifier')
-    identifier_elem.text = str(doc.get('id', 'Unknown ID'))
-    datestamp = ET.SubElement(header, 'datestamp')
-    datestamp.text = str(doc.get('indexdate', 'Unknown Date'))
-
-    # Metadata-Sektion
-    metadata = ET.SubElement(record_elem, 'metadata')
-    # Verwende ET.QName für korrektes Namespacing
-    oai_dc = ET.SubElement(metadata, ET.QName('http://www.openarchives.org/OAI/2.0/oai_dc/', 'dc'))
-
-    dc_namespace = "http://purl.org/dc/elements/1.1/"
-
-    # Titel oder Dateibeschreibung (je nach Verfügbarkeit)
-    title_field = doc.get('filedescription', doc.get('title', ['No title']))
-    title_text = title_field[0] if isinstance(title_field, list) else str(title_field)
-    title = ET.SubElement(oai_dc, ET.QName(dc_namespace, 'title'))
-    title.text = title_text
-
-    # Weitere Dublin Core Felder
-    fields = {
-        'creator': 'publisher',
-        'date': 'archivedate',
-        'identifier': 'uid',
-        'format': 'content_type',
-        'description': 'description',
-    }
-
-    for dc_field, solr_field in fields.items():
-        value = doc.get(solr_field, [''])
-        value = value[0] if isinstance(value, list) else str(value)
-        if value:
-            elem = ET.SubElement(oai_dc, ET.QName(dc_namespace, dc_field))
-            elem.text = value
-
-    # Optionales zusätzliches Feld
-    publisher_field = doc.get('publisher', ['Unknown Publisher'])
-    publisher_text = publisher_field[0] if isinstance(publisher_field, list) else str(publisher_field)
-    publisher = ET.SubElement(oai_dc, ET.QName(dc_namespace, 'publisher'))
-    publisher.text = publisher_text
-
-    # XML-Daten serialisieren
-    try:
-        xml_data = ET.tostring(root, encoding='utf-8', xml_declaration=True)
-    except Exception as e:
-        return error_response('internalError', f'An error occurred while generating XML: {str(e)}')
+    request_elem = ET.Element('request', verb='GetRecord', identifier=identifier, metadataPrefix=metadata_prefix)
+    request_elem.text = request.build_absolute_uri(request.path)
 
-    return HttpResponse(xml_data, content_type='text/xml')
+    xml_data = '<?xml version="1.0" encoding="UTF-8"?>\n<OAI-PMH xmlns="%s"><responseDate>%s</responseDate>%s' \
+               '<GetRecord>%s</GetRecord></OAI-PMH>' % (OAI_NAMESPACE, current_timestamp(fmt=DT_ISO_FORMAT),
+                                                        ET.tostring(request_elem, encoding='unicode'),
+                                                        record_xml(ip, dc_record(ip)))
+    return HttpResponse(xml_data.encode('utf-8'), content_type='text/xml')
 
 
-def error_response(code, message):
+def error_response(code, message, verb='GetRecord'):
     """
     Erzeugt eine OAI-PMH Fehlerantwort.
     """
@@ -254,7 +217,7 @@ def error_response(code, message):
     response_date = ET.SubElement(root, 'responseDate')
     response_date.text = current_timestamp(fmt=DT_ISO_FORMAT)
     
-    request_elem = ET.SubElement(root, 'request', verb='GetRecord')
+    request_elem = ET.SubElement(root, 'request', verb=verb)
     request_elem.text = 'http://example.com/oai'  # Ersetze dies durch die tatsächliche URL
     
     error = ET.SubElement(root, 'error', code=code)
@@ -86,9 +86,85 @@ function customMenu(node) {
 var loadThis = $.parseJSON(dirasjson);
 
 /**
- * Populate tree using json representation of the directory hierarchy
- * (variable 'dirasjson' is provided as global variable)
+ * Icon of a file node
  */
+function fileIcon(text) {
+    if(text.endsWith("json"))
+        return "fas fa-file-code";
+    else if(text.endsWith("doc") || text.endsWith("docx"))
+        return "fas fa-file-word";
+    else if(text.endsWith("pdf"))
+        return "fas fa-file-pdf";
+    else if(text.endsWith("csv"))
+        return "fas fa-file-csv";
+    else if(text.endsWith("log"))
+        return "fas fa-file-alt";
+    else if(text.endsWith("xml") || text.endsWith("xsd"))
+        return "fas fa-file-code";
+    else if(text.endsWith("tar") || text.endsWith("tar.gz") || text.endsWith("zip"))
+        return "fas fa-file-archive";
+    return "fas fa-file";
+}
+
+/**
+ * Prepare a page of child nodes for the tree: set icons and append a node to load the next page
+ * (directory listings are delivered one level at a time and in pages)
+ */
+function treeNodes(page) {
+    var nodes = page.children.map(function(node) {
+        node.icon = node.children ? "fas fa-folder" : fileIcon(node.text);
+        return node;
+    });
+    if(page.next_offset !== null && page.next_offset !== undefined) {
+        nodes.push({
+            text: "... (" + (page.total - page.next_offset) + " more)",
+            icon: "fas fa-ellipsis-h",
+            data: {more: true, node: page.node, offset: page.next_offset}
+        });
+    }
+    return nodes;
+}
+
+/**
+ * Load child nodes of a directory node (on demand, using the directory listing API)
+ */
+function loadTreeNodes(node, callback) {
+    if(node.id === '#') {
+        if(loadThis.children === undefined) {
+            // error message
+            callback([{text: loadThis.message ? loadThis.message : "Directory not available", icon: "fas fa-exclamation"}]);
+            return;
+        }
+        callback([{
+            text: loadThis.text,
+            icon: "fas fa-folder-open",
+            state: {opened: true},
+            data: {path: loadThis.path, node: ""},
+            children: treeNodes(loadThis)
+        }]);
+        return;
+    }
+    $.getJSON(dir_json_url, {node: node.data.node, offset: 0}, function(page) {
+        callback(treeNodes(page));
+    }).fail(function() {
+        callback([]);
+    });
+}
+
+/**
+ * Replace the 'more' node by the next page of entries
+ */
+function loadMoreNodes(node) {
+    var tree = $('#directorytree').jstree(true);
+    $.getJSON(dir_json_url, {node: node.data.node, offset: node.data.offset}, function(page) {
+        var parent = node.parent;
+        tree.delete_node(node);
+        treeNodes(page).forEach(function(child) {
+            tree.create_node(parent, child, "last");
+        });
+    });
+}
+
 (function(){
     $('#directorytree')
         .on('open_node.jstree', function (e, data) {
@@ -103,17 +179,22 @@ var loadThis = $.parseJSON(dirasjson);
             target_path = $('#directorytree').jstree().get_node(data.parent).data.path;
             // console.log("Original path: "+origin_path);
             // console.log("Target path: "+target_path);
+         }).on('select_node.jstree', function (e, data) {
+            if(data.node.data && data.node.data.more) {
+                loadMoreNodes(data.node);
+            }
          }).on('dblclick.jstree', function (e) {
             var node = $('#directorytree').jstree(true).get_node(e.target);
+            if(node.data && node.data.more) {
+                return;
+            }
             // preview/download enabled for all types
             if(true || previewSupported(node.data.path)) {
                 previewfile(node);
             } else {
                 alert("View/download of this file type is not allowed!");
             }
-         }).on('loaded.jstree', function() {
-            $('#directorytree').jstree('open_all');
-         }).jstree({ 'core' : loadThis, "plugins" : [
+         }).jstree({ 'core' : {'data': loadTreeNodes, 'check_callback': true}, "plugins" : [
             //"checkbox",
             "contextmenu",
             "dnd",
@@ -126,32 +207,7 @@ var loadThis = $.parseJSON(dirasjson);
             //"wholerow",
             "changed",
             //"conditionalselect"
-        ], contextmenu: {items: customMenu} }).bind('loaded.jstree',function(e,data){
-            $('.jstree-leaf').each(function(){
-                var id   = ($(this).attr('id').split("_"))[0];
-                var text = $(this).children('a').text();
-                // console.log("id + text: "+ id + " - " + text + "\n");
-                var icon = "fas fa-file";
-                if(text.endsWith("json"))
-                    icon = "fas fa-file-code"
-                else if(text.endsWith("doc") || text.endsWith("docx"))
-                    icon = "fas fa-file-word";
-                else if(text.endsWith("pdf"))
-                    icon = "fas fa-file-pdf";
-                else if(text.endsWith("csv"))
-                    icon = "fas fa-file-csv";
-                else if(text.endsWith("log"))
-                    icon = "fas fa-file-alt";
-                else if(text.endsWith("xml") || text.endsWith("xsd"))
-                    icon = "fas fa-file-code";
-                else if(text.endsWith("tar") || text.endsWith("tar.gz") || text.endsWith("zip"))
-                    icon = "fas fa-file-archive";
-                else
-                    icon = "fas fa-file";
-
-                $('#directorytree').jstree(true).set_icon($(this).attr('id'), icon);
-            });
-        });
+        ], contextmenu: {items: customMenu} });
         $(document).on('dnd_start.vakata', function (e, data) {
             // console.log("data: "+data);
         });
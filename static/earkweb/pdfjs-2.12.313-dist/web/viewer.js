@@ -1033,7 +1033,11 @@ const PDFViewerApplication = {
       }
     }
 
-    parameters['data'] = window.pdfData
+    if (window.pdfData) {
+      parameters['data'] = window.pdfData;
+    } else if (window.pdfUrl) {
+      parameters['url'] = window.pdfUrl;
+    }
     const loadingTask = (0, _pdfjsLib.getDocument)(parameters);
     this.pdfLoadingTask = loadingTask;
 
@@ -20,6 +20,8 @@ from celery.result import AsyncResult
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Cast, Concat
 from django.template import loader
 from django.http import HttpResponse
 from django.http import HttpResponseRedirect, HttpResponseNotFound, HttpResponseForbidden
@@ -53,7 +55,7 @@ from config.configuration import identifier_pattern
 from earkweb.models import InformationPackage
 from earkweb.models import Representation, InternalIdentifier, Vocabulary
 from earkweb.utils.representation_utils import register_representations_from_data_package
-from util.djangoutils import get_unused_identifier, get_user_api_token
+from util.djangoutils import get_unused_identifier, get_user_api_token, filter_information_packages
 from taskbackend.taskexecution import execute_task
 from taskbackend.taskutils import extract_and_remove_package, \
     get_celery_worker_status, flower_is_running, get_task_info_from_child_tasks
@@ -1044,26 +1046,23 @@ class InformationPackageTable(tables.Table):
 @csrf_exempt
 def informationpackages_overview(request):
     area = "submission"
-    areacode = "1"
     filterword = request.POST['filterword'] if 'filterword' in request.POST.keys() else ""
-    sql_query = """
-    select ip.id as id, ip.work_dir as path, ip.uid as uid, ip.package_name as package_name, 
-    ip.identifier as identifier,
-    CONCAT('<a href="/earkweb/submission/upload_step1/',ip.id,'/" data-toggle="tooltip" title="Change">
-    <i class="fas fa-edit editcol"></i></a>') as edit,
-    CONCAT('<a href="/earkweb/submission/ips/',ip.id,'/startingest" data-toggle="tooltip" title="Ingest">
-    <i class="fas fa-box editcol"></i></a>') as ingest,
-    CONCAT('<a href="/earkweb/submission/delete/',ip.id,'/" data-toggle="tooltip" title="Delete">
-    <i class="fas fa-trash editcol"></i></a>') as delcol 
-    from informationpackage as ip
-    where storage_dir='' and 
-    (ip.uid like '%%{0}%%' or ip.package_name like '%%{0}%%' or ip.identifier like '%%{0}%%')
-    and deleted != 1
-    order by ip.last_change desc;
-    """.format(filterword, areacode)
-    # user_id={0} and, request.user.pk
+    pk = Cast('id', output_field=CharField())
     # pylint: disable-next=no-member
-    queryset = InformationPackage.objects.raw(sql_query)
+    queryset = filter_information_packages(InformationPackage.objects.filter(storage_dir='', deleted=False),
+                                           filterword).annotate(
+        path=F('work_dir'),
+        edit=Concat(Value('<a href="/earkweb/submission/upload_step1/'), pk,
+                    Value('/" data-toggle="tooltip" title="Change"><i class="fas fa-edit editcol"></i></a>'),
+                    output_field=CharField()),
+        ingest=Concat(Value('<a href="/earkweb/submission/ips/'), pk,
+                      Value('/startingest" data-toggle="tooltip" title="Ingest">'
+                            '<i class="fas fa-box editcol"></i></a>'),
+                      output_field=CharField()),
+        delcol=Concat(Value('<a href="/earkweb/submission/delete/'), pk,
+                      Value('/" data-toggle="tooltip" title="Delete"><i class="fas fa-trash editcol"></i></a>'),
+                      output_field=CharField()),
+    ).order_by('-last_change')
     table = InformationPackageTable(queryset)
     RequestConfig(request, paginate={'per_page': 8}).configure(table)
     context = {
@@ -1457,6 +1456,10 @@ def poll_state(request):
                     progress = task.result['process_percent'] if task.result and 'process_percent' in task.result else 0
                     data = {"success": True, "result": task.state, "state": task.state, "progress": progress,
                             "task_list": get_task_list(task_id, ['file_migration'])}
+                    if isinstance(task.result, dict):
+                        for key in ('bytes_per_second', 'files_per_second', 'eta'):
+                            if key in task.result:
+                                data[key] = task.result[key]
             else:
                 data = {"success": False, "errmsg": "No task_id in the request"}
         else:
@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+# coding=UTF-8
+"""
+File format migration engine.
+
+Converter versions are determined once per worker process, files are migrated in batches (one converter
+invocation for many files where the tool supports it, e.g. ImageMagick's mogrify) and the number of
+concurrent converter processes (per worker process) as well as their memory usage is limited per tool.
+Migration results are cached by source digest, policy and converter version.
+"""
+import errno
+import fcntl
+import functools
+import hashlib
+import logging
+import os
+import stat
+import shutil
+import string
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from eatb.cli import CliCommand
+
+from config.configuration import commands, migration_tool_limits, migration_cache_enabled, \
+    migration_cache_max_mb, config_path_migration_cache
+from taskbackend.taskutils import compute_sha512
+
+logger = logging.getLogger(__name__)
+
+# commands used to determine the converter version (agent information in PREMIS)
+tool_version_commands = {
+    'pdftopdfa': ['gs', '--version'],
+    'totiff': ['convert', '-version'],
+}
+
+# tools which accept multiple input files per invocation (command used for batch processing)
+batch_commands = {
+    'totiff': 'totiff_batch',
+}
+
+# ioctl request to clone a file (reflink) on file systems supporting it (Linux: btrfs, XFS)
+FICLONE = 0x40049409
+
+
+@functools.lru_cache(maxsize=None)
+def tool_version(tool):
+    """
+    Get version of the converter used by a migration tool (cached per worker process)
+    @type       tool: string
+    @param      tool: Migration tool (key of the commands dictionary, e.g. 'pdftopdfa')
+    @rtype:     string
+    @return:    Version string (first line of the version output)
+    """
+    args = tool_version_commands.get(tool)
+    if not args:
+        return tool
+    try:
+        proc = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=30, check=False)
+        output = proc.stdout.decode('utf-8', errors='replace').strip()
+        version = output.splitlines()[0] if output else args[0]
+        return "%s %s" % (args[0], version) if version[:1].isdigit() else version
+    except (OSError, subprocess.TimeoutExpired) as err:
+        logger.warning("Unable to determine version of '%s': %s" % (args[0], err))
+        return args[0]
+
+
+def policy_id(tool):
+    """
+    Identifier of a migration policy (command line templates of the tool, including the batch command if the tool
+    is used for batch processing, since results can be produced by either command)
+    @type       tool: string
+    @param      tool: Migration tool
+    @rtype:     string
+    @return:    Policy identifier
+    """
+    tool_commands = [tool] + ([batch_commands[tool]] if tool in batch_commands else [])
+    template = "\n".join(" ".join(part.template if isinstance(part, string.Template) else str(part)
+                                  for part in commands[command]) for command in tool_commands)
+    return "%s-%s" % (tool, hashlib.sha256(template.encode('utf-8')).hexdigest()[:16])
+
+
+def copy_file(source, target):
+    """
+    Copy file to target path, as reflink (copy-on-write clone) if the file system supports it. The target is an
+    independent file, changing it does not affect the source.
+    @type       source: string
+    @param      source: Source file path
+    @type       target: string
+    @param      target: Target file path
+    """
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.exists(target):
+        os.remove(target)
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return
+        except OSError as err:
+            if err.errno not in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS):
+                raise
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+
+class MigrationCache(object):
+    """
+    Cache of migration results keyed by source file digest, migration policy and converter version. Outputs are
+    copied into a shared directory (read-only files) and copied (or reflinked) into target representations, so
+    that cached results and package files never share data which could be modified. The cache size is bounded,
+    least recently used results are evicted.
+    """
+
+    def __init__(self, cache_dir=config_path_migration_cache, max_mb=migration_cache_max_mb, custom_logger=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        self.log = custom_logger if custom_logger else logger
+
+    def key(self, source_digest, tool):
+        material = "%s:%s:%s" % (source_digest, policy_id(tool), tool_version(tool))
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def path(self, key, output_file):
+        extension = os.path.splitext(output_file)[1]
+        return os.path.join(self.cache_dir, key[:2], "%s%s" % (key, extension))
+
+    def get(self, key, output_file):
+        """
+        Place cached output at output_file
+        @rtype:     bool
+        @return:    True if the migration result was found in the cache
+        """
+        cached_file = self.path(key, output_file)
+        if not os.path.isfile(cached_file):
+            return False
+        try:
+            copy_file(cached_file, output_file)
+        except OSError as err:
+            self.log.warning("Unable to use cached migration result '%s': %s" % (cached_file, err))
+            return False
+        try:
+            # last use (eviction order), access times are not reliable (noatime mounts)
+            os.utime(cached_file)
+        except OSError:
+            pass
+        return True
+
+    def put(self, key, output_file):
+        """
+        Store migration output in the cache (atomically, concurrent writers of the same key are harmless)
+        """
+        cached_file = self.path(key, output_file)
+        if os.path.isfile(cached_file):
+            return
+        try:
+            os.makedirs(os.path.dirname(cached_file), exist_ok=True)
+            fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(cached_file), prefix='.tmp-')
+            os.close(fd)
+            copy_file(output_file, tmp_file)
+            os.chmod(tmp_file, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(tmp_file, cached_file)
+        except OSError as err:
+            self.log.warning("Unable to store migration result '%s' in cache: %s" % (output_file, err))
+
+    def evict(self):
+        """
+        Remove least recently used results until the cache size is within the size bound
+        @rtype:     int
+        @return:    Number of removed results
+        """
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for file in files:
+                if file.startswith('.tmp-'):
+                    continue
+                path = os.path.join(root, file)
+                try:
+                    file_stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((file_stat.st_mtime, file_stat.st_size, path))
+                total += file_stat.st_size
+        removed = 0
+        if total <= self.max_bytes:
+            return removed
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            if total <= self.max_bytes:
+                break
+        self.log.info("Evicted %d results from migration cache" % removed)
+        return removed
+
+
+def memory_limited_command(args, memory_mb):
+    """
+    Wrap a command so that the address space of the converter process is limited (prlimit if available,
+    otherwise the shell's ulimit). Limits are set by the wrapper and not in the forked child of this (threaded)
+    process.
+    @type       args: list
+    @param      args: Command line arguments
+    @type       memory_mb: int
+    @param      memory_mb: Memory limit in megabytes (no limit if 0)
+    @rtype:     list
+    @return:    Command line arguments
+    """
+    if not memory_mb or memory_mb <= 0:
+        return args
+    if shutil.which('prlimit'):
+        return ['prlimit', '--as=%d' % (memory_mb * 1024 * 1024), '--'] + args
+    return ['sh', '-c', 'ulimit -v %d && exec "$@"' % (memory_mb * 1024), 'sh'] + args
+
+
+class MigrationEngine(object):
+    """
+    Executes file format migrations with per tool concurrency and memory limits.
+    """
+
+    _semaphores = {}
+    _semaphores_lock = threading.Lock()
+
+    def __init__(self, tool_limits=None, cache=None, custom_logger=None):
+        """
+        Constructor used to initialise the migration engine
+        @type       tool_limits: dict
+        @param      tool_limits: Concurrency and memory limits per tool ({'tool': {'concurrency': n,
+                                 'memory_mb': m}}), default: migration limits from the configuration
+        @type       cache: MigrationCache
+        @param      cache: Migration result cache, default: shared cache if enabled in the configuration
+        """
+        self.tool_limits = tool_limits if tool_limits else migration_tool_limits
+        self.log = custom_logger if custom_logger else logger
+        if cache is None and migration_cache_enabled:
+            cache = MigrationCache(custom_logger=self.log)
+        self.cache = cache
+
+    def limits(self, tool):
+        limits = self.tool_limits.get(tool, {})
+        return max(1, limits.get('concurrency', 1)), limits.get('memory_mb', 0)
+
+    def semaphore(self, tool):
+        """
+        Semaphore limiting the number of concurrent converter processes of a tool in this worker process (threads of
+        a batch); with several worker processes, the maximum number of converter processes is the concurrency
+        multiplied by the number of worker processes.
+        """
+        with MigrationEngine._semaphores_lock:
+            if tool not in MigrationEngine._semaphores:
+                concurrency, _ = self.limits(tool)
+                MigrationEngine._semaphores[tool] = threading.BoundedSemaphore(concurrency)
+            return MigrationEngine._semaphores[tool]
+
+    def execute(self, tool, args):
+        """
+        Execute converter command respecting the tool's concurrency and memory limits
+        @type       tool: string
+        @param      tool: Migration tool
+        @type       args: list
+        @param      args: Command line arguments
+        @rtype:     tuple
+        @return:    Return code, error output
+        """
+        _, memory_mb = self.limits(tool)
+        with self.semaphore(tool):
+            args = memory_limited_command(args, memory_mb)
+            self.log.debug("Executing: %s" % " ".join(args))
+            try:
+                proc = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+            except OSError as err:
+                return 1, str(err)
+        return proc.returncode, proc.stderr.decode('utf-8', errors='replace')
+
+    def single_command(self, tool, job):
+        if tool == 'pdftopdfa':
+            params = {'output_file': '-sOutputFile=%s' % job['output_file'], 'input_file': job['input_file']}
+        else:
+            params = {'input_file': job['input_file'], 'output_file': job['output_file']}
+        return CliCommand(tool, commands[tool]).get_command(params)
+
+    def migrate_file(self, tool, job):
+        """
+        Migrate a single file
+        @type       tool: string
+        @param      tool: Migration tool
+        @type       job: dict
+        @param      job: Migration job ({'input_file': ..., 'output_file': ...})
+        @rtype:     dict
+        @return:    Migration job with status ('success' or 'failure') and message
+        """
+        returncode, stderr = self.execute(tool, self.single_command(tool, job))
+        success = returncode == 0 and os.path.exists(job['output_file'])
+        if not success:
+            self.log.error("Migration of file '%s' failed: %s" % (job['input_file'], stderr.strip()))
+            if os.path.exists(job['output_file']):
+                # incomplete output
+                os.remove(job['output_file'])
+        return dict(job, status='success' if success else 'failure', message=stderr.strip())
+
+    def migrate_batch(self, tool, jobs):
+        """
+        Migrate files using one converter invocation for all files of the same target directory. The converter
+        writes to a temporary directory, outputs are moved to the target directory only if the invocation
+        succeeded. If it failed, possibly incomplete outputs are discarded and all files of the batch are migrated
+        individually.
+        """
+        _, memory_mb = self.limits(tool)
+        by_output_dir = {}
+        for job in jobs:
+            by_output_dir.setdefault(os.path.dirname(job['output_file']), []).append(job)
+        results = []
+        for output_dir, dir_jobs in by_output_dir.items():
+            tmp_dir = tempfile.mkdtemp(dir=output_dir, prefix='.batch-')
+            try:
+                params = {'output_dir': tmp_dir, 'memory_limit': '%dMiB' % memory_mb if memory_mb else '256MiB'}
+                args = CliCommand(batch_commands[tool], commands[batch_commands[tool]]).get_command(params)
+                args += [job['input_file'] for job in dir_jobs]
+                returncode, stderr = self.execute(tool, args)
+                if returncode != 0:
+                    self.log.warning("Batch migration with '%s' returned %d, migrating files individually: %s" %
+                                     (args[0], returncode, stderr.strip()))
+                for job in dir_jobs:
+                    tmp_output = os.path.join(tmp_dir, os.path.basename(job['output_file']))
+                    if returncode == 0 and os.path.exists(tmp_output):
+                        os.replace(tmp_output, job['output_file'])
+                        results.append(dict(job, status='success', message=''))
+                    else:
+                        results.append(self.migrate_file(tool, job))
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        return results
+
+    def migrate(self, tool, jobs):
+        """
+        Migrate files using the given tool
+        @type       tool: string
+        @param      tool: Migration tool (key of the commands dictionary, e.g. 'pdftopdfa' or 'totiff')
+        @type       jobs: list
+        @param      jobs: Migration jobs ({'input_file': ..., 'output_file': ...})
+        @rtype:     list
+        @return:    Migration jobs with status and message
+        """
+        for job in jobs:
+            os.makedirs(os.path.dirname(job['output_file']), exist_ok=True)
+        cached_results = []
+        cache_keys = {}
+        if self.cache is not None:
+            pending = []
+            for job in jobs:
+                key = self.cache.key(compute_sha512(job['input_file']), tool)
+                if self.cache.get(key, job['output_file']):
+                    self.log.info("Migration result of '%s' taken from cache" % job['input_file'])
+                    cached_results.append(dict(job, status='success', message='cached'))
+                else:
+                    cache_keys[job['output_file']] = key
+                    pending.append(job)
+            jobs = pending
+        results = self.run(tool, jobs) if jobs else []
+        if self.cache is not None and results:
+            for result in results:
+                if result['status'] == 'success':
+                    self.cache.put(cache_keys[result['output_file']], result['output_file'])
+            self.cache.evict()
+        return cached_results + results
+
+    def run(self, tool, jobs):
+        """Run converter for the given jobs"""
+        if tool in batch_commands and len(jobs) > 1:
+            return self.migrate_batch(tool, jobs)
+        concurrency, _ = self.limits(tool)
+        if concurrency == 1 or len(jobs) == 1:
+            return [self.migrate_file(tool, job) for job in jobs]
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(jobs))) as executor:
+            return list(executor.map(lambda job: self.migrate_file(tool, job), jobs))
+
+
+def batches(items, batch_size):
+    """
+    Split list into batches
+    @type       items: list
+    @param      items: List of items
+    @type       batch_size: int
+    @param      batch_size: Maximum number of items per batch
+    @rtype:     generator
+    @return:    Batches (lists) of items
+    """
+    batch_size = max(1, batch_size)
+    for i in range(0, len(items), batch_size):
+        yield items[i:i + batch_size]
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# coding=UTF-8
+"""
+Task progress reporting by files and bytes with throttled updates of the task state in the result backend.
+"""
+import logging
+import os
+import time
+
+from config.configuration import progress_update_interval
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressReporter(object):
+    """
+    Progress reporter which tracks the number of processed files and bytes of a task. The task state
+    ('PROGRESS') is written to the result backend at most once per update interval, the meta data
+    contains the percentage, throughput and estimated remaining time (ETA) for the UI polling views.
+    If no task is given, progress is only logged.
+    """
+
+    def __init__(self, task=None, total_files=0, total_bytes=0, interval=progress_update_interval,
+                 custom_logger=None):
+        """
+        Constructor used to initialise the progress reporter
+        @type       task: celery.Task
+        @param      task: Bound task used to update the task state (optional)
+        @type       total_files: int
+        @param      total_files: Total number of files to process
+        @type       total_bytes: int
+        @param      total_bytes: Total number of bytes to process
+        @type       interval: float
+        @param      interval: Minimum number of seconds between two task state updates
+        """
+        self.task = task
+        self.interval = interval
+        self.log = custom_logger if custom_logger else logger
+        self.total_files = 0
+        self.total_bytes = 0
+        self.files_done = 0
+        self.bytes_done = 0
+        self.start_time = time.monotonic()
+        self.last_update = None
+        self.start(total_files, total_bytes)
+
+    def start(self, total_files=0, total_bytes=0):
+        """
+        (Re-)start progress tracking with the given totals
+        @type       total_files: int
+        @param      total_files: Total number of files to process
+        @type       total_bytes: int
+        @param      total_bytes: Total number of bytes to process
+        """
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.files_done = 0
+        self.bytes_done = 0
+        self.start_time = time.monotonic()
+        self.last_update = None
+
+    def advance(self, files=1, nbytes=0):
+        """
+        Record processed files/bytes and publish progress if the update interval has elapsed
+        @type       files: int
+        @param      files: Number of processed files
+        @type       nbytes: int
+        @param      nbytes: Number of processed bytes
+        """
+        self.files_done += files
+        self.bytes_done += nbytes
+        now = time.monotonic()
+        if self.last_update is None or now - self.last_update >= self.interval:
+            self.publish(now)
+
+    def finish(self):
+        """
+        Publish final progress (100 percent)
+        """
+        self.files_done = max(self.files_done, self.total_files)
+        self.bytes_done = max(self.bytes_done, self.total_bytes)
+        self.publish()
+
+    def percent(self):
+        """
+        Progress in percent, by bytes if the total number of bytes is known, otherwise by files
+        @rtype:     float
+        @return:    Progress percentage
+        """
+        if self.total_bytes > 0:
+            return min(100.0, self.bytes_done * 100.0 / self.total_bytes)
+        if self.total_files > 0:
+            return min(100.0, self.files_done * 100.0 / self.total_files)
+        return 0.0
+
+    def meta(self, now=None):
+        """
+        Progress meta data
+        @rtype:     dict
+        @return:    Task meta data including 'process_percent', throughput (bytes and files per second) and
+                    ETA (seconds)
+        """
+        now = now if now is not None else time.monotonic()
+        elapsed = max(now - self.start_time, 1e-6)
+        bytes_per_second = self.bytes_done / elapsed
+        files_per_second = self.files_done / elapsed
+        percent = self.percent()
+        eta = None
+        if 0 < percent < 100:
+            eta = round(elapsed * (100 - percent) / percent)
+        return {
+            'process_percent': percent,
+            'files_done': self.files_done,
+            'files_total': self.total_files,
+            'bytes_done': self.bytes_done,
+            'bytes_total': self.total_bytes,
+            'bytes_per_second': round(bytes_per_second),
+            'files_per_second': round(files_per_second, 2),
+            'elapsed': round(elapsed),
+            'eta': eta,
+        }
+
+    def publish(self, now=None):
+        """
+        Write progress meta data to the result backend (or log if no task is given)
+        """
+        now = now if now is not None else time.monotonic()
+        self.last_update = now
+        meta = self.meta(now)
+        self.log.debug("Progress: %.0f%% (%d/%d files, %d/%d bytes, ETA: %s s)" % (
+            meta['process_percent'], meta['files_done'], meta['files_total'], meta['bytes_done'],
+            meta['bytes_total'], meta['eta']))
+        if self.task is not None:
+            self.task.update_state(state='PROGRESS', meta=meta)
+
+
+def directory_totals(directory, excludes=None, exclude_prefixes=()):
+    """
+    Get number of files and total size of a directory
+    @type       directory: string
+    @param      directory: Directory path
+    @type       excludes: list
+    @param      excludes: File names to exclude
+    @type       exclude_prefixes: tuple
+    @param      exclude_prefixes: File name prefixes to exclude
+    @rtype:     tuple
+    @return:    Number of files, number of bytes
+    """
+    excludes = excludes if excludes else []
+    exclude_prefixes = tuple(exclude_prefixes)
+    num_files = 0
+    num_bytes = 0
+    stack = [directory]
+    while stack:
+        current_dir = stack.pop()
+        with os.scandir(current_dir) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name not in excludes and not entry.name.startswith(exclude_prefixes):
+                    num_files += 1
+                    num_bytes += entry.stat().st_size
+    return num_files, num_bytes
+
@@ -2,7 +2,6 @@
 import datetime
 import fnmatch
 import gettext
-import io
 import json
 import os
 import re
@@ -14,30 +13,28 @@ from urllib.parse import quote
 import uuid
 from typing import Dict
 from pathlib import Path
-from os import walk
 import redis
 import requests
 from lxml import etree, objectify
 from django.conf import settings
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
+from django.db import DatabaseError
 import pysolr
 from celery import chain, group
-from access.search.solrclient import SolrClient, default_reporter
-from access.search.solrquery import SolrQuery
+from access.search.solrclient import SolrClient
+from access.search.solrgateway import get_solr_gateway
 from access.search.solrserver import SolrServer
-from config.configuration import solr_core_url
 from config.configuration import config_path_storage, config_path_work, solr_protocol, \
     solr_host, solr_port, solr_core, representations_directory, verify_certificate, \
     redis_host, redis_port, redis_password, commands, root_dir, metadata_file_pattern_ead, \
     django_service_protocol, django_service_host, django_service_port, \
-    backend_api_key, sw_version, documentation_directory, metadata_directory
+    backend_api_key, sw_version, documentation_directory, metadata_directory, migration_batch_size
 from config.configuration import urn_event_pattern, urn_agent_pattern, app_label
 
 from earkweb.celery import app
 from earkweb.decorators import requires_parameters, task_logger
 from earkweb.models import InformationPackage
-from earkweb.views import clean_metadata
+from earkweb.statistics import update_package_terms, reconcile_term_store, invalidate_indexed_document_count
+from oai_pmh.records import store_dc_record
 from eatb.utils.datetime import DT_ISO_FORMAT_FILENAME, ts_date
 from eatb.checksum import ChecksumValidation, ChecksumAlgorithm
 from eatb.cli import CliExecution, CliCommand, CliCommands
@@ -59,6 +56,8 @@ from eatb.utils.fileutils import to_safe_filename, find_files, \
 from eatb.utils.randomutils import get_unique_id
 from eatb.storage import write_inventory_from_directory, update_storage_with_differences, get_previous_version_series
 from eatb.packaging import ZipContainer, TarContainer
+from taskbackend.migration import MigrationEngine, batches, tool_version
+from taskbackend.progress import ProgressReporter, directory_totals
 from taskbackend.taskutils import get_working_dir, validate_ead_metadata, get_first_ip_path, \
     create_or_update_state_info_file, persist_state, update_status, find_metadata_file 
 
@@ -139,10 +138,11 @@ def sip_package(self, context, task_log):
     sip_tar_file = os.path.join(working_dir, task_context['package_name'] + '.tar')
     tar = tarfile.open(sip_tar_file, "w:")
     task_log.info(f"Packaging working directory: {working_dir}")
-    total = sum([len(files) for (root, dirs, files) in walk(working_dir)])
-    task_log.info(f"Total number of files in working directory {total}")
-    i = 0
     excludes = [f"{package_name}.tar", "{package_name}.xml"]
+    exclude_prefixes = ("urn+uuid",)
+    total, total_bytes = directory_totals(working_dir, excludes, exclude_prefixes)
+    task_log.info(f"Total number of files in working directory {total} ({total_bytes} bytes)")
+    progress = ProgressReporter(self, total, total_bytes, custom_logger=logger)
     for subdir, dirs, files in os.walk(working_dir):
 
         for directory in dirs:
@@ -152,14 +152,10 @@ def sip_package(self, context, task_log):
                 tar.add(entry, arcname=os.path.join(package_name, os.path.relpath(entry, working_dir)))
 
         for file in files:
-            if not file in excludes and not file.startswith("urn+uuid"):
+            if not file in excludes and not file.startswith(exclude_prefixes):
                 entry = os.path.join(subdir, file)
                 tar.add(entry, arcname=os.path.join(package_name, os.path.relpath(entry, working_dir)))
-                if i % 10 == 0:
-                    perc = (i * 100) / total
-                    logger.debug("Packaging progress: %d" % perc)
-                    self.update_state(state='PROGRESS', meta={'process_percent': perc})
-            i += 1
+                progress.advance(1, os.path.getsize(entry))
     tar.close()
 
     sipgen = SIPGenerator(working_dir)
@@ -180,7 +176,7 @@ def sip_package(self, context, task_log):
     )
     print("Status information updated: %s (%d)" % (response.text, response.status_code))
 
-    self.update_state(state='PROGRESS', meta={'process_percent': 100})
+    progress.finish()
 
     return json.dumps(task_context)
 
@@ -431,8 +427,8 @@ def aip_migrations(self, context, task_log):
     3. Defines migration policies for specific file formats (e.g., PDF, GIF).
     4. Identifies the representations in the submission folder.
     5. For each representation, identifies the files, checks their formats, and
-    queues migration tasks according to the policies.
-    6. Waits for all queued migration tasks to complete.
+    queues migration tasks according to the policies (batches of files per tool).
+    6. Waits for all queued migration tasks to complete and records the status per file.
     7. Generates an XML log of the migration processes.
     8. Copies XML schema files to the working directory.
     9. Generates PREMIS metadata and METS files for each migrated representation.
@@ -461,13 +457,8 @@ def aip_migrations(self, context, task_log):
 
     # migration policy
     pdf = ['fmt/14', 'fmt/15', 'fmt/16', 'fmt/17', 'fmt/18', 'fmt/19', 'fmt/20', 'fmt/276']
-    cli_execution = CliExecution(['ghostscript', '-version'])
-    pdf_software = cli_execution.execute()  # Ghostscript version
     gif = ['fmt/3', 'fmt/4']
 
-    cli_execution = CliExecution(['convert', '-version'])
-    image_software = cli_execution.execute()  # ImageMagick version
-
     # list of all representations in submission folder
     rep_path = os.path.join(working_dir, 'representations/')
     replist = []
@@ -477,15 +468,15 @@ def aip_migrations(self, context, task_log):
     # begin migrations
     total = 0
 
-    jobs_queue = []
+    # migration jobs per tool and migration.xml entries per job
+    jobs_by_tool = {'pdftopdfa': [], 'totiff': []}
+    migration_entries = {}
+    identification = FormatIdentification()
 
     # start migrations from every representation
     for rep in replist:
         source_rep_data = '%s/data' % rep
         migration_source = os.path.join(rep_path, source_rep_data)
-        # migration_target = ''
-        # target_rep = ''
-        outputfile = ''
 
         # Unix-style pattern matching: if representation directory is in format of <name>_mig-<number>,
         # the new representation will be <number> + 1. Else, it is just <name>_mig-1.
@@ -503,79 +494,72 @@ def aip_migrations(self, context, task_log):
         for directory, subdirectories, filenames in os.walk(migration_source):
             for filename in filenames:
                 # fido, file format identification
-                identification = FormatIdentification()
                 fido_result = identification.identify_file(os.path.join(directory, filename))
-                self.args = ''
                 if fido_result in pdf:
-                    software = pdf_software
+                    tool = 'pdftopdfa'
                     task_log.info('File %s is queued for migration to PDF/A.' % filename)
                     outputfile = "%s.pdf" % filename.rsplit('.', 1)[0]
-                    cliparams = {'output_file': '-sOutputFile=' + os.path.join(migration_target, filename),
-                                 'input_file': os.path.join(directory, filename)}
-                    cli_command = CliCommand("pdftopdfa", commands["pdftopdfa"])
-                    self.args = cli_command.get_command(cliparams)
                 elif fido_result in gif:
-                    software = image_software
+                    tool = 'totiff'
                     task_log.info('File %s is queued for migration to TIFF.' % filename)
                     outputfile = "%s.tiff" % filename.rsplit('.', 1)[0]
-                    cliparams = {'input_file': os.path.join(directory, filename),
-                                 'output_file': os.path.join(migration_target, outputfile)}
-
-                    self.args = CliCommand('totiff', cliparams)
                 else:
                     task_log.info('No policy rule applies to file %s, fido result: %s. No file format migration.'
                                   % (filename, fido_result))
-
-                if self.args != '':
-                    task_id = uuid.uuid4().__str__()
-
-                    # create folder for new representation (if it doesnt exist already)
-                    if not os.path.exists(migration_target):
-                        os.makedirs(migration_target)
-
-                    # create folder for migration process task "feedback" (if it doesnt exist)
-                    if not os.path.exists(
-                            os.path.join(working_dir, 'metadata/earkweb/migrations/%s') % target_rep):
-                        os.makedirs(os.path.join(working_dir, 'metadata/earkweb/migrations/%s') % target_rep)
-
-                    # queue the MigrationProcess task
-                    try:
-                        details = {'filename': filename,
-                                   'source': migration_source,
-                                   'target': migration_target,
-                                   'targetrep': target_rep,
-                                   'taskid': task_id,
-                                   'commandline': self.args}
-
-                        # use kwargs, those can be seen in Celery Flower
-                        jobs_queue.append(file_migration.s(details))
-
-                        task_log.info('Migration queued for %s.' % filename)
-                    except Exception as e:
-                        task_log.error('Migration task %s for file %s could not be queued: %s' % (task_id, filename, e))
-
-                    # migration.xml entry - need this for Premis creation. Can put additional stuff here if desired.
-                    objectify.SubElement(migration_root, 'migration', attrib={'file': filename,
-                                                                              'output': outputfile,
-                                                                              'sourcedir': migration_source,
-                                                                              'targetdir': migration_target,
-                                                                              'targetrep': target_rep,
-                                                                              'taskid': task_id,
-                                                                              'status': 'queued',
-                                                                              'starttime': current_timestamp(),
-                                                                              'agent': software})
-                    total += 1
-                else:
-                    pass
-
-    jobs = group(jobs_queue)
-    async_res = jobs.apply_async()
-
-    # wait for all migrations to finish
-    while not all(res.status == "SUCCESS" for res in async_res.results):
-        num_success = sum(res.status == "SUCCESS" for res in async_res.results)
-        logger.info("Migration running [%d/%d] ..." % (num_success, len(async_res.results)))
-        time.sleep(5)
+                    continue
+
+                task_id = uuid.uuid4().__str__()
+
+                # create folder for migration process task "feedback" (if it doesnt exist)
+                if not os.path.exists(
+                        os.path.join(working_dir, 'metadata/earkweb/migrations/%s') % target_rep):
+                    os.makedirs(os.path.join(working_dir, 'metadata/earkweb/migrations/%s') % target_rep)
+
+                jobs_by_tool[tool].append({'filename': filename,
+                                           'input_file': os.path.join(directory, filename),
+                                           'output_file': os.path.join(migration_target, outputfile),
+                                           'targetrep': target_rep,
+                                           'taskid': task_id})
+
+                # migration.xml entry - need this for Premis creation. Can put additional stuff here if desired.
+                migration_entries[task_id] = objectify.SubElement(
+                    migration_root, 'migration', attrib={'file': filename,
+                                                         'output': outputfile,
+                                                         'sourcedir': migration_source,
+                                                         'targetdir': migration_target,
+                                                         'targetrep': target_rep,
+                                                         'taskid': task_id,
+                                                         'status': 'queued',
+                                                         'starttime': current_timestamp(),
+                                                         'agent': tool_version(tool)})
+                total += 1
+
+    # queue migration tasks, each task migrates a batch of files using the same tool
+    jobs_queue = []
+    for tool, tool_jobs in jobs_by_tool.items():
+        for batch in batches(tool_jobs, migration_batch_size):
+            jobs_queue.append(file_migration.s({'tool': tool, 'jobs': batch}))
+            task_log.info('Migration of %d files queued (%s).' % (len(batch), tool))
+
+    if jobs_queue:
+        async_res = group(jobs_queue).apply_async()
+
+        # wait for all migrations to finish
+        while not all(res.ready() for res in async_res.results):
+            num_ready = sum(res.ready() for res in async_res.results)
+            logger.info("Migration running [%d/%d] ..." % (num_ready, len(async_res.results)))
+            time.sleep(5)
+
+        for res in async_res.results:
+            if not res.successful():
+                task_log.error('Migration task %s failed: %s' % (res.id, res.result))
+                continue
+            for job in res.result:
+                entry = migration_entries.get(job['taskid'])
+                if entry is not None:
+                    entry.set('status', job['status'])
+                if job['status'] != 'success':
+                    task_log.error('Migration of file %s failed: %s' % (job['filename'], job['message']))
 
     # create migrations result xml file
     migration_root.set('total', total.__str__())
@@ -638,18 +622,26 @@ def file_migration(self, details):
 
     Args:
         self: Reference to the current task instance.
-        details (dict): A dictionary containing the following keys:
+        details (dict): A dictionary containing either the following keys (batch of files):
+            - 'tool': The migration tool (e.g. 'pdftopdfa', 'totiff').
+            - 'jobs': List of migration jobs (dictionaries with 'input_file' and 'output_file').
+          or (single command line):
             - 'targetrep': The target repository for the migration.
             - 'commandline': The command line arguments to execute.
 
     Raises:
-        ValueError: If the 'commandline' parameter is empty.
+        ValueError: If the 'commandline' parameter is empty or the migration tool is unknown.
 
     Returns:
+        list: Migration jobs with 'status' and 'message' (batch of files) or
         bool: True if the command line execution is successful.
     """
-    # filename = details['filename']
-    # taskid = details['taskid']
+    if 'jobs' in details:
+        tool = details['tool']
+        if tool not in commands:
+            raise ValueError("Unknown migration tool: %s" % tool)
+        return MigrationEngine().migrate(tool, details['jobs'])
+
     self.targetrep = details['targetrep']
     self.args = details['commandline']
 
@@ -888,7 +880,7 @@ def aip_packaging(self, context, task_log):
         4. Create a tar archive and add files from the working directory.
         5. Exclude specified files from the archive.
         6. Log the packaging progress.
-        7. Update the task state to 'PROGRESS' and include the progress percentage.
+        7. Update the task state to 'PROGRESS' and include the progress percentage, throughput and ETA.
         8. Return the task context as a JSON string.
 
     Returns:
@@ -896,7 +888,7 @@ def aip_packaging(self, context, task_log):
 
     Logs:
         - Info level logs for packaging start and total files in the directory.
-        - Debug level logs for packaging progress every 10 files.
+        - Debug level logs for packaging progress (throttled by the progress update interval).
         - Warning level logs if status information is not updated.
     """
     task_context = json.loads(context)
@@ -915,10 +907,10 @@ def aip_packaging(self, context, task_log):
 
     tar = tarfile.open(aip_package_path, "w:")
     task_log.info("Packaging working directory: %s", working_dir)
-    total = sum([len(files) for (root, dirs, files) in walk(working_dir)])
-    task_log.info("Total number of files in working directory %d", total)
-    i = 0
     excludes = [f"{package_name}.tar", f"{package_name}.xml", archive_file]
+    total, total_bytes = directory_totals(working_dir, excludes)
+    task_log.info("Total number of files in working directory %d (%d bytes)", total, total_bytes)
+    progress = ProgressReporter(self, total, total_bytes, custom_logger=logger)
     for subdir, dirs, files in os.walk(working_dir):
 
         for directory in dirs:
@@ -931,15 +923,10 @@ def aip_packaging(self, context, task_log):
             if not file in excludes:
                 entry = os.path.join(subdir, file)
                 tar.add(entry, arcname=os.path.join(safe_identifier_name, os.path.relpath(entry, working_dir)))
-                if i % 10 == 0:
-                    perc = (i * 100) / total
-                    logger.debug("Packaging progress: %d", perc)
-                    # todo: activate
-                    # self.update_state(state='PROGRESS', meta={'process_percent': perc})
-            i += 1
+                progress.advance(1, os.path.getsize(entry))
     tar.close()
 
-    self.update_state(state='PROGRESS', meta={'process_percent': 100})
+    progress.finish()
 
     return json.dumps(task_context)
 
@@ -1008,7 +995,7 @@ def store_aip(_, context, task_log):
 @app.task(bind=True, name="aip_indexing")
 @requires_parameters("identifier")
 @task_logger
-def aip_indexing(_, context, task_log=None):
+def aip_indexing(self, context, task_log=None):
     """
     Index content files in AIP directory
 
@@ -1032,19 +1019,16 @@ def aip_indexing(_, context, task_log=None):
 
     # Check Solr server availability
     solr_server = SolrServer(solr_protocol, solr_host, solr_port)
-    sq = SolrQuery(solr_server)
-    base_url = sq.get_base_url()
-    task_log.info(f"SolR base URL: {base_url}")
-    solr_response = requests.get(base_url, verify=verify_certificate, timeout=5)
-    if solr_response.status_code != 200:
-        task_log.warn(f"Information package cannot be indexed because SolR is not available at: {base_url}")
+    gateway = get_solr_gateway()
+    task_log.info(f"SolR core URL: {gateway.core_url('storagecore1')}")
+    if not gateway.ping('storagecore1'):
+        task_log.warn(f"Information package cannot be indexed because SolR is not available at: "
+                      f"{gateway.core_url('storagecore1')}")
         return json.dumps(task_context)
 
     # Delete existing records
-    submission_url = f"{solr_protocol}://{solr_host}:{solr_port}/solr/storagecore1/update/?commit=true"
-    task_log.info(f"Submission URL: {submission_url}")
-    delete_response = requests.post(submission_url, data=f"<delete><query>package:\"{identifier}\"</query></delete>",
-                                     headers={'Content-Type': 'text/xml'}, verify=verify_certificate, timeout=5)
+    delete_response = gateway.update(f"<delete><query>package:\"{identifier}\"</query></delete>", 'text/xml',
+                                     core='storagecore1')
     if delete_response.status_code == 200:
         task_log.info(f"Index records deleted for package: {identifier}")
     else:
@@ -1056,13 +1040,29 @@ def aip_indexing(_, context, task_log=None):
     solr_client = SolrClient(solr_server, "storagecore1")
     # Index files from storage directory
     task_log.info(f"Indexing content files from directory: {storage_dir}")
-    results = solr_client.index_directory(storage_dir, identifier, version, default_reporter, task_log=task_log)
+    progress = ProgressReporter(self, custom_logger=logger)
+    results = solr_client.index_directory(storage_dir, identifier, version, progress, task_log=task_log)
     task_log.info("Total number of files posted: %d" % len(results))
     num_ok = sum(1 for result in results if result['status'] == 200)
     task_log.info("Number of files posted successfully: %d" % num_ok)
     num_failed = sum(1 for result in results if result['status'] != 200)
     task_log.info("Number of failed postings: %d" % num_failed)
 
+    invalidate_indexed_document_count(identifier)
+
+    # render the Dublin Core record (OAI-PMH) of the package version
+    try:
+        if not store_dc_record(identifier):
+            task_log.warning(f"Dublin Core record not stored, package not found: {identifier}")
+    except (DatabaseError, requests.exceptions.RequestException) as e:
+        task_log.warning(f"Dublin Core record not stored: {e}")
+
+    # update word cloud term frequencies of the package
+    try:
+        update_package_terms(identifier)
+    except (pysolr.SolrError, OSError) as e:
+        task_log.warning(f"Word cloud term frequencies were not updated: {e}")
+
     return json.dumps(task_context)
 
 
@@ -1149,7 +1149,7 @@ def solr_update_metadata(_, context, task_log):
         task_log.info("Descriptive metadata validated successfully.")
 
     # reload the Solr core, because the index was changed by adding new fields
-    requests.get('%s://%s:%s/solr/admin/cores?action=RELOAD&core=%s' % (solr_protocol, solr_host, solr_port, solr_core))
+    get_solr_gateway().reload_core(solr_core)
 
 
 @app.task(name="initialize_working_directory")
@@ -1191,50 +1191,18 @@ def delete_representation_data_from_workdir(context):
 
 @app.task(name='generate_wordcloud_task')
 def generate_wordcloud_task():
-    """Generate word cloud"""
-    solr = pysolr.Solr(solr_core_url, timeout=10)
-    filter_query = 'path:*representations/*/data/*'
-    
-    results = solr.search('*:*', **{
-        'fq': filter_query,
-        'fl': 'content,path',
-        'rows': 1000
-    })
-    
-    try:
-        all_content = ' '.join(
-            [clean_metadata(' '.join(doc['content'])) if isinstance(doc.get('content', ''), list)
-             else clean_metadata(doc.get('content', '')) for doc in results]
-        )
-    except KeyError as e:
-        logger.error(f"KeyError: {e}")
-        all_content = ''
-    except Exception as e:
-        logger.error(f"An error occurred: {e}")
-        all_content = ''
-    
-    if not all_content.strip():
-        logger.info("No content found for word cloud generation")
-        return
-    
-    # Generate word cloud
-    wordcloud = WordCloud(width=800, height=400, background_color='white').generate(all_content)
+    """
+    Generate word cloud
 
-    # Save the word cloud image to a static/media directory
-    image_path = os.path.join(settings.MEDIA_ROOT, 'wordcloud', 'wordcloud.png')
-    os.makedirs(os.path.dirname(image_path), exist_ok=True)
-    
-    buffer = io.BytesIO()
-    plt.figure(figsize=(10, 5))
-    plt.imshow(wordcloud, interpolation='bilinear')
-    plt.axis('off')
-    plt.savefig(buffer, format='png')
-    buffer.seek(0)
-    
-    with open(image_path, 'wb') as f:
-        f.write(buffer.getvalue())
-    
-    logger.info(f"Word cloud image saved at {image_path}")
+    Term frequencies are updated when packages are indexed (see aip_indexing), this task only adds packages which
+    are missing in the term frequency store, removes packages which are not indexed anymore and regenerates the
+    image if the term distribution has changed.
+    """
+    try:
+        if reconcile_term_store():
+            logger.info("Word cloud image regenerated")
+    except (pysolr.SolrError, OSError) as e:
+        logger.error(f"Word cloud generation failed: {e}")
 
 
 RESERVED_WORDS = {"representations", "schemas", "metadata", "documentation"}
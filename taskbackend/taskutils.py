@@ -6,20 +6,24 @@ import shutil
 import tarfile
 from collections import defaultdict
 import hashlib
-from datetime import datetime
+from datetime import datetime, timedelta
 from json import JSONDecodeError
 from typing import List
 import tempfile
+import time
+import unittest
 import hashlib
 import logging
 from subprocess import Popen, PIPE
 from lxml import etree
 import requests
 import bagit
+from django.db import DatabaseError
+from django.db.models import Q
+from django.utils import timezone
 from celery.result import AsyncResult
 from api.util import get_representation_ids_by_label
 from eatb.checksum import  get_sha512_hash
-from eatb.csip_validation import XmlValidation
 from eatb.packaging import TarContainer, create_package
 from eatb.pairtree_storage import make_storage_directory_path, make_storage_data_directory_path
 from eatb.utils.XmlHelper import q
@@ -40,8 +44,8 @@ from config.configuration import django_service_host
 from config.configuration import django_service_port
 from config.configuration import backend_api_key
 from util.custom_exceptions import NotFoundError
-from util.djangoutils import get_user_api_token
 from util.flowerapiclient import get_task_info
+from util.xmlschemacache import validate_tree
 
 
 logger = logging.getLogger(__name__)
@@ -96,50 +100,129 @@ logger = logging.getLogger(__name__)
 
 
 
+def apply_state(ip, state):
+    """
+    Set identifier, version and storage directory of an information package record from its package state
+    @type       ip: InformationPackage
+    @param      ip: Information package record
+    @type       state: dict
+    @param      state: Package state (content of state.json)
+    @rtype:     bool
+    @return:    True if the record was changed
+    """
+    identifier = state.get("identifier")
+    if not identifier or identifier == 'None' or "version" not in state:
+        return False
+    version = int(state["version"])
+    storage_dir = make_storage_directory_path(identifier, version, config_path_storage)
+    if ip.identifier == identifier and ip.version == version and ip.storage_dir == storage_dir:
+        return False
+    ip.identifier = identifier
+    ip.version = version
+    ip.storage_dir = storage_dir
+    return True
+
+
+def read_state_file(uid, work_dir=config_path_work):
+    """
+    Read the package state file (metadata/other/state.json) of a process from the working area
+    @type       uid: string
+    @param      uid: Process ID
+    @type       work_dir: string
+    @param      work_dir: Working area directory
+    @rtype:     dict
+    @return:    Package state or None if the state file does not exist
+    @raises     ValueError: if the state file cannot be parsed
+    """
+    state_file_path = os.path.join(work_dir, uid, "metadata/other/state.json")
+    if not os.path.isfile(state_file_path):
+        return None
+    with open(state_file_path, 'r', encoding='utf-8') as state_file:
+        return json.load(state_file)
+
+
+def record_state(ip, work_dir=config_path_work):
+    """
+    Package state of an information package record: the state mirrored in the database or, if it is not mirrored
+    (e.g. packages created before states were mirrored), the state file of the working area. A state read from the
+    file is set on the record (state_info, state_last_change), so that it is mirrored when the record is saved.
+    @type       ip: InformationPackage
+    @param      ip: Information package record
+    @type       work_dir: string
+    @param      work_dir: Working area directory
+    @rtype:     dict
+    @return:    Package state or None if no state is available
+    @raises     ValueError: if the state cannot be parsed
+    """
+    if ip.state_info:
+        return json.loads(ip.state_info)
+    state = read_state_file(ip.uid, work_dir)
+    if state is not None:
+        ip.state_info = json.dumps(state)
+        ip.state_last_change = timezone.now()
+    return state
+
+
 def update_state_from_backend_api(request, uid):
-    """updating frontend database table based on information persisted in the backend"""
-    ip_state_url = "/earkweb/api/ips/%s/status/" % (uid)
-    user_api_token = get_user_api_token(request.user)
-    response = requests.get(ip_state_url, headers={'Authorization': 'Token %s' % user_api_token}, verify=verify_certificate)
-    ip_state_json = json.loads(response.content)
-    identifier = ip_state_json["identifier"]
-    if identifier != "" and identifier != 'None':
-        # pylint: disable-next=no-member
-        ip = InformationPackage.objects.get(uid=uid)
-        ip.identifier = ip_state_json["identifier"]
-        version = ip_state_json["version"]
-        ip.version = int(version)
-        ip.storage_dir = make_storage_directory_path(identifier, version, config_path_storage)
-        ip.save()
-
-
-def update_states_from_backend_api(request):
-    """updating frontend database table based on status information in the backend"""
-    ip_states_url = "/earkweb/api/ips/status/"
-    logger.info("Submissions update states request URL: %s" % ip_states_url)
-    user_api_token = get_user_api_token(request.user)
-    response = requests.get(ip_states_url, headers={'Authorization': 'Token %s' % user_api_token}, verify=verify_certificate)
-    if response.status_code != 200:
+    """updating frontend database table based on the package state persisted by the backend"""
+    # pylint: disable-next=no-member
+    ip = InformationPackage.objects.get(uid=uid)
+    mirrored = bool(ip.state_info)
+    state = record_state(ip)
+    if state is None:
+        return
+    changed = apply_state(ip, state)
+    if changed or not mirrored:
+        ip.save(update_fields=['identifier', 'version', 'storage_dir', 'state_info', 'state_last_change'])
+
+
+def update_states_from_backend_api(request=None, since=None):
+    """
+    updating frontend database table based on the package states persisted by the backend (single bulk update).
+    Records without mirrored state (created in the considered period) are updated from the state file of the
+    working area and their state is mirrored.
+    @type       since: datetime
+    @param      since: Only consider states changed since this point in time (default: last seven days)
+    @rtype:     int
+    @return:    Number of updated records
+    """
+    since = since if since else timezone.now() - timedelta(days=7)
+    # pylint: disable-next=no-member
+    ips = InformationPackage.objects.filter(Q(state_info__isnull=False, state_last_change__gte=since) |
+                                            Q(state_info__isnull=True, created__gte=since)) \
+        .only('id', 'uid', 'identifier', 'version', 'storage_dir', 'state_info', 'state_last_change')
+    changed = []
+    for ip in ips.iterator(chunk_size=500):
         try:
-            resp = json.loads(response.text)
-            if "message" in resp:
-                raise ValueError(resp["message"])
-        except:
-            raise ValueError("An error occurred")
-    logger.info(response.text)
-    ip_states_json = json.loads(response.text)
-    if ip_states_json != "{}":
-        for uid in ip_states_json.keys():
-            states = ip_states_json[uid]
-            identifier = states["identifier"]
-            if identifier != "" and identifier != 'None':
-                # pylint: disable-next=no-member
-                ip = InformationPackage.objects.get(uid=uid)
-                ip.identifier = states["identifier"]
-                version = states["version"]
-                ip.version = int(version)
-                ip.storage_dir = make_storage_directory_path(identifier, version, config_path_storage)
-                ip.save()
+            mirrored = bool(ip.state_info)
+            state = record_state(ip)
+            if state is not None and (apply_state(ip, state) or not mirrored):
+                changed.append(ip)
+        except (JSONDecodeError, ValueError, OSError) as err:
+            logger.warning("Invalid state of process %s: %s" % (ip.pk, err))
+    if changed:
+        # pylint: disable-next=no-member
+        InformationPackage.objects.bulk_update(changed, ['identifier', 'version', 'storage_dir', 'state_info',
+                                                         'state_last_change'], batch_size=500)
+    logger.info("Submission states updated: %d" % len(changed))
+    return len(changed)
+
+
+def update_state_record(working_dir, state_info):
+    """
+    Mirror package state (metadata/other/state.json) into the database record of the process
+    @type       working_dir: string
+    @param      working_dir: Working directory (directory name is the process ID)
+    @type       state_info: dict
+    @param      state_info: Package state
+    """
+    uid = os.path.basename(os.path.normpath(working_dir))
+    try:
+        # pylint: disable-next=no-member
+        InformationPackage.objects.filter(uid=uid).update(state_info=json.dumps(state_info),
+                                                          state_last_change=timezone.now())
+    except DatabaseError as err:
+        logger.warning("Unable to store state of process %s in the database: %s" % (uid, err))
 
 
 def get_working_dir(uid):
@@ -283,10 +366,63 @@ def get_task_info_from_child_tasks(current_task_result):
     return child_task_ids, task_status_from_result
 
 
+def find_missing_file_references(base_dir, references, custom_logger=None):
+    """
+    Check the existence of files referenced relative to a base directory. Instead of one stat call per reference,
+    the directories containing referenced files are listed once (single scandir walk of the referenced subtree)
+    and all references are resolved against this in-memory index.
+    @type       base_dir: string
+    @param      base_dir: Directory the references are relative to
+    @type       references: list
+    @param      references: Relative file references
+    @rtype:     list
+    @return:    Referenced file paths which do not exist (in order of the references)
+    """
+    log = custom_logger if custom_logger else logger
+    if not references:
+        return []
+    start = time.monotonic()
+    ref_paths = [os.path.normpath(os.path.join(base_dir, ref)) for ref in references]
+    ref_dirs = {os.path.dirname(path) for path in ref_paths}
+    # directories which must be entered to reach all referenced directories
+    wanted_dirs = set()
+    for ref_dir in ref_dirs:
+        while ref_dir not in wanted_dirs:
+            wanted_dirs.add(ref_dir)
+            parent = os.path.dirname(ref_dir)
+            if parent == ref_dir:
+                break
+            ref_dir = parent
+    try:
+        walk_root = os.path.commonpath(list(ref_dirs))
+    except ValueError:
+        walk_root = base_dir
+    existing_files = set()
+    num_dirs = 0
+    stack = [walk_root]
+    while stack:
+        current_dir = stack.pop()
+        try:
+            with os.scandir(current_dir) as entries:
+                num_dirs += 1
+                for entry in entries:
+                    if current_dir in ref_dirs:
+                        existing_files.add(entry.path)
+                    if entry.path in wanted_dirs and entry.is_dir():
+                        stack.append(entry.path)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+    missing = [path for path in ref_paths if path not in existing_files]
+    log.info("Checked %d file references (%d directories listed, %d missing) in %.3f seconds" %
+             (len(ref_paths), num_dirs, len(missing), time.monotonic() - start))
+    return missing
+
+
 def validate_ead_metadata(root_path, pattern, schema_file, custom_logger=None):
     """
     This function validates the XML meta data file against the XML schema and performs additional consistency checks.
     If the schema_file is None, the EAD metadata file is validated against the XML schema files provided.
+    Compiled schemas are taken from the worker level schema cache and each file is parsed only once.
     @type       root_path: string
     @param      root_path: Root directory
     @type       pattern:  string
@@ -299,56 +435,54 @@ def validate_ead_metadata(root_path, pattern, schema_file, custom_logger=None):
     # ead 2002: ns = {'ead': 'http://ead3.archivists.org/schema/', 'xlink': 'http://www.w3.org/1999/xlink',
     #     'xsi': 'http://www.w3.org/2001/XMLSchema-instance'}
     ns = {'ead': 'http://ead3.archivists.org/schema/', 'xsi': 'http://www.w3.org/2001/XMLSchema-instance'}
-    xmlval = XmlValidation()
     ead_md_files = [x for x in locate(pattern, root_path)]
     log = custom_logger if custom_logger else logger
+    references_valid = True
+    if schema_file is None:
+        log.info("Using schema files specified by the 'schemaLocation' attribute")
+    else:
+        log.info("Using schema: %s" % schema_file)
     for ead in ead_md_files:
         log.debug("Validating EAD metadata file: %s" % strip_prefixes(ead, root_path))
+        ead_dir, tail = os.path.split(ead)
+        try:
+            ead_tree = etree.parse(ead)
+        except etree.XMLSyntaxError as err:
+            log.error("Metadata file '%s' is not well-formed: %s" % (ead, err))
+            return False
         # validate against xml schema
-        result = xmlval.validate_XML_by_path(ead, schema_file)
-        if result.err and len(result.err) >  0:
-            for e in result.err:
-                log.error(e)
-        if schema_file is None:
-            schema_file = xmlval.get_schema_from_instance(ead)
-            log.info("Using schema files specified by the 'schemaLocation' attribute")
-        else:
-            log.info("Using schema: " % schema_file)
-        if result.valid:
+        valid, errors = validate_tree(ead_tree, schema_file, ead_dir)
+        if valid:
             log.debug("Metadata file '%s' successfully validated." % ead)
         else:
             if schema_file is None:
                 log.error("Error validating against schemas using schema files specified by the 'schemaLocation' attribute:")
             else:
-                log.error("Error validating against schema '%s': %s" % (schema_file, result.err))
-
-            for err in result.err:
+                log.error("Error validating against schema '%s':" % schema_file)
+            for err in errors:
                 log.error("- %s" % str(err))
             return False
-        ead_tree = etree.parse(ead)
         # check dao hrefs
         res = ead_tree.getroot().xpath('//ead:dao', namespaces=ns)
         if len(res) == 0:
             log.info("The EAD file does not contain any file references.")
-        ead_dir, tail = os.path.split(ead)
-        references_valid = True
-        for dao in res:
-            # ead 2002: dao_ref_file = os.path.join(ead_dir,
-            #     remove_protocol(dao.attrib['{http://www.w3.org/1999/xlink}href']))
-            dao_ref_file = os.path.join(ead_dir, remove_protocol(dao.attrib['href']))
-            if not os.path.exists(dao_ref_file):
-                references_valid = False
+        # ead 2002: remove_protocol(dao.attrib['{http://www.w3.org/1999/xlink}href'])
+        references = [remove_protocol(dao.attrib['href']) for dao in res if 'href' in dao.attrib]
+        missing = find_missing_file_references(ead_dir, references, log)
+        if missing:
+            for dao_ref_file in missing:
                 log.error("DAO file reference error - File does not exist: %s" % dao_ref_file)
-        if not references_valid:
-            log.error( "DAO file reference errors. Please consult the log file for details.")
-            return False
-    return True
+            log.error("DAO file reference errors (%d of %d references in '%s'). Please consult the log file for "
+                      "details." % (len(missing), len(references), strip_prefixes(ead, root_path)))
+            references_valid = False
+    return references_valid
 
 
 def validate_gml_data(root_path, pattern, schema_file):
     """
     This function validates the XML meta data file against the XML schema and performs additional consistency checks.
     If the schema_file is None, the GML data file is validated against the XML schema files provided.
+    Compiled schemas are taken from the worker level schema cache.
     @type       root_path: string
     @param      root_path: Root directory
     @type       pattern:  string
@@ -358,29 +492,30 @@ def validate_gml_data(root_path, pattern, schema_file):
     @rtype:     bool
     @return:    Validity of GML data
     """
-    ns = {'ogr': 'http://ogr.maptools.org/', 'gml': 'http://www.opengis.net/gml', 'xsi': 'http://www.w3.org/2001/XMLSchema-instance'}
-    xmlval = XmlValidation()
     gml_data_files = [x for x in locate(pattern, root_path)]
-    for ead in gml_data_files:
-        logger.debug("Validating GML data file: %s" % strip_prefixes(ead, root_path))
+    if schema_file is None:
+        logger.info("Using schema files specified by the 'schemaLocation' attribute")
+    else:
+        logger.info("Using schema: %s" % schema_file)
+    for gml in gml_data_files:
+        logger.debug("Validating GML data file: %s" % strip_prefixes(gml, root_path))
+        try:
+            gml_tree = etree.parse(gml)
+        except etree.XMLSyntaxError as err:
+            logger.error("GML data file '%s' is not well-formed: %s" % (gml, err))
+            return False
         # validate against xml schema
-        result = xmlval.validate_XML_by_path(ead, schema_file)
-        if schema_file is None:
-            logger.info("Using schema files specified by the 'schemaLocation' attribute")
-        else:
-            logger.info("Using schema: " % schema_file)
-        if result.valid:
-            logger.debug("GML data file '%s' successfully validated." % ead)
+        valid, errors = validate_tree(gml_tree, schema_file, os.path.dirname(gml))
+        if valid:
+            logger.debug("GML data file '%s' successfully validated." % gml)
         else:
             if schema_file is None:
                 logger.error("Error validating against schemas using schema files specified by the 'schemaLocation' attribute:")
             else:
-                logger.error("Error validating against schema '%s': %s" % (schema_file, result.err))
-
-            for err in result.err:
+                logger.error("Error validating against schema '%s':" % schema_file)
+            for err in errors:
                 logger.error("- %s" % str(err))
             return False
-        ead_tree = etree.parse(ead)
     return True
 
 
@@ -518,6 +653,7 @@ def create_or_update_state_info_file(working_dir, info=None):
     result_info["last_change"] = current_date
     with open(state_info_file, 'w', encoding="utf-8") as status_file:
         status_file.write(json.dumps(result_info, indent=4))
+    update_state_record(working_dir, result_info)
 
 
 def get_process_representation_ids_by_label(uid, representation_label) -> List[str]:
@@ -622,6 +758,7 @@ def persist_state(identifier, version, storage_dir, file_name, working_dir):
     json_data = json.dumps(patch_data, indent=4)
     with open(os.path.join(working_dir, "metadata/other/state.json"), 'w', encoding="utf-8") as inventory_file:
         inventory_file.write(json_data)
+    update_state_record(working_dir, patch_data)
     return patch_data
 
 
@@ -896,3 +1033,40 @@ def compute_file_hashes(file_path):
         "sha512": compute_sha512(file_path),
         "md5": compute_md5(file_path),
     }
+
+
+class TestRecordState(unittest.TestCase):
+
+    class Record(object):
+        def __init__(self, uid, state_info=None):
+            self.uid = uid
+            self.state_info = state_info
+            self.state_last_change = None
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.work_dir, "abc", "metadata/other"))
+        with open(os.path.join(self.work_dir, "abc", "metadata/other/state.json"), 'w') as state_file:
+            json.dump({"identifier": "urn:uuid:1", "version": "00001"}, state_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_mirrored_state(self):
+        ip = self.Record("abc", json.dumps({"identifier": "urn:uuid:2", "version": "00002"}))
+        self.assertEqual("urn:uuid:2", record_state(ip, self.work_dir)["identifier"])
+
+    def test_state_file_fallback(self):
+        ip = self.Record("abc")
+        self.assertEqual({"identifier": "urn:uuid:1", "version": "00001"}, record_state(ip, self.work_dir))
+        self.assertEqual({"identifier": "urn:uuid:1", "version": "00001"}, json.loads(ip.state_info))
+        self.assertIsNotNone(ip.state_last_change)
+
+    def test_no_state(self):
+        ip = self.Record("xyz")
+        self.assertIsNone(record_state(ip, self.work_dir))
+        self.assertIsNone(ip.state_info)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# coding=UTF-8
+"""
+Directory listings for the directory tree views (jstree).
+
+Listings are cached per directory and invalidated when the modification time of the directory changes (entries
+added, removed or renamed). Tree nodes are delivered one directory level at a time and in pages, sub-directories
+are expanded on demand.
+"""
+import logging
+import mimetypes
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+from config.configuration import directory_page_size, directory_listing_cache_size
+
+logger = logging.getLogger(__name__)
+
+DirectoryEntry = namedtuple('DirectoryEntry', ['name', 'is_dir', 'digest'], defaults=(None,))
+
+_listing_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def list_directory(directory):
+    """
+    List directory entries sorted by name (cached, invalidated by the directory's modification time)
+    @type       directory: string
+    @param      directory: Directory path
+    @rtype:     list
+    @return:    List of DirectoryEntry tuples
+    @raises     OSError: if the directory cannot be read
+    """
+    mtime = os.stat(directory).st_mtime_ns
+    with _lock:
+        cached = _listing_cache.get(directory)
+        if cached and cached[0] == mtime:
+            _listing_cache.move_to_end(directory)
+            return cached[1]
+    with os.scandir(directory) as it:
+        entries = sorted((DirectoryEntry(entry.name, entry.is_dir()) for entry in it), key=lambda e: e.name)
+    with _lock:
+        _listing_cache[directory] = (mtime, entries)
+        _listing_cache.move_to_end(directory)
+        while len(_listing_cache) > directory_listing_cache_size:
+            _listing_cache.popitem(last=False)
+    return entries
+
+
+def clear_listing_cache():
+    """Remove all cached directory listings"""
+    with _lock:
+        _listing_cache.clear()
+
+
+def tree_node(name, node_path, is_dir, path_prefix="", digest=None):
+    """
+    Tree node of a directory entry
+    @type       name: string
+    @param      name: Entry name
+    @type       node_path: string
+    @param      node_path: Path of the entry relative to the tree root
+    @type       is_dir: bool
+    @param      is_dir: Entry is a directory (children are loaded on demand)
+    @type       path_prefix: string
+    @param      path_prefix: Prefix of the path used to access the file resource (e.g. process ID)
+    @type       digest: string
+    @param      digest: Digest of the file (if known, e.g. from the inventory)
+    @rtype:     dict
+    @return:    jstree node
+    """
+    node = {'text': name, 'data': {'path': path_prefix + node_path, 'node': node_path}}
+    if is_dir:
+        node['children'] = True
+    else:
+        mimetype, _ = mimetypes.guess_type(name)
+        node['data']['mimetype'] = mimetype if mimetype else "application/octet-stream"
+        if digest:
+            node['data']['digest'] = digest
+    return node
+
+
+def directory_children(root, node_path="", path_prefix="", offset=0, limit=directory_page_size, lister=None):
+    """
+    Page of child nodes of a directory
+    @type       root: string
+    @param      root: Tree root directory
+    @type       node_path: string
+    @param      node_path: Directory path relative to the tree root ("" for the root)
+    @type       path_prefix: string
+    @param      path_prefix: Prefix of the path used to access the file resource
+    @type       offset: int
+    @param      offset: Index of the first entry
+    @type       limit: int
+    @param      limit: Maximum number of entries
+    @type       lister: function
+    @param      lister: Function returning the entries (DirectoryEntry) of a directory given by its path relative
+                        to the root (default: cached file system listing)
+    @rtype:     dict
+    @return:    Child nodes ('children'), total number of entries ('total') and offset of the next page
+                ('next_offset', None if this is the last page)
+    @raises     ValueError: if the path points outside of the tree root
+    @raises     OSError: if the directory cannot be read
+    """
+    root = os.path.normpath(root)
+    directory = os.path.normpath(os.path.join(root, node_path))
+    if directory != root and not directory.startswith(root + os.sep):
+        raise ValueError("Invalid directory path: %s" % node_path)
+    node_path = "" if directory == root else os.path.relpath(directory, root)
+    entries = lister(node_path) if lister else list_directory(directory)
+    offset = max(0, offset)
+    limit = max(1, limit)
+    page = entries[offset:offset + limit]
+    next_offset = offset + limit if offset + limit < len(entries) else None
+    return {
+        'node': node_path,
+        'offset': offset,
+        'total': len(entries),
+        'next_offset': next_offset,
+        'children': [tree_node(entry.name, os.path.join(node_path, entry.name), entry.is_dir, path_prefix,
+                               entry.digest) for entry in page],
+    }
+
+
+def directory_tree(root, node_path="", path_prefix="", lister=None):
+    """
+    Complete directory tree below a directory (all levels)
+    @type       root: string
+    @param      root: Tree root directory
+    @type       node_path: string
+    @param      node_path: Directory path relative to the tree root ("" for the root)
+    @type       path_prefix: string
+    @param      path_prefix: Prefix of the path used to access the file resource
+    @type       lister: function
+    @param      lister: Function returning the entries of a directory (see directory_children)
+    @rtype:     dict
+    @return:    jstree node of the directory including all descendants
+    """
+    entries = lister(node_path) if lister else list_directory(os.path.join(root, node_path))
+    children = []
+    for entry in entries:
+        child_path = os.path.join(node_path, entry.name)
+        if entry.is_dir:
+            children.append(directory_tree(root, child_path, path_prefix, lister))
+        else:
+            children.append(tree_node(entry.name, child_path, False, path_prefix, entry.digest))
+    node = tree_node(os.path.basename(node_path), node_path, True, path_prefix)
+    node['children'] = children
+    return node
@@ -1,11 +1,14 @@
+import unittest
 import uuid
 
 from django.contrib.auth.models import User
+from django.db.models import Q
 from django.http import HttpResponse
 from django.template import loader
 from eatb.utils import randomutils
 from rest_framework.authtoken.models import Token
 
+from config.configuration import node_namespace_id
 from earkweb.models import InternalIdentifier
 
 from django.utils.translation import gettext_lazy as _
@@ -23,20 +26,114 @@ def get_user_api_token(user_pk):
     return token.key
 
 
+# maximum number of candidate selections when claiming identifiers (candidates can be claimed concurrently)
+CLAIM_ATTEMPTS = 5
+
+
+def claim_rows(count, select_candidates, claim, attempts=CLAIM_ATTEMPTS):
+    """
+    Claim rows without relying on transactions or row locks: each candidate row is claimed by a conditional update
+    (which only succeeds if the row is still unclaimed), rows claimed concurrently by others are replaced by new
+    candidates
+    @type       count: int
+    @param      count: Number of rows to claim
+    @type       select_candidates: function
+    @param      select_candidates: Function returning the primary keys of (at most n) unclaimed rows
+    @type       claim: function
+    @param      claim: Function claiming the row with the given primary key, returns the number of updated rows
+    @type       attempts: int
+    @param      attempts: Maximum number of candidate selections
+    @rtype:     list
+    @return:    Primary keys of the claimed rows (less than count if not enough rows are available)
+    """
+    claimed = []
+    for _ in range(attempts):
+        needed = count - len(claimed)
+        if needed <= 0:
+            break
+        candidates = select_candidates(needed)
+        if not candidates:
+            break
+        claimed.extend(pk for pk in candidates if claim(pk) == 1)
+    return claimed
+
+
+def claim_unused_identifiers(count=1, **filters):
+    """
+    Atomically claim unused identifiers. Each identifier is claimed by an update conditional on 'used' being
+    false, so that concurrent requests never get the same identifier; this does not depend on transactions or row
+    locks (the tables use the MyISAM storage engine, see settings).
+    @type       count: int
+    @param      count: Number of identifiers to claim
+    @type       filters: dict
+    @param      filters: Additional filter criteria (e.g. org_nsid, is_blockchain_id, user)
+    @rtype:     list
+    @return:    Claimed InternalIdentifier objects (less than count if not enough identifiers are available)
+    """
+    # pylint: disable-next=no-member
+    identifiers = InternalIdentifier.objects
+    claimed_pks = claim_rows(
+        count,
+        lambda n: list(identifiers.filter(used=False, **filters).order_by('id').values_list('pk', flat=True)[:n]),
+        lambda pk: identifiers.filter(pk=pk, used=False).update(used=True))
+    if not claimed_pks:
+        return []
+    return list(identifiers.filter(pk__in=claimed_pks).order_by('id'))
+
+
+def generate_identifiers(count, org_nsid, user=None, is_blockchain_id=False, batch_size=1000):
+    """
+    Create unused identifiers in bulk
+    @type       count: int
+    @param      count: Number of identifiers
+    @type       org_nsid: string
+    @param      org_nsid: Organization namespace identifier
+    @type       user: User
+    @param      user: Owner of the identifiers (optional)
+    @rtype:     int
+    @return:    Number of created identifiers
+    """
+    # pylint: disable-next=no-member
+    created = InternalIdentifier.objects.bulk_create(
+        (InternalIdentifier(org_nsid=org_nsid, identifier=randomutils.randomword(40), used=False,
+                            is_blockchain_id=is_blockchain_id, user=user) for _ in range(count)),
+        batch_size=batch_size)
+    return len(created)
+
+
 def get_unused_identifier(user_id, get_blockchain_id=False):
     if get_blockchain_id:
-        id_queryset = InternalIdentifier.objects.filter(used=False, is_blockchain_id=get_blockchain_id, user=user_id)[:1]
-        if len(id_queryset) == 0:
+        claimed = claim_unused_identifiers(1, is_blockchain_id=get_blockchain_id, user=user_id)
+        if len(claimed) == 0:
             raise ResourceNotAvailable(_("No unused Blockchain identifier available"))
-        identifier = id_queryset[0]
-        identifier.used = True
-        identifier.save()
-        new_id = "%s" % identifier.identifier
+        new_id = "%s" % claimed[0].identifier
     else:
         new_id = str(uuid.uuid4())
     return new_id
 
 
+def filter_information_packages(queryset, filterword):
+    """
+    Filter information packages by a search term matching the beginning of the process ID, the internal label or
+    the identifier (prefix matches use the indexes of these columns, unlike substring matches). Identifiers can be
+    searched without the URN namespace prefix of the repository.
+    @type       queryset: django.db.models.QuerySet
+    @param      queryset: Information package query set
+    @type       filterword: string
+    @param      filterword: Search term
+    @rtype:     django.db.models.QuerySet
+    @return:    Filtered query set
+    """
+    filterword = filterword.strip() if filterword else ""
+    if not filterword:
+        return queryset
+    condition = Q(uid__startswith=filterword) | Q(package_name__istartswith=filterword) | \
+        Q(identifier__istartswith=filterword)
+    if not filterword.lower().startswith("urn:"):
+        condition |= Q(identifier__istartswith="urn:uuid:%s:%s" % (node_namespace_id, filterword))
+    return queryset.filter(condition)
+
+
 def error_resp(request, error_message, header=_("An error occurred"), redirect_url=None, redirect_msg=None):
     logger.error(error_message)
     template = loader.get_template("earkweb/error.html")
@@ -52,3 +149,44 @@ def check_required_params(input, required_params):
             missing_params.append(param)
     if len(missing_params) > 0:
         raise RuntimeError("Missing parameters: %s" % ", ".join(missing_params))
+
+
+class TestClaimRows(unittest.TestCase):
+
+    def setUp(self):
+        self.used = {pk: False for pk in range(1, 11)}
+
+    def select_candidates(self, n):
+        return [pk for pk in sorted(self.used) if not self.used[pk]][:n]
+
+    def claim(self, pk):
+        if self.used[pk]:
+            return 0
+        self.used[pk] = True
+        return 1
+
+    def test_claim(self):
+        self.assertEqual([1, 2, 3], claim_rows(3, self.select_candidates, self.claim))
+        self.assertEqual([4, 5, 6, 7, 8, 9, 10], claim_rows(20, self.select_candidates, self.claim))
+        self.assertEqual([], claim_rows(1, self.select_candidates, self.claim))
+
+    def test_concurrent_claim(self):
+        selections = []
+
+        def select_claimed_concurrently(n):
+            candidates = self.select_candidates(n)
+            if not selections:
+                # another request claims the first two candidates between selection and update
+                for pk in candidates[:2]:
+                    self.claim(pk)
+            selections.append(candidates)
+            return candidates
+        claimed = claim_rows(3, select_claimed_concurrently, self.claim)
+        self.assertEqual([3, 4, 5], claimed)
+        self.assertEqual([[1, 2, 3], [4, 5]], selections)
+        # rows claimed by the other request are not returned
+        self.assertFalse({1, 2} & set(claimed))
+
+
+if __name__ == '__main__':
+    unittest.main()
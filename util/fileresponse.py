@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+# coding=UTF-8
+"""
+File responses supporting conditional requests (ETag, Last-Modified) and byte ranges (206 Partial Content).
+Content is streamed with bounded buffers, text files are transcoded to UTF-8 incrementally.
+"""
+import codecs
+import os
+import re
+import unittest
+import uuid
+from urllib.parse import quote
+
+import charset_normalizer
+
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+from config.configuration import file_delivery_mode, file_delivery_internal_locations
+
+# size of the buffer used to stream file content
+chunk_size = 64 * 1024
+
+# size of the prefix used to detect the character encoding of text files
+charset_sample_size = 64 * 1024
+
+range_spec_regex = re.compile(r'^(\d*)-(\d*)$')
+
+# maximum number of ranges of a Range header (header is ignored if it has more ranges)
+max_ranges = 16
+
+
+def file_etag(file_path, digest=None, stat=None):
+    """
+    Get ETag of a file, derived from a content digest (strong) or from size and modification time (weak)
+    @type       file_path: string
+    @param      file_path: File path
+    @type       digest: string
+    @param      digest: Content digest (e.g. SHA-512 digest from the inventory)
+    @rtype:     string
+    @return:    Quoted ETag
+    """
+    if digest:
+        return quote_etag(digest)
+    stat = stat if stat else os.stat(file_path)
+    return "W/%s" % quote_etag("%x-%x" % (stat.st_size, stat.st_mtime_ns))
+
+
+def _etag_matches(etag, etags_header, weak=True):
+    etags = parse_etags(etags_header)
+    if '*' in etags:
+        return True
+    if weak:
+        strip = lambda tag: tag[2:] if tag.startswith('W/') else tag
+        return strip(etag) in [strip(tag) for tag in etags]
+    return not etag.startswith('W/') and etag in etags
+
+
+def not_modified(request, etag, mtime):
+    """
+    Evaluate If-None-Match and If-Modified-Since request headers
+    @rtype:     bool
+    @return:    True if the client's representation is up to date
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        return _etag_matches(etag, if_none_match)
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and int(mtime) <= if_modified_since
+
+
+def parse_range_header(range_header, size):
+    """
+    Parse byte ranges of a Range header
+    @type       range_header: string
+    @param      range_header: Range header value (e.g. 'bytes=0-499,1000-')
+    @type       size: int
+    @param      size: File size
+    @rtype:     list
+    @return:    List of sorted, non-overlapping (start, end) tuples (end inclusive; overlapping and adjacent
+                ranges are merged), empty list if no range is satisfiable, None if the header is invalid or
+                requests more than max_ranges ranges or more bytes than the file size (header is ignored and the
+                full content is sent)
+    """
+    unit, _, specs = range_header.partition('=')
+    if unit.strip().lower() != 'bytes' or not specs:
+        return None
+    specs = specs.split(',')
+    if len(specs) > max_ranges:
+        return None
+    ranges = []
+    for spec in specs:
+        match = range_spec_regex.match(spec.strip())
+        if not match:
+            return None
+        first, last = match.groups()
+        if first == '' and last == '':
+            return None
+        if first == '':
+            # suffix range: last n bytes
+            length = int(last)
+            if length == 0:
+                continue
+            start, end = max(0, size - length), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last != '' else size - 1
+            if last != '' and int(last) < start:
+                return None
+            if start >= size:
+                continue
+        ranges.append((start, end))
+    if sum(end - start + 1 for start, end in ranges) > size:
+        return None
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _if_range_matches(request, etag, mtime):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if_range_date = parse_http_date_safe(if_range)
+    if if_range_date is not None:
+        return int(mtime) <= if_range_date
+    return _etag_matches(etag, if_range, weak=False)
+
+
+def _read_range(file_path, start, end):
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = f.read(min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def _read_multipart(file_path, ranges, size, content_type, boundary):
+    for start, end in ranges:
+        yield ("--%s\r\nContent-Type: %s\r\nContent-Range: bytes %d-%d/%d\r\n\r\n" %
+               (boundary, content_type, start, end, size)).encode('ascii')
+        yield from _read_range(file_path, start, end)
+        yield b"\r\n"
+    yield ("--%s--\r\n" % boundary).encode('ascii')
+
+
+def _set_headers(response, etag, mtime, filename=None, as_attachment=False):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    response['Accept-Ranges'] = 'bytes'
+    if as_attachment:
+        response['Content-Disposition'] = "attachment; filename=%s" % (filename if filename else '')
+    return response
+
+
+def offloaded_file_response(file_path, content_type, etag, mtime, filename=None, as_attachment=False):
+    """
+    Hand file delivery over to the front-end web server (X-Accel-Redirect for nginx, X-Sendfile for uwsgi and
+    others). Range and conditional requests are then handled by the web server.
+    @rtype:     django.http.HttpResponse
+    @return:    Response with internal redirect header or None if offloading is disabled or not possible
+    """
+    if file_delivery_mode == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = file_path
+    elif file_delivery_mode == 'nginx':
+        real_path = os.path.realpath(file_path)
+        for area_root, location in file_delivery_internal_locations.items():
+            area_root = os.path.realpath(area_root)
+            if real_path.startswith(area_root.rstrip('/') + '/'):
+                internal_path = location.rstrip('/') + '/' + os.path.relpath(real_path, area_root)
+                break
+        else:
+            return None
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(internal_path)
+    else:
+        return None
+    return _set_headers(response, etag, mtime, filename, as_attachment)
+
+
+def conditional_file_response(request, file_path, content_type, etag=None, as_attachment=False, filename=None):
+    """
+    Stream a file honouring conditional (If-None-Match, If-Modified-Since) and range (Range, If-Range) requests.
+    If a file delivery mode other than 'django' is configured, the transfer is handed over to the web server.
+    @type       request: django.http.HttpRequest
+    @param      request: Request
+    @type       file_path: string
+    @param      file_path: File path
+    @type       content_type: string
+    @param      content_type: Content type of the file
+    @type       etag: string
+    @param      etag: ETag (default: weak ETag derived from size and modification time)
+    @type       as_attachment: bool
+    @param      as_attachment: Send Content-Disposition header to download the file
+    @type       filename: string
+    @param      filename: File name used in the Content-Disposition header (default: base name of the file)
+    @rtype:     django.http.HttpResponse
+    @return:    200 (full content), 206 (partial content), 304 (not modified) or 416 (range not satisfiable)
+    """
+    stat = os.stat(file_path)
+    size = stat.st_size
+    mtime = stat.st_mtime
+    etag = etag if etag else file_etag(file_path, stat=stat)
+    filename = filename if filename else os.path.basename(file_path)
+
+    if request is not None and request.method in ('GET', 'HEAD') and not_modified(request, etag, mtime):
+        return _set_headers(HttpResponseNotModified(), etag, mtime)
+
+    offloaded = offloaded_file_response(file_path, content_type, etag, mtime, filename, as_attachment)
+    if offloaded is not None:
+        return offloaded
+
+    range_header = request.META.get('HTTP_RANGE') if request is not None else None
+    if range_header and request.method == 'GET' and _if_range_matches(request, etag, mtime):
+        ranges = parse_range_header(range_header, size)
+        if ranges is not None:
+            if not ranges:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = "bytes */%d" % size
+                return response
+            if len(ranges) == 1:
+                start, end = ranges[0]
+                response = StreamingHttpResponse(_read_range(file_path, start, end), status=206,
+                                                 content_type=content_type)
+                response['Content-Range'] = "bytes %d-%d/%d" % (start, end, size)
+                response['Content-Length'] = str(end - start + 1)
+            else:
+                boundary = uuid.uuid4().hex
+                response = StreamingHttpResponse(_read_multipart(file_path, ranges, size, content_type, boundary),
+                                                 status=206,
+                                                 content_type="multipart/byteranges; boundary=%s" % boundary)
+            return _set_headers(response, etag, mtime, filename, as_attachment)
+
+    response = FileResponse(open(file_path, 'rb'), content_type=content_type)
+    response.block_size = chunk_size
+    response['Content-Length'] = str(size)
+    return _set_headers(response, etag, mtime, filename, as_attachment)
+
+
+def detect_encoding(file_path, sample_size=charset_sample_size):
+    """
+    Detect character encoding of a text file based on a sample of its first bytes
+    @type       file_path: string
+    @param      file_path: File path
+    @type       sample_size: int
+    @param      sample_size: Number of bytes used for the detection
+    @rtype:     string
+    @return:    Python codec name (default: 'utf-8')
+    """
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_size)
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        sample.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as err:
+        # sample may end within a multi-byte sequence
+        if err.start >= len(sample) - 3 and err.reason == 'unexpected end of data':
+            return 'utf-8'
+    encoding = charset_normalizer.detect(sample).get('encoding')
+    try:
+        return codecs.lookup(encoding).name if encoding else 'utf-8'
+    except LookupError:
+        return 'utf-8'
+
+
+def transcoded_etag(etag):
+    """
+    Get ETag of the UTF-8 transcoded representation of a file: weak (the representation is not byte-identical to
+    the stored file) and distinct from the ETag of the file itself
+    @type       etag: string
+    @param      etag: ETag of the file
+    @rtype:     string
+    @return:    Weak ETag (W/"<digest>-utf8")
+    """
+    value = etag[2:] if etag.startswith('W/') else etag
+    return "W/%s" % quote_etag("%s-utf8" % value.strip('"'))
+
+
+def _transcode(file_path, encoding):
+    # undecodable bytes (e.g. beyond the sample used for the encoding detection) are replaced (U+FFFD)
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    with open(file_path, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            text = decoder.decode(data)
+            if text:
+                yield text.encode('utf-8')
+        text = decoder.decode(b'', final=True)
+        if text:
+            yield text.encode('utf-8')
+
+
+def text_file_response(request, file_path, content_type, etag=None):
+    """
+    Stream a text file as UTF-8. The encoding is detected from the first charset_sample_size bytes (64 KiB) only:
+    files whose prefix is UTF-8 are streamed as they are (range requests supported, bytes after the prefix are not
+    validated), other encodings are transcoded incrementally with undecodable bytes replaced by U+FFFD. The
+    transcoded representation has a weak ETag derived from the file's ETag (see transcoded_etag).
+    @type       request: django.http.HttpRequest
+    @param      request: Request
+    @type       file_path: string
+    @param      file_path: File path
+    @type       content_type: string
+    @param      content_type: Content type (including charset=utf-8)
+    @type       etag: string
+    @param      etag: ETag (default: weak ETag derived from size and modification time)
+    @rtype:     django.http.HttpResponse
+    @return:    Response streaming the UTF-8 encoded file content
+    """
+    encoding = detect_encoding(file_path)
+    if encoding in ('utf-8', 'ascii'):
+        return conditional_file_response(request, file_path, content_type, etag)
+    stat = os.stat(file_path)
+    etag = transcoded_etag(etag if etag else file_etag(file_path, stat=stat))
+    if request is not None and request.method in ('GET', 'HEAD') and not_modified(request, etag, stat.st_mtime):
+        return _set_headers(HttpResponseNotModified(), etag, stat.st_mtime)
+    response = StreamingHttpResponse(_transcode(file_path, encoding), content_type=content_type)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    return response
+
+
+class TestRangeHeader(unittest.TestCase):
+
+    def test_parse_range_header(self):
+        self.assertEqual([(0, 499)], parse_range_header("bytes=0-499", 1000))
+        self.assertEqual([(900, 999)], parse_range_header("bytes=-100", 1000))
+        self.assertEqual([(500, 999)], parse_range_header("bytes=500-2000", 1000))
+        self.assertEqual([], parse_range_header("bytes=1000-", 1000))
+        self.assertIsNone(parse_range_header("bytes=5-1", 1000))
+        self.assertIsNone(parse_range_header("items=0-1", 1000))
+
+    def test_merge_ranges(self):
+        self.assertEqual([(0, 199), (300, 399)], parse_range_header("bytes=300-399,100-199,0-99", 1000))
+        self.assertEqual([(0, 149)], parse_range_header("bytes=0-99,50-149", 1000))
+
+    def test_excessive_ranges(self):
+        self.assertIsNone(parse_range_header("bytes=" + ",".join("%d-%d" % (i, i) for i in range(17)), 1000))
+        self.assertIsNone(parse_range_header("bytes=0-,0-", 1000))
+
+
+class TestTextFileResponse(unittest.TestCase):
+
+    def test_transcoded_etag(self):
+        self.assertEqual('W/"abc-utf8"', transcoded_etag('"abc"'))
+        self.assertEqual('W/"3e8-1f-utf8"', transcoded_etag('W/"3e8-1f"'))
+
+
+if __name__ == '__main__':
+    unittest.main()
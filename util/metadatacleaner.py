@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# coding=UTF-8
+"""
+Removal of technical metadata from text extracted by Apache Tika (indexed content), so that only the actual content
+remains (e.g. for term statistics).
+
+Text is processed line by line: lines starting with a metadata key (e.g. 'pdf:PDFVersion 1.7', 'stream_size 1234',
+'Content-Type application/pdf') are dropped, in the remaining lines namespaced metadata entries (from the key to
+the end of the line) and ISO timestamps are removed and whitespace is normalized. All patterns are compiled once
+and anchored (line start or word boundary), so that the cost is linear in the size of the text.
+
+Run the tests: python util/metadatacleaner.py
+Run the micro-benchmark: python util/metadatacleaner.py benchmark
+"""
+import re
+import sys
+import timeit
+import unittest
+
+# metadata keys at the beginning of a line: namespaced keys (prefix:Name, e.g. 'xmpTPg:NPages',
+# 'access_permission:can_modify'), underscore keys with a known Tika prefix (e.g. 'stream_size', 'n_pages'),
+# HTTP-style keys and plain keys used by Tika; prose like 'Note: ...' or 'see_also ...' is kept
+METADATA_LINE = re.compile(
+    r'\s*(?:'
+    r'[A-Za-z][\w.-]*:[A-Za-z][\w.:-]*'
+    r'|(?:stream|start|end|endnote|body|n)_\w+'
+    r'|X-Parsed-By|X-TIKA[\w:-]*|Content-(?:Type|Encoding|Length|Language)|Creation-Date|Last-Modified'
+    r'|Last-Save-Date|Last-Printed|Last-Author|Application-Name|Application-Version|Page-Count|Word-Count'
+    r'|Character Count|resourceName|created|modified|producer|creator|annotation'
+    r')(?=[\s=:]|$)', re.IGNORECASE)
+
+# namespaced metadata entry within a line (letter after the colon, so that prose like 'Note: text' and times like
+# '10:30' are kept)
+INLINE_METADATA = re.compile(r'\b[A-Za-z][\w-]*:[A-Za-z][\w:-]*\b.*')
+
+ISO_TIMESTAMP = re.compile(r'\b\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?')
+
+
+def clean_lines(lines):
+    """
+    Remove technical metadata from lines of extracted text
+    @type       lines: iterable
+    @param      lines: Lines of text (e.g. file object or list of strings)
+    @rtype:     generator
+    @return:    Cleaned, non-empty lines with normalized whitespace
+    """
+    for line in lines:
+        if METADATA_LINE.match(line):
+            continue
+        if ':' in line:
+            line = ISO_TIMESTAMP.sub('', line)
+            line = INLINE_METADATA.sub('', line)
+        line = ' '.join(line.split())
+        if line:
+            yield line
+
+
+def clean_metadata(text):
+    """
+    Cleans the technical metadata from the input text and retains only the actual content.
+
+    Parameters:
+    text (str): The input string containing both metadata and content.
+
+    Returns:
+    str: Cleaned content text without technical metadata.
+    """
+    return ' '.join(clean_lines(text.splitlines())) if text else ''
+
+
+SAMPLE_EXTRACTION = """X-Parsed-By org.apache.tika.parser.DefaultParser
+X-Parsed-By org.apache.tika.parser.pdf.PDFParser
+pdf:PDFVersion 1.7
+xmpTPg:NPages 2
+access_permission:can_modify true
+pdf:docinfo:producer Microsoft® Word für Microsoft 365
+Content-Type application/pdf
+Creation-Date 2024-06-04T11:40:41Z
+created 2024-06-04T11:40:41Z
+modified 2024-06-04T11:41:02Z
+stream_size 48213
+n_pages 2
+producer Microsoft® Word für Microsoft 365
+
+Annual Report 2023
+
+The present report describes the preservation   activities of the
+repository. Note: all packages were validated before ingest at 10:30.
+Processed on 2024-06-04T11:40:41Z by the ingest workflow dc:creator Jane Doe
+Express delivery of annotations is not supported.
+"""
+
+SAMPLE_EXPECTED = "Annual Report 2023 The present report describes the preservation activities of the " \
+                  "repository. Note: all packages were validated before ingest at 10:30. Processed on by the " \
+                  "ingest workflow Express delivery of annotations is not supported."
+
+
+def benchmark(size_mb=4, number=5):
+    """
+    Micro-benchmark: throughput of the cleaner on repeated sample extraction text (compared to the previous
+    implementation based on one alternation of unanchored patterns)
+    @type       size_mb: int
+    @param      size_mb: Approximate size of the text (MB)
+    @type       number: int
+    @param      number: Number of runs
+    """
+    text = SAMPLE_EXTRACTION * max(1, int(size_mb * 1024 * 1024 / len(SAMPLE_EXTRACTION)))
+    previous = re.compile('|'.join([
+        r'\b[\w\-]+:.*', r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z', r'X-Parsed-By.*', r'meta:.*', r'producer.*',
+        r'Pre', r'stream_.*', r'n_.*', r'start_.*', r'end_.*', r'endnote_.*', r'annotation', r'body_.*',
+        r'access_permission:.*', r'pdf:docinfo:.*', r'Content-Type.*', r'xmp:.*', r'xmpTPg:.*', r'Creation-Date.*',
+        r'\bcreated\b.*', r'\bmodified\b.*']), re.IGNORECASE)
+    whitespace = re.compile(r'\s+')
+    size = len(text) / (1024 * 1024)
+    for name, func in [("previous", lambda: whitespace.sub(' ', previous.sub('', text)).strip()),
+                       ("clean_metadata", lambda: clean_metadata(text))]:
+        seconds = min(timeit.repeat(func, number=1, repeat=number))
+        print("%-16s %8.3f s  %8.1f MB/s" % (name, seconds, size / seconds))
+
+
+class TestMetadataCleaner(unittest.TestCase):
+
+    def test_sample_extraction(self):
+        self.assertEqual(SAMPLE_EXPECTED, clean_metadata(SAMPLE_EXTRACTION))
+
+    def test_metadata_lines(self):
+        lines = ["stream_source_info file.pdf", "meta:author John", "Content-Type text/plain; charset=UTF-8",
+                 "  xmp:CreatorTool Writer", "Last-Modified 2024-01-01T00:00:00Z", "start_page 1", "body_text x"]
+        self.assertEqual([], list(clean_lines(lines)))
+
+    def test_prose_lines_kept(self):
+        lines = ["Note: all packages were validated", "Summary: preservation activities", "Title: Annual Report",
+                 "Contact: info@example.org", "see_also the appendix"]
+        self.assertEqual(lines, list(clean_lines(lines)))
+
+    def test_content_kept(self):
+        self.assertEqual("Preservation of press releases, presentations and endnotes",
+                         clean_metadata("Preservation of press releases, presentations and endnotes"))
+        self.assertEqual("See http://example.org/x at 12:00", clean_metadata("See http://example.org/x at 12:00"))
+
+    def test_inline_metadata_and_timestamps(self):
+        self.assertEqual("Title", clean_metadata("Title dc:title Title"))
+        self.assertEqual("Saved at", clean_metadata("Saved at 2024-06-04T11:40:41.123+02:00"))
+
+    def test_whitespace(self):
+        self.assertEqual("a b c", clean_metadata("  a\t b\n\n c  \r\n"))
+        self.assertEqual("", clean_metadata(""))
+        self.assertEqual("", clean_metadata(None))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        benchmark()
+    else:
+        unittest.main()
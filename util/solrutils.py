@@ -1,11 +1,11 @@
 import logging
-import requests
 import json
 import os
 from access.search.solrclient import SolrClient
+from access.search.solrgateway import get_solr_gateway
 from access.search.solrquery import SolrQuery
 from access.search.solrserver import SolrServer
-from config.configuration import verify_certificate, solr_protocol
+from config.configuration import solr_protocol
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +18,8 @@ def index_repository():
     solr_server = SolrServer(solr_protocol, solr_host, solr_port)
     logger.info("Solr server base url: %s" % solr_server.get_base_url())
     sq = SolrQuery(solr_server)
-    r = requests.get(sq.get_base_url(), verify=verify_certificate)
+    gateway = get_solr_gateway()
+    r = gateway.session.get(sq.get_base_url(), timeout=gateway.timeout)
     if not r.status_code == 200:
         logger.error("Solr server is not available at: %s" % sq.get_base_url())
         return
@@ -26,7 +27,7 @@ def index_repository():
         logger.info("Using Solr server at: %s" % sq.get_base_url())
     # delete index first
     url_part = "storagecore1/update?stream.body=%3Cdelete%3E%3Cquery%3E*%3C/query%3E%3C/delete%3E&commit=true"
-    requests.get(sq.get_base_url() + url_part, verify=verify_certificate)
+    gateway.session.get(sq.get_base_url() + url_part, timeout=gateway.timeout)
     package_count = 0
     solr_client = SolrClient(solr_server, "storagecore1")
     for dirpath, _, filenames in os.walk(config_path_storage):
@@ -60,6 +61,9 @@ class SolrUtility(object):
         """
         self.solr_unique_key = None
         self.solr_instance = None
+        # pooled connections of the shared solr gateway
+        self.session = get_solr_gateway().session
+        self.timeout = get_solr_gateway().timeout
 
     def availability(self, solr_base_url, solr_unique_key):
         """
@@ -71,7 +75,7 @@ class SolrUtility(object):
         """
         # add 'admin/ping' to URL to check if Solr is reachable
         url = os.path.join(solr_base_url, 'admin/ping/')
-        solr_status = requests.get(url, verify=verify_certificate).status_code
+        solr_status = self.session.get(url, timeout=self.timeout).status_code
         if solr_status == 200:
             self.solr_unique_key = solr_unique_key
             self.solr_instance = solr_base_url
@@ -88,7 +92,7 @@ class SolrUtility(object):
         """
         url_suffix = 'select?wt=json&q='   # q=*:*
         query_url = os.path.join(self.solr_instance, url_suffix)
-        query = requests.get(query_url + query_string, verify=verify_certificate)
+        query = self.session.get(query_url + query_string, timeout=self.timeout)
         if query.status_code == 200:
             return query.json()['response']['docs']
         else:
@@ -107,7 +111,7 @@ class SolrUtility(object):
         update_url = os.path.join(self.solr_instance, url_suffix)
         update_headers = {'Content-Type': 'application/json'}
         update_data = json.dumps([{field: {'set': content}, self.solr_unique_key: record_identifier}])
-        update = requests.post(update_url, data=update_data, headers=update_headers, verify=verify_certificate)
+        update = self.session.post(update_url, data=update_data, headers=update_headers, timeout=self.timeout)
         print(update.text)
         return update.status_code
 
@@ -128,7 +132,7 @@ class SolrUtility(object):
         for kv_tuple in kv_tuple_list:
             update_data[kv_tuple[0]] = {'set': kv_tuple[1]}
         update_doc = json.dumps([update_data])
-        update = requests.post(update_url, data=update_doc, headers=update_headers, verify=verify_certificate)
+        update = self.session.post(update_url, data=update_doc, headers=update_headers, timeout=self.timeout)
         print(update.text)
         return update.status_code
 
@@ -149,7 +153,7 @@ class SolrUtility(object):
         for kv_pair in kv_pairs:
             update_data[kv_pair['field_name']] = {'set': kv_pair['field_value']}
         update_doc = json.dumps([update_data])
-        update = requests.post(update_url, data=update_doc, headers=update_headers, verify=verify_certificate)
+        update = self.session.post(update_url, data=update_doc, headers=update_headers, timeout=self.timeout)
 
         print(update_url)
         print(json.dumps([update_data], indent=4))
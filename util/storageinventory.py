@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# coding=UTF-8
+"""
+Access to the OCFL inventory (inventory.json) of packages in the storage area.
+
+Parsed inventories are cached per process and invalidated when the inventory file changes (modification
+time and size). Listings of package versions, version differences and path lookups are answered from the
+inventory, without walking the storage directories.
+"""
+import fnmatch
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+
+from config.configuration import config_path_storage
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_FILE_NAME = "inventory.json"
+
+_inventory_cache = {}
+_lock = threading.Lock()
+
+
+class Inventory(object):
+    """
+    Parsed OCFL inventory with an index of content paths to digests
+    """
+
+    def __init__(self, inventory_path, data):
+        self.inventory_path = inventory_path
+        self.root = os.path.dirname(inventory_path)
+        self.data = data
+        self.digest_algorithm = data.get("digestAlgorithm", "sha512")
+        self.path_digests = {}
+        for digest, paths in data.get("manifest", {}).items():
+            for path in paths:
+                self.path_digests[path] = digest
+        self._states = {}
+        self._content_index = None
+        self._lock = threading.Lock()
+
+    def digest(self, content_path):
+        """
+        Get digest of a content path (relative to the object root, e.g. 'v00001/metadata/metadata.json')
+        @type       content_path: string
+        @param      content_path: Content path relative to the inventory directory
+        @rtype:     string
+        @return:    Digest or None if the path is not part of the manifest
+        """
+        return self.path_digests.get(content_path)
+
+    @property
+    def versions(self):
+        """
+        Version names sorted by version number
+        @rtype:     list
+        @return:    Version names (e.g. ['v00001', 'v00002'])
+        """
+        return sorted(self.data.get("versions", {}).keys(), key=lambda v: int(re.sub(r"\D", "", v) or 0))
+
+    @property
+    def head(self):
+        versions = self.versions
+        return self.data.get("head", versions[-1] if versions else None)
+
+    def version_name(self, version=None):
+        """
+        Get version name of a version given by name or number
+        @type       version: string
+        @param      version: Version name (e.g. 'v00002') or number (e.g. 2), default: head version
+        @rtype:     string
+        @return:    Version name
+        @raises     KeyError: if the version does not exist
+        """
+        if version is None or version == "":
+            return self.head
+        versions = self.data.get("versions", {})
+        if version in versions:
+            return version
+        number = int(re.sub(r"\D", "", str(version)) or -1)
+        for name in versions:
+            if int(re.sub(r"\D", "", name) or 0) == number:
+                return name
+        raise KeyError("Version does not exist: %s" % version)
+
+    def state(self, version=None):
+        """
+        Logical paths of a version mapped to their digests
+        @type       version: string
+        @param      version: Version name or number, default: head version
+        @rtype:     dict
+        @return:    Logical path -> digest
+        @raises     KeyError: if the version does not exist
+        """
+        name = self.version_name(version)
+        with self._lock:
+            if name not in self._states:
+                version_state = {}
+                for digest, paths in self.data["versions"][name].get("state", {}).items():
+                    for path in paths:
+                        version_state[path] = digest
+                self._states[name] = version_state
+            return self._states[name]
+
+    def content_path(self, digest):
+        """
+        Get content path (relative to the object root) of a digest
+        @rtype:     string
+        @return:    First content path of the digest in the manifest or None
+        """
+        paths = self.data.get("manifest", {}).get(digest)
+        return paths[0] if paths else None
+
+    def _entry(self, path, digest, version=None):
+        entry = {"path": path, "digest": digest, "content_path": self.content_path(digest)}
+        if version:
+            entry["version"] = version
+        return entry
+
+    def list_version(self, version=None, prefix=""):
+        """
+        List files of a version
+        @type       version: string
+        @param      version: Version name or number, default: head version
+        @type       prefix: string
+        @param      prefix: Only list logical paths starting with this prefix
+        @rtype:     list
+        @return:    Files (logical path, digest and content path) sorted by logical path
+        @raises     KeyError: if the version does not exist
+        """
+        version_state = self.state(version)
+        return [self._entry(path, version_state[path])
+                for path in sorted(version_state) if path.startswith(prefix)]
+
+    def diff(self, from_version, to_version):
+        """
+        Differences between two versions
+        @type       from_version: string
+        @param      from_version: Version name or number
+        @type       to_version: string
+        @param      to_version: Version name or number
+        @rtype:     dict
+        @return:    Added, removed and modified files (lists) and number of unchanged files
+        @raises     KeyError: if one of the versions does not exist
+        """
+        from_state = self.state(from_version)
+        to_state = self.state(to_version)
+        added = [self._entry(path, to_state[path]) for path in sorted(to_state) if path not in from_state]
+        removed = [self._entry(path, from_state[path]) for path in sorted(from_state) if path not in to_state]
+        modified = [dict(self._entry(path, to_state[path]), previous_digest=from_state[path])
+                    for path in sorted(to_state) if path in from_state and from_state[path] != to_state[path]]
+        return {
+            "from": self.version_name(from_version),
+            "to": self.version_name(to_version),
+            "added": added,
+            "removed": removed,
+            "modified": modified,
+            "unchanged": len(to_state) - len(added) - len(modified),
+        }
+
+    def find(self, pattern, version=None):
+        """
+        Find logical paths in all versions (or one version)
+        @type       pattern: string
+        @param      pattern: Logical path or glob pattern (e.g. '*/data/*.pdf')
+        @type       version: string
+        @param      version: Version name or number, default: all versions
+        @rtype:     list
+        @return:    Matching files (version, logical path, digest and content path)
+        @raises     KeyError: if the version does not exist
+        """
+        versions = [self.version_name(version)] if version else self.versions
+        is_pattern = any(c in pattern for c in "*?[")
+        found = []
+        for name in versions:
+            version_state = self.state(name)
+            if is_pattern:
+                paths = [path for path in sorted(version_state) if fnmatch.fnmatchcase(path, pattern)]
+            else:
+                paths = [pattern] if pattern in version_state else []
+            found.extend(self._entry(path, version_state[path], name) for path in paths)
+        return found
+
+    def content_listing(self, directory=""):
+        """
+        Entries of a directory of the object (relative to the object root) according to the manifest. Files of the
+        object root are not part of the manifest (e.g. inventory files, OCFL declaration), they are listed from the
+        object root directory.
+        @type       directory: string
+        @param      directory: Directory path relative to the object root ("" for the object root)
+        @rtype:     list
+        @return:    List of (name, is_dir, digest) tuples sorted by name
+        @raises     FileNotFoundError: if the directory is not part of the object
+        """
+        with self._lock:
+            if self._content_index is None:
+                index = {"": {}}
+                for content_path, digest in self.path_digests.items():
+                    parts = content_path.split("/")
+                    for i in range(len(parts)):
+                        parent = "/".join(parts[:i])
+                        is_dir = i < len(parts) - 1
+                        index.setdefault(parent, {})[parts[i]] = (is_dir, None if is_dir else digest)
+                self._content_index = {
+                    parent: sorted((name, is_dir, digest) for name, (is_dir, digest) in entries.items())
+                    for parent, entries in index.items()
+                }
+            index = self._content_index
+        directory = directory.strip("/")
+        if directory not in index:
+            raise FileNotFoundError("Directory not in inventory: %s" % directory)
+        if directory == "":
+            return self._root_listing(index[directory])
+        return index[directory]
+
+    def _root_listing(self, manifest_entries):
+        entries = {name: (is_dir, digest) for name, is_dir, digest in manifest_entries}
+        try:
+            with os.scandir(self.root) as root_entries:
+                for entry in root_entries:
+                    if entry.name not in entries and entry.is_file():
+                        entries[entry.name] = (False, None)
+        except OSError as err:
+            logger.warning("Unable to list object root '%s': %s" % (self.root, err))
+        return sorted((name, is_dir, digest) for name, (is_dir, digest) in entries.items())
+
+
+def load_inventory(inventory_path):
+    """
+    Load inventory (cached, invalidated if the inventory file changes)
+    @type       inventory_path: string
+    @param      inventory_path: Path to inventory.json
+    @rtype:     Inventory
+    @return:    Parsed inventory or None if the file does not exist or cannot be parsed
+    """
+    try:
+        stat = os.stat(inventory_path)
+    except OSError:
+        return None
+    version_key = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _inventory_cache.get(inventory_path)
+    if cached and cached[0] == version_key:
+        return cached[1]
+    try:
+        with open(inventory_path, 'r', encoding='utf-8') as inventory_file:
+            inventory = Inventory(inventory_path, json.load(inventory_file))
+    except (OSError, ValueError) as err:
+        logger.warning("Unable to read inventory '%s': %s" % (inventory_path, err))
+        return None
+    with _lock:
+        _inventory_cache[inventory_path] = (version_key, inventory)
+    return inventory
+
+
+def find_inventory(file_path, storage_root=config_path_storage):
+    """
+    Find the inventory of the object a storage file belongs to (nearest parent directory containing an inventory)
+    @type       file_path: string
+    @param      file_path: Path of a file in the storage area
+    @type       storage_root: string
+    @param      storage_root: Storage root directory (search boundary)
+    @rtype:     Inventory
+    @return:    Parsed inventory or None
+    """
+    storage_root = os.path.abspath(storage_root)
+    directory = os.path.dirname(os.path.abspath(file_path))
+    while directory.startswith(storage_root) and directory != storage_root:
+        inventory_path = os.path.join(directory, INVENTORY_FILE_NAME)
+        if os.path.isfile(inventory_path):
+            return load_inventory(inventory_path)
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            break
+        directory = parent
+    return None
+
+
+def get_file_digest(file_path, storage_root=config_path_storage):
+    """
+    Get the inventory digest of a file in the storage area
+    @type       file_path: string
+    @param      file_path: Path of a file in the storage area
+    @rtype:     string
+    @return:    Digest or None if the file is not recorded in an inventory
+    """
+    inventory = find_inventory(file_path, storage_root)
+    if inventory is None:
+        return None
+    return inventory.digest(os.path.relpath(os.path.abspath(file_path), inventory.root))
+
+
+class TestInventory(unittest.TestCase):
+
+    def setUp(self):
+        self.object_root = tempfile.mkdtemp()
+        self.inventory_path = os.path.join(self.object_root, INVENTORY_FILE_NAME)
+        for name in ["0=ocfl_object_1.0", INVENTORY_FILE_NAME, "inventory_content.json",
+                     "inventory_content.json.sha512"]:
+            with open(os.path.join(self.object_root, name), 'w') as object_file:
+                object_file.write("{}")
+        self.inventory = Inventory(self.inventory_path, {
+            "head": "v00001",
+            "manifest": {"abc": ["v00001/data/file.txt"]},
+            "versions": {"v00001": {"state": {"abc": ["data/file.txt"]}}},
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.object_root)
+
+    def test_root_listing(self):
+        self.assertEqual([
+            ("0=ocfl_object_1.0", False, None),
+            (INVENTORY_FILE_NAME, False, None),
+            ("inventory_content.json", False, None),
+            ("inventory_content.json.sha512", False, None),
+            ("v00001", True, None),
+        ], self.inventory.content_listing(""))
+
+    def test_directory_listing(self):
+        self.assertEqual([("file.txt", False, "abc")], self.inventory.content_listing("v00001/data"))
+        with self.assertRaises(FileNotFoundError):
+            self.inventory.content_listing("v00002")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# coding=UTF-8
+"""
+Worker level cache of compiled XML schemas.
+
+Relative schema locations are resolved against the directory of the instance, schema URLs against the local
+schema catalog (static/schemas, see SCHEMA_CATALOG) so that validation does not depend on network access. Schemas
+are compiled once and kept in memory keyed by the schema file paths and their modification time and size.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from urllib.parse import urlparse
+
+from lxml import etree
+
+from config.configuration import root_dir
+
+logger = logging.getLogger(__name__)
+
+XSI_NS = 'http://www.w3.org/2001/XMLSchema-instance'
+XSD_NS = 'http://www.w3.org/2001/XMLSchema'
+
+schema_catalog_dir = os.path.join(root_dir, 'static/schemas')
+
+# schema URLs (without scheme) available in the local schema catalog and the corresponding catalog files; different
+# schemas with the same file name (e.g. the METS XLink schema and the W3C XLink schema) are distinguished by URL
+SCHEMA_CATALOG = {
+    'www.loc.gov/standards/mets/mets.xsd': 'mets_1_11.xsd',
+    'www.loc.gov/standards/mets/version111/mets.xsd': 'mets_1_11.xsd',
+    'www.loc.gov/standards/xlink/xlink.xsd': 'xlink.xsd',
+    'www.loc.gov/standards/premis/v2/premis-v2-2.xsd': 'premis-v2-2.xsd',
+    'www.loc.gov/standards/premis/premis.xsd': 'premis-v3-0.xsd',
+    'www.loc.gov/standards/premis/v3/premis.xsd': 'premis-v3-0.xsd',
+    'www.loc.gov/standards/premis/v3/premis-v3-0.xsd': 'premis-v3-0.xsd',
+    'www.loc.gov/ead/ead3.xsd': 'ead3.xsd',
+}
+
+_compiled_schemas = {}
+_lock = threading.Lock()
+
+
+class LocalCatalogResolver(etree.Resolver):
+    """
+    Resolves schema locations (including remote URLs) to files of the local schema catalog.
+    """
+
+    def __init__(self, catalog_dir=schema_catalog_dir):
+        super().__init__()
+        self.catalog_dir = catalog_dir
+
+    def resolve(self, system_url, public_id, context):
+        local_path = catalog_lookup(system_url, self.catalog_dir)
+        if local_path:
+            return self.resolve_filename(local_path, context)
+        return None
+
+
+def catalog_lookup(location, catalog_dir=schema_catalog_dir, base_dir=None):
+    """
+    Get local path of a schema location
+    @type       location: string
+    @param      location: schema location (URL or file path)
+    @type       catalog_dir: string
+    @param      catalog_dir: local schema catalog directory
+    @type       base_dir: string
+    @param      base_dir: directory used to resolve relative file paths (they are not resolved against the
+                          working directory of the process)
+    @rtype:     string
+    @return:    Local file path or None if the schema is not available locally
+    """
+    if not location:
+        return None
+    parsed = urlparse(location)
+    if parsed.scheme in ('', 'file'):
+        path = parsed.path if parsed.scheme == 'file' else location
+        if not os.path.isabs(path):
+            if not base_dir:
+                return None
+            path = os.path.join(base_dir, path)
+        return path if os.path.isfile(path) else None
+    file_name = SCHEMA_CATALOG.get(parsed.netloc + parsed.path)
+    if not file_name:
+        return None
+    local_path = os.path.join(catalog_dir, file_name)
+    return local_path if os.path.isfile(local_path) else None
+
+
+def _file_key(path):
+    """Cache key of a schema file: path, modification time and size"""
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+def _resolve_location(location, base_dir=None):
+    """Return the local path of a schema location (relative paths are resolved against base_dir)."""
+    local_path = catalog_lookup(location, base_dir=base_dir)
+    if local_path is None:
+        raise FileNotFoundError("Schema not available locally: %s" % location)
+    return local_path
+
+
+def _compile(content, base_url):
+    parser = etree.XMLParser(no_network=True)
+    parser.resolvers.add(LocalCatalogResolver())
+    schema_doc = etree.fromstring(content, parser=parser, base_url=base_url)
+    return etree.XMLSchema(schema_doc)
+
+
+def get_compiled_schema(schema_location, base_dir=None):
+    """
+    Get compiled XML schema for a schema location (file path or URL), compiling it on first use.
+    @type       schema_location: string
+    @param      schema_location: schema file path or URL
+    @type       base_dir: string
+    @param      base_dir: directory used to resolve relative schema locations
+    @rtype:     lxml.etree.XMLSchema
+    @return:    Compiled XML schema
+    """
+    local_path = _resolve_location(schema_location, base_dir)
+    key = _file_key(local_path)
+    with _lock:
+        schema = _compiled_schemas.get(key)
+    if schema is None:
+        logger.debug("Compiling XML schema: %s" % local_path)
+        with open(local_path, 'rb') as schema_file:
+            schema = _compile(schema_file.read(), local_path)
+        with _lock:
+            _compiled_schemas[key] = schema
+    return schema
+
+
+def get_instance_schema_locations(tree):
+    """
+    Get namespace/location pairs of the 'schemaLocation' attribute of an XML instance.
+    @type       tree: lxml.etree._ElementTree
+    @param      tree: parsed XML instance
+    @rtype:     list
+    @return:    List of (namespace, location) tuples
+    """
+    root = tree.getroot()
+    schema_location = root.get('{%s}schemaLocation' % XSI_NS)
+    if schema_location:
+        tokens = schema_location.split()
+        return list(zip(tokens[0::2], tokens[1::2]))
+    no_ns_location = root.get('{%s}noNamespaceSchemaLocation' % XSI_NS)
+    return [(None, no_ns_location)] if no_ns_location else []
+
+
+def get_instance_schema(tree, base_dir=None):
+    """
+    Get compiled XML schema combining the schemas referenced by the 'schemaLocation' attribute of an instance.
+    @type       tree: lxml.etree._ElementTree
+    @param      tree: parsed XML instance
+    @type       base_dir: string
+    @param      base_dir: directory used to resolve relative schema locations
+    @rtype:     lxml.etree.XMLSchema
+    @return:    Compiled XML schema or None if the instance does not reference any schema
+    """
+    locations = get_instance_schema_locations(tree)
+    if not locations:
+        return None
+    if len(locations) == 1:
+        return get_compiled_schema(locations[0][1], base_dir)
+    resolved = []
+    for namespace, location in locations:
+        local_path = _resolve_location(location, base_dir)
+        resolved.append((namespace, local_path, _file_key(local_path)))
+    key = tuple(resolved)
+    with _lock:
+        schema = _compiled_schemas.get(key)
+    if schema is None:
+        wrapper = etree.Element('{%s}schema' % XSD_NS, nsmap={'xs': XSD_NS})
+        for namespace, local_path, _ in resolved:
+            imp = etree.SubElement(wrapper, '{%s}import' % XSD_NS)
+            if namespace:
+                imp.set('namespace', namespace)
+            imp.set('schemaLocation', local_path)
+        logger.debug("Compiling XML schema for namespaces: %s" % ", ".join(str(ns) for ns, _, _ in resolved))
+        schema = _compile(etree.tostring(wrapper), os.path.join(schema_catalog_dir, 'instance.xsd'))
+        with _lock:
+            _compiled_schemas[key] = schema
+    return schema
+
+
+def validate_tree(tree, schema_file=None, base_dir=None):
+    """
+    Validate a parsed XML instance against a schema file or the schemas referenced by the instance.
+    @type       tree: lxml.etree._ElementTree
+    @param      tree: parsed XML instance
+    @type       schema_file: string
+    @param      schema_file: schema file path or URL (if None, the 'schemaLocation' attribute is used)
+    @type       base_dir: string
+    @param      base_dir: directory used to resolve relative schema locations
+    @rtype:     tuple
+    @return:    Validity and list of error messages
+    """
+    try:
+        schema = get_compiled_schema(schema_file, base_dir) if schema_file else get_instance_schema(tree, base_dir)
+    except (FileNotFoundError, etree.XMLSchemaParseError, etree.XMLSyntaxError) as err:
+        return False, [str(err)]
+    if schema is None:
+        return False, ["No XML schema specified and no 'schemaLocation' attribute available"]
+    if schema.validate(tree):
+        return True, []
+    return False, [str(err) for err in schema.error_log]
+
+
+def clear_schema_cache():
+    """Remove all compiled schemas from the cache"""
+    with _lock:
+        _compiled_schemas.clear()
+
+
+class TestCatalogLookup(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog_dir = tempfile.mkdtemp()
+        self.base_dir = tempfile.mkdtemp()
+        for directory in (self.catalog_dir, self.base_dir):
+            with open(os.path.join(directory, 'xlink.xsd'), 'w') as schema_file:
+                schema_file.write('<schema/>')
+
+    def tearDown(self):
+        shutil.rmtree(self.catalog_dir)
+        shutil.rmtree(self.base_dir)
+
+    def test_relative_location(self):
+        self.assertEqual(os.path.join(self.base_dir, 'xlink.xsd'),
+                         catalog_lookup('xlink.xsd', self.catalog_dir, self.base_dir))
+        self.assertIsNone(catalog_lookup('xlink.xsd', self.catalog_dir))
+        self.assertIsNone(catalog_lookup('missing.xsd', self.catalog_dir, self.base_dir))
+
+    def test_url_location(self):
+        self.assertEqual(os.path.join(self.catalog_dir, 'xlink.xsd'),
+                         catalog_lookup('https://www.loc.gov/standards/xlink/xlink.xsd', self.catalog_dir))
+        # same file name, different schema
+        self.assertIsNone(catalog_lookup('https://www.w3.org/1999/xlink.xsd', self.catalog_dir))
+
+    def test_file_key(self):
+        path = os.path.join(self.base_dir, 'xlink.xsd')
+        key = _file_key(path)
+        with open(path, 'a') as schema_file:
+            schema_file.write(' ')
+        self.assertNotEqual(key, _file_key(path))
+
+
+if __name__ == '__main__':
+    unittest.main()